@@ -0,0 +1,211 @@
+"""
+Ejecutor de cómputo para el procesamiento rPPG de SignaApi
+
+Las tareas pesadas (decodificación, detección facial, CHROM, signos vitales)
+corren en un pool de procesos para no bloquear el event loop de uvicorn.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import time
+import logging
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from .error_handlers import ComputeQueueFullError
+from .rppg_scheduler import DEFAULT_TENANT, DEFAULT_TRIAGE, FairShareGate, normalize_triage, percentile
+
+logger = logging.getLogger("signaapi.compute")
+
+# Variables de entorno que limitan los hilos de las librerías numéricas
+_THREAD_ENV_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")
+
+
+def _init_worker(cv_threads: int, warmup: Optional[Callable] = None):
+    """Inicializador de cada proceso del pool: fija los hilos de OpenCV y precarga modelos"""
+    for var in _THREAD_ENV_VARS:
+        os.environ[var] = str(cv_threads)
+    try:
+        import cv2
+        cv2.setNumThreads(cv_threads)
+    except ImportError:
+        pass
+    if warmup is not None:
+        warmup()
+
+
+def _noop():
+    return None
+
+
+def _timed_call(fn: Callable, args: tuple, kwargs: dict):
+    """Ejecuta la tarea en el worker y devuelve el resultado con sus tiempos"""
+    started_at = time.time()
+    result = fn(*args, **kwargs)
+    return result, started_at, time.time() - started_at
+
+
+class ComputeExecutor:
+    """Pool de procesos con cola acotada, admisión por WFQ y métricas de profundidad y latencia"""
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        cv_threads: int = 1,
+        warmup: Optional[Callable] = None
+    ):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = max_queue if max_queue is not None else 2 * self.max_workers
+        self.cv_threads = cv_threads
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(cv_threads, warmup)
+        )
+        # Las tareas esperan turno aquí (no en la cola FIFO del pool) para respetar prioridades
+        self._gate = FairShareGate(self.max_workers)
+        self.in_flight = 0
+        self.submitted_count = 0
+        self.completed_count = 0
+        self.failed_count = 0
+        self.rejected_count = 0
+        self.cancelled_count = 0
+        self.wait_times = deque(maxlen=1000)
+        self.run_times = deque(maxlen=1000)
+
+    def prestart(self):
+        """Arranca todos los workers (y su warmup) sin esperar al primer request"""
+        for _ in range(self.max_workers):
+            self._pool.submit(_noop)
+
+    @property
+    def queue_depth(self) -> int:
+        """Tareas aceptadas que aún esperan un worker libre"""
+        return max(0, self.in_flight - self.max_workers)
+
+    async def run(
+        self,
+        fn: Callable,
+        *args,
+        tenant: Optional[str] = None,
+        triage: Optional[str] = None,
+        **kwargs
+    ) -> Any:
+        """Envía la tarea al pool y espera su resultado sin bloquear el event loop
+
+        ``tenant`` y ``triage`` (rojo, amarillo, verde) deciden el orden de
+        admisión cuando todos los workers están ocupados.
+        """
+        if self.in_flight >= self.max_workers + self.max_queue:
+            self.rejected_count += 1
+            raise ComputeQueueFullError(
+                "El servidor está procesando demasiados videos, intente más tarde",
+                "COMPUTE_QUEUE_FULL",
+                {"in_flight": self.in_flight, "max_queue": self.max_queue}
+            )
+
+        tenant = tenant or DEFAULT_TENANT
+        triage = normalize_triage(triage) or DEFAULT_TRIAGE
+        self.in_flight += 1
+        self.submitted_count += 1
+        submitted_at = time.time()
+        try:
+            await self._gate.acquire(tenant, triage)
+            try:
+                future = self._pool.submit(_timed_call, fn, args, kwargs)
+                result, started_at, run_time = await self._wait(future)
+            finally:
+                self._gate.release()
+        except Exception:
+            self.failed_count += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+        wait_time = max(0.0, started_at - submitted_at)
+        self.completed_count += 1
+        self.wait_times.append(wait_time)
+        self._gate.record_wait(triage, wait_time)
+        self.run_times.append(run_time)
+        return result
+
+    async def _wait(self, future: Future):
+        """Espera el trabajo del pool; si se cancela, solo lo descarta si aún no empezó
+
+        Un trabajo que ya corre en un worker (o está en la cola interna del
+        pool) no se puede interrumpir: se espera a que termine antes de
+        propagar la cancelación, para que su hueco en el gate e ``in_flight``
+        sigan contándolo mientras ocupa el worker.
+        """
+        wrapped = asyncio.wrap_future(future)
+        try:
+            return await asyncio.shield(wrapped)
+        except asyncio.CancelledError:
+            self.cancelled_count += 1
+            if not future.cancel():
+                while not wrapped.done():
+                    try:
+                        await asyncio.wait({wrapped})
+                    except asyncio.CancelledError:
+                        pass
+                if not wrapped.cancelled():
+                    # El resultado (o error) del trabajo abandonado se descarta
+                    wrapped.exception()
+            raise
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Obtener métricas del ejecutor"""
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "cv_threads": self.cv_threads,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "submitted": self.submitted_count,
+            "completed": self.completed_count,
+            "failed": self.failed_count,
+            "rejected": self.rejected_count,
+            "cancelled": self.cancelled_count,
+            "average_wait_time": sum(self.wait_times) / len(self.wait_times) if self.wait_times else 0,
+            "p95_wait_time": percentile(self.wait_times, 95),
+            "average_run_time": sum(self.run_times) / len(self.run_times) if self.run_times else 0,
+            "p95_run_time": percentile(self.run_times, 95),
+            "wait_by_triage": self._gate.get_metrics(),
+            "timestamp": datetime.now().isoformat()
+        }
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+
+# Instancia global del ejecutor
+compute_executor = None
+
+def get_compute_executor() -> ComputeExecutor:
+    """Obtener (creando si hace falta) el ejecutor de cómputo"""
+    global compute_executor
+    if compute_executor is None:
+        from .face_detection import preload_face_detector
+        compute_executor = ComputeExecutor(
+            max_workers=int(os.getenv("RPPG_WORKERS", "0")) or None,
+            max_queue=int(os.getenv("RPPG_MAX_QUEUE")) if os.getenv("RPPG_MAX_QUEUE") else None,
+            cv_threads=int(os.getenv("RPPG_CV_THREADS", "1")),
+            warmup=preload_face_detector
+        )
+        logger.info(
+            f"Compute executor started: {compute_executor.max_workers} workers, "
+            f"queue {compute_executor.max_queue}"
+        )
+    return compute_executor
+
+def shutdown_compute_executor():
+    """Detener el ejecutor de cómputo si fue creado"""
+    global compute_executor
+    if compute_executor is not None:
+        compute_executor.shutdown()
+        compute_executor = None
@@ -0,0 +1,46 @@
+"""
+Utilidades de procesamiento de señal compartidas por rppg_core y vitails
+
+Los diseños de filtros y las ventanas dependen solo de (FS, banda, orden) o
+de la longitud, así que se calculan una vez por proceso y se reutilizan.
+Los arrays devueltos son compartidos: no deben modificarse.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+from scipy import signal
+
+
+@lru_cache(maxsize=128)
+def bandpass_sos(FS: float, low: float, high: float, order: int):
+    """Butterworth pasa banda en secciones de segundo orden"""
+    NyquistF = FS / 2.0
+    # Sin setflags(write=False): sosfilt exige un buffer escribible
+    return signal.butter(order, [low / NyquistF, high / NyquistF], btype='bandpass', output='sos')
+
+
+def filtfilt_padlen(order: int) -> int:
+    """padlen que usaría ``signal.filtfilt`` con los coeficientes (b, a) del mismo diseño"""
+    # Un pasa banda de orden n tiene 2n + 1 coeficientes en b y en a
+    return 3 * (2 * order + 1)
+
+
+def sos_filtfilt_padlen(sos) -> int:
+    """padlen que usaría ``signal.filtfilt`` con el (b, a) equivalente a las secciones ``sos``"""
+    # Cada sección aporta dos coeficientes: b y a tienen 2 * n_secciones + 1
+    return 3 * (2 * np.asarray(sos).shape[0] + 1)
+
+
+@lru_cache(maxsize=128)
+def hann_window(length: int):
+    """Ventana de Hann simétrica (la de ``signal.windows.hann``)"""
+    window = signal.windows.hann(length)
+    window.setflags(write=False)
+    return window
+
+
+def sliding_windows(x, starts, length: int):
+    """Ventanas (n_win, ..., length) de ``x`` a lo largo del eje 0 que comienzan en ``starts``"""
+    views = np.lib.stride_tricks.sliding_window_view(x, length, axis=0)
+    return views[np.asarray(starts)]
@@ -32,6 +32,10 @@ class SignaApiError(Exception):
         self.details = details or {}
         super().__init__(self.message)
 
+    def __reduce__(self):
+        # Permite que el error cruce procesos (ProcessPoolExecutor) sin perder datos
+        return (type(self), (self.message, self.error_code, self.details))
+
 class ValidationError(SignaApiError):
     """Error de validación de datos"""
     pass
@@ -52,6 +56,18 @@ class DuplicateResourceError(SignaApiError):
     """Error de recurso duplicado"""
     pass
 
+class RPPGProcessingError(SignaApiError):
+    """Error al procesar un video rPPG"""
+    pass
+
+class ComputeQueueFullError(SignaApiError):
+    """La cola del ejecutor de cómputo está llena"""
+    pass
+
+class VideoRejectedError(SignaApiError):
+    """El video no es utilizable para rPPG (detectado antes de decodificarlo entero)"""
+    pass
+
 def log_error(error: Exception, context: Dict[str, Any] = None):
     """Función para logging de errores con contexto"""
     error_data = {
@@ -0,0 +1,437 @@
+"""
+Registro de detectores faciales para el pipeline rPPG
+
+Cada backend expone ``detect(frame_bgr) -> [(x, y, w, h, score), ...]``.
+Los detectores se crean una sola vez por proceso/hilo, se calientan con un
+frame vacío y se reutilizan entre requests.
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import cv2
+    CV2_AVAILABLE = True
+except ImportError as e:
+    print(f"Warning: OpenCV not available: {e}")
+    CV2_AVAILABLE = False
+
+logger = logging.getLogger("signaapi.face_detection")
+
+DEFAULT_FACE_DETECTOR = os.getenv("RPPG_FACE_DETECTOR", "cvzone")
+MIN_DETECTION_CONFIDENCE = 0.6  # Menor umbral para aceptar más caras
+
+# Detección completa cada N frames; entre medio la caja se propaga con un tracker
+DEFAULT_DETECTION_STRIDE = int(os.getenv("RPPG_DETECTION_STRIDE", "1"))
+DEFAULT_TRACKER = os.getenv("RPPG_TRACKER", "template")
+# Ancho del frame reducido sobre el que se detecta/sigue la cara (0 = resolución completa)
+DEFAULT_DETECTION_WIDTH = int(os.getenv("RPPG_DETECTION_WIDTH", "320"))
+MIN_TRACKING_CONFIDENCE = 0.6
+
+Detection = Tuple[int, int, int, int, float]
+BBox = Tuple[int, int, int, int]
+
+
+class CvzoneFaceDetector:
+    """Detector original basado en cvzone (mediapipe por debajo)"""
+
+    def __init__(self, min_confidence: float = MIN_DETECTION_CONFIDENCE):
+        from cvzone.FaceDetectionModule import FaceDetector
+        self._detector = FaceDetector(minDetectionCon=min_confidence)
+
+    def detect(self, frame) -> List[Detection]:
+        _, bboxs = self._detector.findFaces(frame, draw=False)
+        detections = []
+        for bbox_info in bboxs or []:
+            x, y, w, h = bbox_info['bbox']
+            score = bbox_info.get('score', [1.0])
+            detections.append((int(x), int(y), int(w), int(h), float(score[0] if score else 1.0)))
+        return detections
+
+
+class MediapipeFaceDetector:
+    """BlazeFace de mediapipe sin la capa de cvzone"""
+
+    def __init__(self, min_confidence: float = MIN_DETECTION_CONFIDENCE):
+        import mediapipe as mp
+        self._mp = mp
+        if hasattr(mp, "solutions"):
+            self._detector = mp.solutions.face_detection.FaceDetection(
+                model_selection=0, min_detection_confidence=min_confidence
+            )
+            self._legacy = True
+        else:
+            from mediapipe.tasks import python as mp_python
+            from mediapipe.tasks.python import vision
+            model_path = os.getenv("RPPG_MEDIAPIPE_MODEL", "blaze_face_short_range.tflite")
+            options = vision.FaceDetectorOptions(
+                base_options=mp_python.BaseOptions(model_asset_path=model_path),
+                min_detection_confidence=min_confidence
+            )
+            self._detector = vision.FaceDetector.create_from_options(options)
+            self._legacy = False
+
+    def detect(self, frame) -> List[Detection]:
+        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        height, width = frame.shape[:2]
+        detections = []
+        if self._legacy:
+            results = self._detector.process(frame_rgb)
+            for detection in results.detections or []:
+                box = detection.location_data.relative_bounding_box
+                detections.append((
+                    int(box.xmin * width), int(box.ymin * height),
+                    int(box.width * width), int(box.height * height),
+                    float(detection.score[0])
+                ))
+        else:
+            image = self._mp.Image(image_format=self._mp.ImageFormat.SRGB, data=frame_rgb)
+            for detection in self._detector.detect(image).detections:
+                box = detection.bounding_box
+                detections.append((
+                    box.origin_x, box.origin_y, box.width, box.height,
+                    float(detection.categories[0].score)
+                ))
+        return detections
+
+
+class OpenCVDNNFaceDetector:
+    """SSD ResNet-10 (res10_300x300) cargado con cv2.dnn"""
+
+    def __init__(self, min_confidence: float = MIN_DETECTION_CONFIDENCE):
+        prototxt = os.getenv("RPPG_DNN_PROTOTXT", "models/deploy.prototxt")
+        model = os.getenv("RPPG_DNN_MODEL", "models/res10_300x300_ssd_iter_140000.caffemodel")
+        if not os.path.exists(prototxt) or not os.path.exists(model):
+            raise ImportError(f"OpenCV DNN face model not found: {prototxt}, {model}")
+        self._net = cv2.dnn.readNetFromCaffe(prototxt, model)
+        self._min_confidence = min_confidence
+
+    def detect(self, frame) -> List[Detection]:
+        height, width = frame.shape[:2]
+        blob = cv2.dnn.blobFromImage(frame, 1.0, (300, 300), (104.0, 177.0, 123.0))
+        self._net.setInput(blob)
+        output = self._net.forward()[0, 0]
+        detections = []
+        for _, _, score, x1, y1, x2, y2 in output:
+            if score < self._min_confidence:
+                continue
+            x, y = int(x1 * width), int(y1 * height)
+            detections.append((x, y, int(x2 * width) - x, int(y2 * height) - y, float(score)))
+        return detections
+
+
+class HaarFaceDetector:
+    """Cascada Haar frontal de OpenCV: la opción más barata en CPU"""
+
+    def __init__(self, min_confidence: float = MIN_DETECTION_CONFIDENCE):
+        default_path = ""
+        if hasattr(cv2, "data"):
+            default_path = os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml")
+        cascade_path = os.getenv("RPPG_HAAR_CASCADE", default_path)
+        self._cascade = cv2.CascadeClassifier(cascade_path)
+        if self._cascade.empty():
+            raise ImportError(f"Haar cascade not found: {cascade_path}")
+
+    def detect(self, frame) -> List[Detection]:
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        faces = self._cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
+        return [(int(x), int(y), int(w), int(h), 1.0) for x, y, w, h in faces]
+
+
+FACE_DETECTOR_BACKENDS: Dict[str, Callable[[], object]] = {
+    "cvzone": CvzoneFaceDetector,
+    "mediapipe": MediapipeFaceDetector,
+    "opencv_dnn": OpenCVDNNFaceDetector,
+    "haar": HaarFaceDetector,
+}
+
+# Un detector por hilo: los grafos de mediapipe no son seguros entre hilos
+_local = threading.local()
+
+
+def register_face_detector(name: str, factory: Callable[[], object]):
+    """Registrar un backend adicional de detección facial"""
+    FACE_DETECTOR_BACKENDS[name] = factory
+
+
+def warm_up_detector(detector):
+    """Ejecuta una detección sobre un frame vacío para cargar el modelo"""
+    detector.detect(np.zeros((240, 320, 3), dtype=np.uint8))
+
+
+def get_face_detector(backend: Optional[str] = None):
+    """Obtener el detector del backend indicado, creándolo una vez por hilo"""
+    backend = backend or DEFAULT_FACE_DETECTOR
+    if not CV2_AVAILABLE:
+        raise ImportError("OpenCV is not available. Cannot detect faces.")
+    if backend not in FACE_DETECTOR_BACKENDS:
+        raise ValueError(f"Unknown face detector backend: {backend}")
+
+    detectors = getattr(_local, "detectors", None)
+    if detectors is None:
+        detectors = _local.detectors = {}
+    if backend not in detectors:
+        try:
+            detector = FACE_DETECTOR_BACKENDS[backend]()
+        except Exception as e:
+            raise ImportError(f"Face detector '{backend}' could not be created: {e}") from e
+        warm_up_detector(detector)
+        detectors[backend] = detector
+        logger.info(f"Face detector '{backend}' loaded (pid {os.getpid()})")
+    return detectors[backend]
+
+
+def preload_face_detector(backend: Optional[str] = None):
+    """Crear y calentar el detector al arrancar un worker; los errores solo se registran"""
+    try:
+        get_face_detector(backend)
+    except Exception as e:
+        logger.warning(f"Face detector preload failed: {e}")
+
+
+def available_backends() -> List[str]:
+    """Backends que se pueden instanciar en este entorno"""
+    available = []
+    for name in FACE_DETECTOR_BACKENDS:
+        try:
+            get_face_detector(name)
+            available.append(name)
+        except Exception:
+            continue
+    return available
+
+
+def _clip_bbox(bbox, width: int, height: int) -> Optional[BBox]:
+    x, y, w, h = bbox
+    x1, y1 = max(0, int(x)), max(0, int(y))
+    x2, y2 = min(width, int(x + w)), min(height, int(y + h))
+    if x2 - x1 < 2 or y2 - y1 < 2:
+        return None
+    return x1, y1, x2 - x1, y2 - y1
+
+
+class TemplateTracker:
+    """Correlación normalizada de la plantilla de la última detección en una ventana de búsqueda.
+
+    La búsqueda se hace sobre versiones reducidas (lado mayor ~``template_size`` px).
+    """
+
+    def __init__(self, search_margin: float = 0.5, template_size: int = 48):
+        self.search_margin = search_margin
+        self.template_size = template_size
+        self._template = None
+        self._bbox = None
+        self._scale = 1.0
+
+    def init(self, frame_gray, bbox: BBox):
+        x, y, w, h = bbox
+        self._scale = min(1.0, self.template_size / max(w, h))
+        self._template = cv2.resize(
+            frame_gray[y:y + h, x:x + w], None, fx=self._scale, fy=self._scale, interpolation=cv2.INTER_AREA
+        )
+        self._bbox = bbox
+
+    def update(self, frame_gray) -> Tuple[Optional[BBox], float]:
+        x, y, w, h = self._bbox
+        height, width = frame_gray.shape[:2]
+        mx, my = int(w * self.search_margin), int(h * self.search_margin)
+        sx1, sy1 = max(0, x - mx), max(0, y - my)
+        sx2, sy2 = min(width, x + w + mx), min(height, y + h + my)
+        search = cv2.resize(
+            frame_gray[sy1:sy2, sx1:sx2], None, fx=self._scale, fy=self._scale, interpolation=cv2.INTER_AREA
+        )
+        th, tw = self._template.shape[:2]
+        if search.shape[0] < th or search.shape[1] < tw:
+            return None, 0.0
+        scores = cv2.matchTemplate(search, self._template, cv2.TM_CCOEFF_NORMED)
+        _, max_score, _, (dx, dy) = cv2.minMaxLoc(scores)
+        self._bbox = (sx1 + int(round(dx / self._scale)), sy1 + int(round(dy / self._scale)), w, h)
+        return self._bbox, float(max_score)
+
+
+class OpticalFlowTracker:
+    """Desplazamiento mediano de puntos Lucas-Kanade dentro de la caja"""
+
+    def __init__(self, max_points: int = 50):
+        self.max_points = max_points
+        self._prev_gray = None
+        self._points = None
+        self._bbox = None
+
+    def init(self, frame_gray, bbox: BBox):
+        x, y, w, h = bbox
+        mask = np.zeros_like(frame_gray)
+        mask[y:y + h, x:x + w] = 255
+        self._points = cv2.goodFeaturesToTrack(frame_gray, self.max_points, 0.01, 5, mask=mask)
+        self._prev_gray = frame_gray
+        self._bbox = bbox
+
+    def update(self, frame_gray) -> Tuple[Optional[BBox], float]:
+        if self._points is None or len(self._points) == 0:
+            return None, 0.0
+        points, status, _ = cv2.calcOpticalFlowPyrLK(self._prev_gray, frame_gray, self._points, None)
+        good = status.ravel() == 1
+        if not good.any():
+            return None, 0.0
+        dx, dy = np.median((points - self._points)[good].reshape(-1, 2), axis=0)
+        x, y, w, h = self._bbox
+        self._bbox = (int(round(x + dx)), int(round(y + dy)), w, h)
+        confidence = float(good.mean())
+        self._points = points[good].reshape(-1, 1, 2)
+        self._prev_gray = frame_gray
+        return self._bbox, confidence
+
+
+class OpenCVTracker:
+    """Trackers de OpenCV (KCF, CSRT, MIL); trabajan sobre el frame BGR"""
+
+    uses_color = True
+
+    def __init__(self, kind: str):
+        factory = getattr(cv2, f"Tracker{kind}_create", None)
+        if factory is None and hasattr(cv2, "legacy"):
+            factory = getattr(cv2.legacy, f"Tracker{kind}_create", None)
+        if factory is None:
+            raise ImportError(f"OpenCV tracker {kind} not available")
+        self._factory = factory
+        self._tracker = None
+
+    def init(self, frame, bbox: BBox):
+        self._tracker = self._factory()
+        self._tracker.init(frame, tuple(int(v) for v in bbox))
+
+    def update(self, frame) -> Tuple[Optional[BBox], float]:
+        ok, bbox = self._tracker.update(frame)
+        if not ok:
+            return None, 0.0
+        return tuple(int(v) for v in bbox), 1.0
+
+
+FACE_TRACKERS: Dict[str, Callable[[], object]] = {
+    "template": TemplateTracker,
+    "optical_flow": OpticalFlowTracker,
+    "kcf": lambda: OpenCVTracker("KCF"),
+    "csrt": lambda: OpenCVTracker("CSRT"),
+    "mil": lambda: OpenCVTracker("MIL"),
+}
+
+
+class FaceLocator:
+    """Detect-then-track: detección completa cada ``detection_stride`` frames
+    (o cuando la confianza del tracker cae) y seguimiento barato entre medio.
+
+    Las detecciones programadas caen en los frames múltiplos de
+    ``detection_stride`` contando desde ``first_frame`` (índice absoluto del
+    primer frame recibido); una re-detección por baja confianza no desplaza
+    ese calendario. Así un tramo del video que empieza en un múltiplo del paso
+    detecta en los mismos frames que la pasada completa.
+
+    Detección y seguimiento trabajan sobre una copia reducida a
+    ``detection_width`` px de ancho; las cajas se devuelven en coordenadas
+    del frame original. Acumula en ``timings`` el tiempo de cada etapa.
+    """
+
+    def __init__(
+        self,
+        detector,
+        detection_stride: int = DEFAULT_DETECTION_STRIDE,
+        tracker: Optional[str] = DEFAULT_TRACKER,
+        min_tracking_confidence: float = MIN_TRACKING_CONFIDENCE,
+        detection_width: int = DEFAULT_DETECTION_WIDTH,
+        first_frame: int = 0
+    ):
+        self.detector = detector
+        self.detection_width = max(0, int(detection_width or 0))
+        self._small = None
+        self.detection_stride = max(1, int(detection_stride or 1))
+        if self.detection_stride > 1 and tracker not in (None, "none"):
+            if tracker not in FACE_TRACKERS:
+                raise ValueError(f"Unknown face tracker: {tracker}")
+            self._tracker = FACE_TRACKERS[tracker]()
+        else:
+            self._tracker = None
+        self.min_tracking_confidence = min_tracking_confidence
+        self._frame_index = int(first_frame)
+        self._tracking = False
+        self.timings = {"resize": 0.0, "detect": 0.0, "track": 0.0}
+        self.counts = {"detected": 0, "tracked": 0, "redetections": 0}
+
+    def _detect(self, frame) -> Optional[BBox]:
+        start = time.perf_counter()
+        try:
+            detections = self.detector.detect(frame)
+        except Exception:
+            detections = []
+        self.timings["detect"] += time.perf_counter() - start
+        self.counts["detected"] += 1
+        # Buscar la cara más grande
+        largest_bbox = None
+        max_area = 0
+        for x, y, w, h, _ in detections:
+            area = w * h
+            if area > max_area:
+                max_area = area
+                largest_bbox = (x, y, w, h)
+        return largest_bbox
+
+    def _tracker_input(self, frame):
+        if getattr(self._tracker, "uses_color", False):
+            return frame
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+    def locate(self, frame) -> Optional[BBox]:
+        """Caja (x, y, w, h) de la cara en el frame original, o None si no hay cara"""
+        full_height, full_width = frame.shape[:2]
+        if not self.detection_width or full_width <= self.detection_width:
+            return self._locate(frame)
+
+        start = time.perf_counter()
+        scale = self.detection_width / full_width
+        size = (self.detection_width, max(1, int(round(full_height * scale))))
+        # Reutilizar el buffer del frame reducido entre frames del mismo video
+        if self._small is None or self._small.shape[:2] != (size[1], size[0]):
+            self._small = np.empty((size[1], size[0], 3), dtype=np.uint8)
+        small = cv2.resize(frame, size, dst=self._small, interpolation=cv2.INTER_AREA)
+        self.timings["resize"] += time.perf_counter() - start
+        bbox = self._locate(small)
+        if bbox is None:
+            return None
+        # Reescalar la caja a la resolución original para recortar el ROI
+        x, y, w, h = bbox
+        return (
+            int(round(x / scale)), int(round(y / scale)),
+            int(round(w / scale)), int(round(h / scale))
+        )
+
+    def _locate(self, frame) -> Optional[BBox]:
+        height, width = frame.shape[:2]
+        scheduled = self._frame_index % self.detection_stride == 0
+        self._frame_index += 1
+        if self._tracker is not None and self._tracking and not scheduled:
+            start = time.perf_counter()
+            bbox, confidence = self._tracker.update(self._tracker_input(frame))
+            self.timings["track"] += time.perf_counter() - start
+            if bbox is not None and confidence >= self.min_tracking_confidence:
+                clipped = _clip_bbox(bbox, width, height)
+                if clipped is not None:
+                    self.counts["tracked"] += 1
+                    return clipped
+            # Confianza baja: volver a detectar en este mismo frame
+            self.counts["redetections"] += 1
+
+        bbox = self._detect(frame)
+        self._tracking = False
+        if bbox is None:
+            return None
+        clipped = _clip_bbox(bbox, width, height)
+        if clipped is not None and self._tracker is not None:
+            start = time.perf_counter()
+            self._tracker.init(self._tracker_input(frame), clipped)
+            self.timings["track"] += time.perf_counter() - start
+            self._tracking = True
+        return bbox
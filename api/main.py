@@ -1,13 +1,18 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Request, status, Body, Query
+from fastapi import APIRouter, FastAPI, UploadFile, File, HTTPException, Request, status, Body, Query, Header, Depends, WebSocket, WebSocketDisconnect
 from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
+import asyncio
 import tempfile, os
+import shutil
+import hashlib
 import numpy as np
 import logging
+import json
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Awaitable, Callable, Dict, Any, Optional
 import traceback
 from pydantic import BaseModel
 import os
@@ -41,7 +46,10 @@ from .error_handlers import (
     ValidationError,
     DatabaseError,
     ResourceNotFoundError,
-    DuplicateResourceError
+    DuplicateResourceError,
+    RPPGProcessingError,
+    ComputeQueueFullError,
+    VideoRejectedError
 )
 
 from .middleware import (
@@ -57,7 +65,21 @@ logger = logging.getLogger(__name__)
 
 # Importar módulos con manejo de errores
 try:
-    from .rppg_core import read_video_with_face_detection_and_FS, CHROME_DEHAAN, extract_heart_rate
+    from .rppg_pipeline import (
+        RPPG_MODES, analyze_segment_traces, analyze_video_file, plan_video_segments, read_video_segment
+    )
+    from .rppg_core import video_frame_info
+    from .face_detection import FACE_TRACKERS
+    from .rppg_algorithms import BVP_ALGORITHMS, DEFAULT_ALGORITHM
+    from .rppg_probe import get_video_prober
+    from .rppg_stream import (
+        STREAM_MAX_FRAME_BYTES, RPPGStreamSession, get_rppg_stream_registry, get_stream_thread_pool,
+        shutdown_stream_thread_pool
+    )
+    from .rppg_encoding import (
+        BVP_ENCODINGS, MAX_BVP_DOWNSAMPLE, encode_rppg_content, negotiate_rppg_format, render_rppg_body,
+        render_rppg_response
+    )
     RPPG_AVAILABLE = True
     logger.info("RPPG module loaded successfully")
 except ImportError as e:
@@ -66,6 +88,7 @@ except ImportError as e:
 
 try:
     from .vitails import extract_respiratory_rate, calculate_hrv
+    from .vitals_batch import VITALS_BATCH_MAX_MB, parse_batch_body, run_vitals_batch
     VITALS_AVAILABLE = True
     logger.info("Vitals module loaded successfully")
 except ImportError as e:
@@ -75,8 +98,19 @@ except ImportError as e:
 from sqlmodel import SQLModel, Session, create_engine, select
 from .models import Doctor, Paciente, HistoriaClinica, Visita, Diagnostico, SensorReading
 from .db import init_db as init_saas_db
+from .compute_executor import get_compute_executor, shutdown_compute_executor
+from .rppg_jobs import get_rppg_job_queue
+from .rppg_scheduler import DEFAULT_TRIAGE, TRIAGE_WEIGHTS, normalize_triage
+from .rppg_uploads import (
+    UPLOAD_CHUNK_SIZE, get_upload_session_store, read_upload_bytes, save_upload_file, validate_rppg_upload
+)
+from .rppg_cache import file_sha256, get_rppg_cache, rppg_cache_key
+from .rppg_profiling import get_rppg_profile_metrics, server_timing_header
 # from .router_saas import router as saas_router
 
+# Endpoints rPPG: se registran en la app solo si OpenCV y SciPy están disponibles
+rppg_router = APIRouter()
+
 app = FastAPI(
     title="SignaApi",
     description="API clínica para gestión de pacientes, doctores, historias clínicas, visitas y diagnósticos",
@@ -86,7 +120,7 @@ app = FastAPI(
 
 
 @app.on_event("startup")
-def startup_event():
+async def startup_event():
     # Create default admin user if not exists
     try:
         with Session(engine) as session:
@@ -108,6 +142,25 @@ def startup_event():
     except Exception as e:
         logger.error(f"Failed to create admin user: {e}")
 
+    # Arrancar los workers rPPG y los hilos del stream con el detector facial ya cargado
+    if RPPG_AVAILABLE:
+        executor = get_compute_executor()
+        executor.prestart()
+        get_stream_thread_pool().prestart()
+        # Vaciar la cola persistente (incluye trabajos interrumpidos por un reinicio)
+        job_workers = int(os.getenv("RPPG_JOB_WORKERS", "0")) or executor.max_workers
+        await get_rppg_job_queue().start(job_workers, _run_rppg_job)
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    from .rppg_jobs import rppg_job_queue
+    if rppg_job_queue is not None:
+        await rppg_job_queue.stop()
+    shutdown_compute_executor()
+    if RPPG_AVAILABLE:
+        shutdown_stream_thread_pool()
+
 
 # app.include_router(saas_router)
 
@@ -274,6 +327,20 @@ async def http_exception_handler(request: Request, exc: StarletteHTTPException):
         }
     )
 
+@app.exception_handler(VideoRejectedError)
+async def video_rejected_exception_handler(request: Request, exc: VideoRejectedError):
+    logger.info(f"Video rejected by probe ({exc.error_code}): {exc.message}")
+    return JSONResponse(
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        content={
+            "error": "Video Rejected",
+            "error_code": exc.error_code,
+            "message": exc.message,
+            "details": exc.details,
+            "timestamp": datetime.now().isoformat()
+        }
+    )
+
 @app.exception_handler(Exception)
 async def general_exception_handler(request: Request, exc: Exception):
     logger.error(f"Unexpected error: {str(exc)}")
@@ -563,8 +630,29 @@ def get_metrics():
         event_middleware = get_event_middleware()
         metrics = event_middleware.get_metrics() if event_middleware else {}
         
+        from .compute_executor import compute_executor
+        from .rppg_jobs import rppg_job_queue
+        from .rppg_uploads import upload_session_store
+        from .rppg_cache import rppg_result_cache
+        from .rppg_profiling import rppg_profile_metrics
+        # Estos módulos requieren OpenCV/SciPy: solo se consultan si se cargaron
+        rppg_stream_registry = video_prober = vitals_batch_metrics = None
+        if RPPG_AVAILABLE:
+            from .rppg_stream import rppg_stream_registry
+            from .rppg_probe import video_prober
+        if VITALS_AVAILABLE:
+            from .vitals_batch import vitals_batch_metrics
+        
         return {
             "metrics": metrics,
+            "rppg_executor": compute_executor.get_metrics() if compute_executor else {},
+            "rppg_jobs": rppg_job_queue.get_metrics() if rppg_job_queue else {},
+            "rppg_uploads": upload_session_store.get_metrics() if upload_session_store else {},
+            "rppg_cache": rppg_result_cache.get_metrics() if rppg_result_cache else {},
+            "rppg_stream": rppg_stream_registry.get_metrics() if rppg_stream_registry else {},
+            "rppg_probe": video_prober.get_metrics() if video_prober else {},
+            "rppg_profile": rppg_profile_metrics.get_metrics() if rppg_profile_metrics else {},
+            "vitals_batch": vitals_batch_metrics.get_metrics() if vitals_batch_metrics else {},
             "system_info": {
                 "rppg_available": RPPG_AVAILABLE,
                 "vitals_available": VITALS_AVAILABLE,
@@ -914,105 +1002,275 @@ def listar_visitas_con_pacientes():
             detail="Error interno del servidor"
         )
 
-@app.post("/rppg")
-async def analyze_video(file: UploadFile = File(...)):
-    if not RPPG_AVAILABLE or not VITALS_AVAILABLE:
-        logger.error("RPPG processing requested but not available")
-        return JSONResponse(
-            status_code=503,
-            content={
-                "error": "RPPG processing is not available. OpenCV or related dependencies are not properly installed.",
-                "message": "Please check the server configuration.",
-                "timestamp": datetime.now().isoformat()
-            }
+def _rppg_unavailable_response():
+    logger.error("RPPG processing requested but not available")
+    return JSONResponse(
+        status_code=503,
+        content={
+            "error": "RPPG processing is not available. OpenCV or related dependencies are not properly installed.",
+            "message": "Please check the server configuration.",
+            "timestamp": datetime.now().isoformat()
+        }
+    )
+
+def _upload_http_error(e: ValidationError) -> HTTPException:
+    """Traduce un error de validación de la subida a su código HTTP"""
+    status_codes = {
+        "FILE_TOO_LARGE": status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        "UPLOAD_OFFSET_MISMATCH": status.HTTP_409_CONFLICT,
+        "UPLOAD_INCOMPLETE": status.HTTP_409_CONFLICT,
+    }
+    return HTTPException(
+        status_code=status_codes.get(e.error_code, status.HTTP_400_BAD_REQUEST),
+        detail=e.message
+    )
+
+def rppg_analysis_params(
+    detection_stride: Optional[int] = Query(None, ge=1, le=120, description="Detección completa cada N frames"),
+    tracker: Optional[str] = Query(None, description="Tracker entre detecciones: template, optical_flow, kcf, csrt, mil o none"),
+    detection_width: Optional[int] = Query(None, ge=0, le=4096, description="Ancho (px) del frame reducido para detectar; 0 = resolución completa"),
+    skin_mask: bool = Query(False, description="Promediar solo los píxeles de piel (YCrCb) del ROI"),
+    algorithm: str = Query("chrom", description="Algoritmo rPPG: chrom, pos, green, pca o ica"),
+    converge: bool = Query(False, description="Dejar de decodificar cuando la HR se estabilice"),
+    convergence_tolerance: float = Query(2.0, gt=0, le=20, description="Tolerancia (lpm) para considerar estable la HR"),
+    max_seconds: Optional[float] = Query(None, gt=0, description="Segundos máximos de frames limpios a analizar"),
+    max_frames: Optional[int] = Query(None, ge=1, description="Frames limpios máximos a analizar"),
+    mode: str = Query("precise", description="precise (completo) o quick (HR provisional en ~1 s)")
+) -> Dict[str, Any]:
+    """Parámetros de análisis comunes a los endpoints rPPG, ya validados"""
+    if tracker is not None and tracker != "none" and tracker not in FACE_TRACKERS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Tracker no soportado. Opciones: none, {', '.join(FACE_TRACKERS)}"
         )
     
+    if mode not in RPPG_MODES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Modo rPPG no soportado. Opciones: {', '.join(RPPG_MODES)}"
+        )
+    
+    if algorithm not in BVP_ALGORITHMS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Algoritmo rPPG no soportado. Opciones: {', '.join(BVP_ALGORITHMS)}"
+        )
+    
+    return {
+        "detection_stride": detection_stride,
+        "tracker": tracker,
+        "detection_width": detection_width,
+        "skin_mask": skin_mask,
+        "algorithm": algorithm,
+        "converge": converge,
+        "convergence_tolerance": convergence_tolerance,
+        "max_seconds": max_seconds,
+        "max_frames": max_frames,
+        "mode": mode
+    }
+
+def rppg_scheduling(
+    request: Request,
+    priority: Optional[str] = Query(None, description="Prioridad de triaje: rojo, amarillo o verde"),
+    visita_id: Optional[int] = Query(None, description="Visita enlazada; su evaluacion_triaje fija la prioridad"),
+    x_tenant_id: Optional[str] = Header(None, description="Clínica o cliente para el reparto justo de CPU")
+) -> Dict[str, str]:
+    """Tenant y clase de triaje con los que se planifica el análisis"""
+    return {
+        "tenant": _rppg_tenant(request, x_tenant_id),
+        "triage": _resolve_rppg_triage(priority, visita_id)
+    }
+
+def rppg_response_encoding(
+    accept: Optional[str] = Header(None, description="application/json (por defecto), application/x-npy o application/msgpack"),
+    bvp_encoding: str = Query("list", description="BVP en JSON: list (floats) o base64 (float32)"),
+    bvp_downsample: int = Query(1, ge=1, description="Diezmar el BVP por este factor")
+) -> Dict[str, Any]:
+    """Formato negociado de la respuesta rPPG"""
+    if bvp_downsample > MAX_BVP_DOWNSAMPLE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Factor de diezmado del BVP demasiado alto. Máximo: {MAX_BVP_DOWNSAMPLE}"
+        )
+    if bvp_encoding not in BVP_ENCODINGS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Codificación del BVP no soportada. Opciones: {', '.join(BVP_ENCODINGS)}"
+        )
     try:
-        # Validar archivo
-        if not file.filename:
+        fmt = negotiate_rppg_format(accept)
+    except ValidationError as e:
+        raise HTTPException(status_code=status.HTTP_406_NOT_ACCEPTABLE, detail=e.message)
+    return {"fmt": fmt, "bvp_encoding": bvp_encoding, "bvp_downsample": bvp_downsample}
+
+def _rppg_response_content(result: Dict[str, Any], filename: str) -> Dict[str, Any]:
+    """Cuerpo JSON de un análisis rPPG (compartido por /rppg y /rppg/jobs)"""
+    return {
+        "message": "Video processed successfully",
+        "filename": filename,
+        "algorithm": result["algorithm"],
+        "fps": result["fps"],
+        "bvp": result["bvp"].tolist(),
+        "ibi": result["peaks"],
+        "hr": result["hr"],
+        "hr_method": result["hr_method"],
+        "hr_spectral": result["hr_spectral"],
+        "hr_confidence": result["hr_confidence"],
+        "respiratory_rate": result["respiratory_rate"],
+        "hrv": result["hrv"],
+        "quality": result["quality"],
+        "hr_series": result["hr_series"],
+        "mode": result["mode"],
+        "provisional": result["mode"] == "quick",
+        "coverage": result["coverage"],
+        "timestamp": datetime.now().isoformat()
+    }
+
+def _resolve_rppg_triage(priority: Optional[str], visita_id: Optional[int]) -> str:
+    """Clase de triaje del análisis: explícita, la de la visita enlazada o la por defecto"""
+    if priority is not None:
+        triage = normalize_triage(priority)
+        if triage is None:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Archivo no válido"
+                detail=f"Prioridad no soportada. Opciones: {', '.join(TRIAGE_WEIGHTS)}"
             )
-        
-        # Validar tipo de archivo
-        allowed_extensions = ['.mp4', '.avi', '.mov', '.mkv', '.webm']
-        file_extension = os.path.splitext(file.filename)[1].lower()
-        if file_extension not in allowed_extensions:
+        return triage
+    
+    if visita_id is not None:
+        with Session(engine) as session:
+            visita = session.get(Visita, visita_id)
+        if not visita:
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Tipo de archivo no soportado. Formatos permitidos: {', '.join(allowed_extensions)}"
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Visita no encontrada"
             )
-        
-        # Crear un archivo temporal
-        with tempfile.NamedTemporaryFile(delete=True, suffix=file_extension) as tmp:
-            # Guardar el archivo subido en el archivo temporal
-            content = await file.read()
-            if len(content) == 0:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="El archivo está vacío"
-                )
-            
-            tmp.write(content)
-            tmp.flush()
-
-            logger.info(f"Procesando video: {file.filename}")
-
-            # Leer el video y detectar la cara
-            face_frames, fps = read_video_with_face_detection_and_FS(tmp.name)
-
-            if face_frames is None or fps is None:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="No se pudieron detectar caras en el video o el video es inválido"
-                )
-
-            # Procesar el video con CHROME-DEHAAN
-            bvp = CHROME_DEHAAN(face_frames, fps)
-
-            if bvp is None:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Error al procesar la señal BVP del video"
-                )
-
-            # Extraer frecuencia cardíaca
-            hr, peaks = extract_heart_rate(bvp, fps)
-
-            if hr is None:
-                hr = 0  # Valor por defecto si no se puede calcular
-                peaks = []  # Lista vacía si no se puede calcular
-
-            # Calcular la tasa de respiración
-            respiratory_rate = extract_respiratory_rate(bvp, fps)
-
-            if respiratory_rate is None:
-                respiratory_rate = 0  # Valor por defecto
-
-            # Calcular la variabilidad de la frecuencia cardíaca (HRV)
-            hrv = calculate_hrv(peaks, fps)
-
-            if hrv is None:
-                hrv = (0, 0)  # Valores por defecto
-
-            logger.info(f"Video procesado exitosamente: {file.filename}")
+        return normalize_triage(visita.evaluacion_triaje) or DEFAULT_TRIAGE
+    
+    return DEFAULT_TRIAGE
+
+def _rppg_tenant(request: Request, x_tenant_id: Optional[str]) -> str:
+    """Clave de reparto justo: cabecera X-Tenant-ID o, si falta, la IP del cliente"""
+    if x_tenant_id:
+        return x_tenant_id.strip()[:120]
+    return request.client.host if request.client else "anonymous"
+
+def _cached_rppg_content(content: Dict[str, Any], filename: str) -> Dict[str, Any]:
+    """Resultado guardado en caché con el nombre y la hora de esta petición"""
+    return {**content, "filename": filename, "timestamp": datetime.now().isoformat()}
+
+# Parámetros que cambian qué frames se decodifican: con ellos el video no se divide en tramos
+_SERIAL_RPPG_PARAMS = ("converge", "max_seconds", "max_frames")
+
+async def _run_rppg_analysis(video_path: str, params: Dict[str, Any], tenant: str, triage: str) -> Dict[str, Any]:
+    """Analiza el video en el pool de procesos, en tramos paralelos si es largo
+
+    Un video largo en modo preciso se divide en tramos que se decodifican a
+    la vez en los workers libres; sus trazas RGB se unen en orden y el BVP se
+    calcula sobre la traza completa, igual que en la pasada serie.
+    """
+    executor = get_compute_executor()
+    idle_workers = executor.max_workers - executor.in_flight
+    segments = []
+    if params.get("mode", "precise") == "precise" and not any(params.get(k) for k in _SERIAL_RPPG_PARAMS):
+        fps, frame_count = await run_in_threadpool(video_frame_info, video_path)
+        segments = plan_video_segments(fps, frame_count, idle_workers, params.get("detection_stride"))
+    if not segments:
+        return await executor.run(analyze_video_file, video_path, tenant=tenant, triage=triage, **params)
+
+    reader_params = {
+        key: params[key]
+        for key in ("detector_backend", "detection_stride", "tracker", "detection_width", "skin_mask")
+        if key in params
+    }
+    tasks = [
+        asyncio.create_task(
+            executor.run(read_video_segment, video_path, segment, tenant=tenant, triage=triage, **reader_params)
+        )
+        for segment in segments
+    ]
+    try:
+        parts = await asyncio.gather(*tasks)
+    except Exception:
+        # Si un tramo falla, los que aún esperan turno se descartan; los que ya
+        # corren en un worker se esperan antes de que el llamador borre el video
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    logger.info(f"Video analizado en {len(segments)} tramos paralelos: {video_path}")
+    # CHROM y signos vitales sobre la traza completa: el paso más pesado, también en un worker
+    return await executor.run(
+        analyze_segment_traces, list(parts), params.get("algorithm", DEFAULT_ALGORITHM),
+        tenant=tenant, triage=triage
+    )
 
-            # Retornar los resultados
-            return JSONResponse(content={
-                "message": "Video processed successfully",
-                "filename": file.filename,
-                "fps": fps,
-                "bvp": bvp.tolist() if hasattr(bvp, 'tolist') else list(bvp),
-                "ibi": list(peaks) if peaks else [],
-                "hr": hr if isinstance(hr, (int, float)) else 0,
-                "respiratory_rate": respiratory_rate if isinstance(respiratory_rate, (int, float)) else 0,
-                "hrv": hrv if isinstance(hrv, (tuple, list)) else [0, 0],
-                "timestamp": datetime.now().isoformat()
-            })
+async def _analyze_rppg_file(
+    video_path: str,
+    filename: str,
+    params: Dict[str, Any],
+    scheduling: Dict[str, str],
+    cache_key: Optional[str] = None,
+    encoding: Optional[Dict[str, Any]] = None,
+    refine: Optional[Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]] = None,
+    timings: bool = False
+):
+    """Analiza un video ya guardado en disco (o lo sirve desde la caché) y arma la respuesta
+
+    ``refine``, si se pasa, recibe el resultado (provisional) y devuelve los
+    datos del trabajo de refinado que se añaden a la respuesta. Los tiempos
+    por etapa van en la cabecera ``Server-Timing`` y, con ``timings``, también
+    en el cuerpo (nunca en la caché).
+    """
+    encoding = encoding or {}
+    headers = {}
+    cached = await get_rppg_cache().get(cache_key) if cache_key is not None else None
+    try:
+        if cached is not None:
+            logger.info(f"Resultado rPPG servido desde caché: {filename}")
+            content = _cached_rppg_content(cached, filename)
+        else:
+            logger.info(f"Procesando video: {filename}")
+
+            # Rechazar en milisegundos los videos inutilizables, antes de ocupar un worker
+            await get_video_prober().probe(video_path)
+
+            # Procesar fuera del event loop, en el pool de procesos
+            result = await _run_rppg_analysis(video_path, params, **scheduling)
+
+            logger.info(f"Video procesado exitosamente: {filename}")
+
+            content = _rppg_response_content(result, filename)
+            if cache_key is not None:
+                await get_rppg_cache().put(cache_key, content)
+
+            profile = result.get("timings")
+            get_rppg_profile_metrics().record(profile)
+            server_timing = server_timing_header(profile)
+            if server_timing:
+                headers["Server-Timing"] = server_timing
+            if timings:
+                content = {**content, "timings": profile}
+
+        if refine is not None:
+            content = {**content, "refine": await refine(content)}
+        headers["X-Cache"] = "HIT" if cached is not None else "MISS"
+        # Retornar los resultados
+        return render_rppg_response(content, headers=headers, **encoding)
             
-    except HTTPException:
+    except (HTTPException, VideoRejectedError):
         raise
+    except RPPGProcessingError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=e.message
+        )
+    except ComputeQueueFullError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=e.message,
+            headers={"Retry-After": "5"}
+        )
     except Exception as e:
         logger.error(f"Error processing video: {str(e)}")
         logger.error(f"Traceback: {traceback.format_exc()}")
@@ -1025,6 +1283,429 @@ async def analyze_video(file: UploadFile = File(...)):
             }
         )
 
+async def _enqueue_rppg_job(
+    job_id: str,
+    video_path: str,
+    filename: str,
+    params: Dict[str, Any],
+    scheduling: Dict[str, str],
+    cache_key: Optional[str] = None,
+    provisional: Optional[Dict[str, Any]] = None
+):
+    """Encola un video ya guardado en la ruta del trabajo y devuelve la respuesta 202
+
+    ``provisional`` es un resultado rápido que se sirve mientras el trabajo no termine.
+    """
+    cached = await get_rppg_cache().get(cache_key) if cache_key is not None else None
+    try:
+        if cached is not None:
+            # Resultado ya conocido: el trabajo nace terminado y el video no se procesa
+            os.remove(video_path)
+            await get_rppg_job_queue().enqueue(
+                job_id, video_path, filename, params, **scheduling,
+                cache_key=cache_key, result=_cached_rppg_content(cached, filename)
+            )
+        else:
+            await get_rppg_job_queue().enqueue(
+                job_id, video_path, filename, params, **scheduling, cache_key=cache_key, provisional=provisional
+            )
+    except Exception as e:
+        logger.error(f"Error encolando trabajo rPPG: {str(e)}")
+        if os.path.exists(video_path):
+            os.remove(video_path)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error interno del servidor"
+        )
+    
+    logger.info(f"Trabajo rPPG {job_id} encolado: {filename}")
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        headers={"X-Cache": "HIT" if cached is not None else "MISS"},
+        content={
+            "job_id": job_id,
+            "status": "done" if cached is not None else "queued",
+            "triage": scheduling["triage"],
+            "status_url": f"/rppg/jobs/{job_id}",
+            "timestamp": datetime.now().isoformat()
+        }
+    )
+
+async def _probe_rppg_job_video(video_path: str, cache_key: str):
+    """Sondea el video antes de encolarlo (salvo que el resultado ya esté en caché)"""
+    if await get_rppg_cache().contains(cache_key):
+        return
+    try:
+        await get_video_prober().probe(video_path)
+    except VideoRejectedError:
+        os.remove(video_path)
+        raise
+
+async def _run_rppg_job(job) -> Dict[str, Any]:
+    """Ejecuta un trabajo de la cola persistente en el pool de procesos"""
+    cache_key = job["cache_key"]
+    if cache_key is not None:
+        # Otro envío del mismo clip pudo terminar mientras este esperaba
+        cached = await get_rppg_cache().get(cache_key)
+        if cached is not None:
+            return _cached_rppg_content(cached, job["filename"])
+    
+    result = await _run_rppg_analysis(
+        job["video_path"], json.loads(job["params"]), tenant=job["tenant"], triage=job["triage"]
+    )
+    get_rppg_profile_metrics().record(result.get("timings"))
+    content = _rppg_response_content(result, job["filename"])
+    if cache_key is not None:
+        await get_rppg_cache().put(cache_key, content)
+    return content
+
+@rppg_router.post("/rppg")
+async def analyze_video(
+    file: UploadFile = File(...),
+    refine: bool = Query(False, description="Con mode=quick, encolar además el análisis completo (mismo job_id)"),
+    timings: bool = Query(False, description="Incluir en la respuesta el tiempo de pared y CPU por etapa"),
+    params: Dict[str, Any] = Depends(rppg_analysis_params),
+    scheduling: Dict[str, str] = Depends(rppg_scheduling),
+    encoding: Dict[str, Any] = Depends(rppg_response_encoding)
+):
+    if not RPPG_AVAILABLE or not VITALS_AVAILABLE:
+        return _rppg_unavailable_response()
+    
+    try:
+        file_extension = validate_rppg_upload(file)
+        if refine and params["mode"] == "quick":
+            return await _analyze_rppg_quick_and_refine(file, file_extension, params, scheduling, encoding, timings)
+        
+        # Copiar el video a un archivo temporal por bloques (memoria constante), calculando su hash
+        with tempfile.NamedTemporaryFile(delete=True, suffix=file_extension) as tmp:
+            digest = hashlib.sha256()
+            await save_upload_file(file, tmp, digest=digest)
+            cache_key = rppg_cache_key(digest.hexdigest(), params)
+            return await _analyze_rppg_file(
+                tmp.name, file.filename, params, scheduling, cache_key, encoding, timings=timings
+            )
+    except ValidationError as e:
+        raise _upload_http_error(e)
+
+async def _analyze_rppg_quick_and_refine(
+    file: UploadFile,
+    file_extension: str,
+    params: Dict[str, Any],
+    scheduling: Dict[str, str],
+    encoding: Dict[str, Any],
+    timings: bool = False
+):
+    """Pasada rápida síncrona y, con el mismo video, trabajo encolado en modo preciso"""
+    job_id, video_path = get_rppg_job_queue().new_job(file_extension)
+    digest = hashlib.sha256()
+    try:
+        with open(video_path, "wb") as out:
+            await save_upload_file(file, out, digest=digest)
+    except Exception:
+        os.remove(video_path)
+        raise
+    
+    video_sha256 = digest.hexdigest()
+    precise_params = {**params, "mode": "precise"}
+    enqueued = False
+    
+    async def start_refine(provisional: Dict[str, Any]) -> Dict[str, Any]:
+        nonlocal enqueued
+        await _enqueue_rppg_job(
+            job_id, video_path, file.filename, precise_params, scheduling,
+            rppg_cache_key(video_sha256, precise_params), provisional=provisional
+        )
+        enqueued = True
+        return {"job_id": job_id, "status_url": f"/rppg/jobs/{job_id}"}
+    
+    try:
+        return await _analyze_rppg_file(
+            video_path, file.filename, params, scheduling, rppg_cache_key(video_sha256, params), encoding,
+            refine=start_refine, timings=timings
+        )
+    finally:
+        # Si la pasada rápida falla no se encola nada: el video ya no hace falta
+        if not enqueued and os.path.exists(video_path):
+            os.remove(video_path)
+
+@rppg_router.post("/rppg/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def create_rppg_job(
+    file: UploadFile = File(...),
+    params: Dict[str, Any] = Depends(rppg_analysis_params),
+    scheduling: Dict[str, str] = Depends(rppg_scheduling)
+):
+    """Guarda el video, encola el análisis y responde de inmediato con el id del trabajo"""
+    if not RPPG_AVAILABLE or not VITALS_AVAILABLE:
+        return _rppg_unavailable_response()
+    
+    queue = get_rppg_job_queue()
+    try:
+        file_extension = validate_rppg_upload(file)
+        job_id, video_path = queue.new_job(file_extension)
+        digest = hashlib.sha256()
+        try:
+            with open(video_path, "wb") as out:
+                await save_upload_file(file, out, digest=digest)
+        except Exception:
+            os.remove(video_path)
+            raise
+    except ValidationError as e:
+        raise _upload_http_error(e)
+    
+    cache_key = rppg_cache_key(digest.hexdigest(), params)
+    await _probe_rppg_job_video(video_path, cache_key)
+    return await _enqueue_rppg_job(job_id, video_path, file.filename, params, scheduling, cache_key)
+
+@rppg_router.get("/rppg/jobs/{job_id}")
+async def get_rppg_job(job_id: str, encoding: Dict[str, Any] = Depends(rppg_response_encoding)):
+    """Estado del trabajo rPPG y, si terminó, su resultado"""
+    job = await get_rppg_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Trabajo no encontrado"
+        )
+    if encoding["fmt"] == "npy" and "result" in job:
+        return render_rppg_response(job["result"], headers={"X-Job-Status": job["status"]}, **encoding)
+    # Sin resultado definitivo todavía, el estado en npy se devuelve como JSON
+    fmt = "json" if encoding["fmt"] == "npy" else encoding["fmt"]
+    for key in ("result", "provisional_result"):
+        if key in job:
+            job[key] = encode_rppg_content(job[key], fmt, encoding["bvp_encoding"], encoding["bvp_downsample"])
+    return render_rppg_body(job, fmt)
+
+class RPPGUploadCreate(BaseModel):
+    filename: str
+    size: int
+
+def _upload_session_status(session: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "upload_id": session["upload_id"],
+        "filename": session["filename"],
+        "size": session["size"],
+        "offset": session["offset"],
+        "complete": session["offset"] == session["size"],
+        "chunk_size": UPLOAD_CHUNK_SIZE,
+        "upload_url": f"/rppg/uploads/{session['upload_id']}"
+    }
+
+@rppg_router.post("/rppg/uploads", status_code=status.HTTP_201_CREATED)
+def create_rppg_upload(upload_data: RPPGUploadCreate):
+    """Abre una subida por partes: el cliente envía el video en varios PUT reanudables"""
+    try:
+        session = get_upload_session_store().create(upload_data.filename, upload_data.size)
+    except ValidationError as e:
+        raise _upload_http_error(e)
+    return _upload_session_status(session)
+
+@rppg_router.put("/rppg/uploads/{upload_id}")
+async def append_rppg_upload(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0, description="Bytes ya recibidos (el offset actual de la sesión)")
+):
+    """Añade un bloque (cuerpo binario crudo) a la subida; se escribe a disco según llega"""
+    try:
+        session = await get_upload_session_store().append(upload_id, offset, request.stream())
+    except ResourceNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=e.message)
+    except ValidationError as e:
+        raise _upload_http_error(e)
+    return _upload_session_status(session)
+
+@rppg_router.get("/rppg/uploads/{upload_id}")
+def get_rppg_upload(upload_id: str):
+    """Estado de la subida: el cliente reanuda desde ``offset`` tras un corte"""
+    try:
+        session = get_upload_session_store().get(upload_id)
+    except ResourceNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=e.message)
+    return _upload_session_status(session)
+
+@rppg_router.post("/rppg/uploads/{upload_id}/complete")
+async def complete_rppg_upload(
+    upload_id: str,
+    async_job: bool = Query(False, description="Encolar como trabajo (/rppg/jobs) en lugar de esperar el resultado"),
+    timings: bool = Query(False, description="Incluir en la respuesta el tiempo de pared y CPU por etapa"),
+    params: Dict[str, Any] = Depends(rppg_analysis_params),
+    scheduling: Dict[str, str] = Depends(rppg_scheduling),
+    encoding: Dict[str, Any] = Depends(rppg_response_encoding)
+):
+    """Cierra la subida y analiza el video, de forma síncrona o como trabajo encolado"""
+    if not RPPG_AVAILABLE or not VITALS_AVAILABLE:
+        return _rppg_unavailable_response()
+    
+    store = get_upload_session_store()
+    try:
+        session = store.complete(upload_id)
+    except ResourceNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=e.message)
+    except ValidationError as e:
+        raise _upload_http_error(e)
+    
+    filename = session["filename"]
+    cache_key = rppg_cache_key(await run_in_threadpool(file_sha256, store.data_path(upload_id)), params)
+    if async_job:
+        job_id, video_path = get_rppg_job_queue().new_job(os.path.splitext(filename)[1].lower())
+        shutil.move(store.data_path(upload_id), video_path)
+        store.discard(upload_id)
+        await _probe_rppg_job_video(video_path, cache_key)
+        return await _enqueue_rppg_job(job_id, video_path, filename, params, scheduling, cache_key)
+    
+    # OpenCV elige el demuxer por la extensión: enlazar el archivo con la del video original
+    video_path = store.data_path(upload_id) + os.path.splitext(filename)[1].lower()
+    os.replace(store.data_path(upload_id), video_path)
+    try:
+        return await _analyze_rppg_file(video_path, filename, params, scheduling, cache_key, encoding, timings=timings)
+    finally:
+        os.remove(video_path)
+        store.discard(upload_id)
+
+async def _close_rppg_stream(websocket: WebSocket, code: int, error_code: str, message: str):
+    await websocket.send_json({"type": "error", "error_code": error_code, "message": message})
+    await websocket.close(code=code)
+
+@app.post("/vitals/batch")
+async def vitals_batch(
+    request: Request,
+    fs: Optional[float] = Query(None, gt=0, le=10000, description="FS (Hz) de las señales que no traen la suya"),
+    pulse_filter: bool = Query(True, description="Pasa banda de HR antes de calcular HR y HRV (PPG crudo)"),
+    scheduling: Dict[str, str] = Depends(rppg_scheduling)
+):
+    """HR, FR, SDNN, RMSSD y su calidad para muchas señales BVP/PPG en una sola petición
+
+    El cuerpo puede ser JSON (``{"fs", "signals": [...]}``), un ``.npy``/``.npz``
+    crudo o un formulario multipart con el archivo en ``file``.
+    """
+    if not VITALS_AVAILABLE:
+        return JSONResponse(
+            status_code=503,
+            content={
+                "error": "Vitals processing is not available. SciPy or related dependencies are not properly installed.",
+                "timestamp": datetime.now().isoformat()
+            }
+        )
+    
+    content_type = (request.headers.get("content-type") or "").split(";")[0].strip().lower()
+    executor = get_compute_executor()
+    try:
+        if content_type == "multipart/form-data":
+            form = await request.form()
+            upload = form.get("file")
+            if upload is None or isinstance(upload, str):
+                raise ValidationError('Falta el archivo "file" con las señales', "INVALID_SIGNAL")
+            data = await read_upload_bytes(upload, upload.filename, VITALS_BATCH_MAX_MB)
+            content_type = "application/octet-stream"
+        else:
+            data = await read_upload_bytes(request.stream(), "body", VITALS_BATCH_MAX_MB)
+        # Decodificar decenas de MB de JSON o .npz en un worker: json.loads retiene
+        # el GIL, así que en un hilo seguiría bloqueando el event loop
+        signals = await executor.run(parse_batch_body, data, content_type, fs, **scheduling)
+        result = await run_vitals_batch(executor, signals, pulse_filter, **scheduling)
+    except ValidationError as e:
+        raise _upload_http_error(e)
+    except ComputeQueueFullError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=e.message,
+            headers={"Retry-After": "5"}
+        )
+    # Los resultados ya son tipos nativos: se evita jsonable_encoder sobre miles de señales
+    return JSONResponse(content={**result, "timestamp": datetime.now().isoformat()})
+
+@rppg_router.websocket("/ws/rppg")
+async def rppg_stream(websocket: WebSocket):
+    """rPPG en vivo: un mensaje JSON de configuración y después un frame binario por mensaje
+
+    Configuración: ``{"fps": 30, "format": "jpeg" | "raw", "width": ..., "height": ...,
+    "detection_stride": ..., "tracker": ..., "detection_width": ..., "skin_mask": false}``
+    (``width``/``height`` solo para ``raw``, BGR de 8 bits). El servidor responde
+    ``{"type": "ready"}`` y, una vez por segundo de video, ``{"type": "estimate", ...}``.
+    """
+    await websocket.accept()
+    if not RPPG_AVAILABLE or not VITALS_AVAILABLE:
+        await _close_rppg_stream(websocket, 1011, "RPPG_UNAVAILABLE", "RPPG processing is not available")
+        return
+    
+    registry = get_rppg_stream_registry()
+    if not registry.try_open():
+        await _close_rppg_stream(websocket, 1013, "TOO_MANY_STREAMS", "Demasiadas sesiones rPPG en vivo, reintente más tarde")
+        return
+    
+    session = None
+    try:
+        try:
+            config = json.loads(await websocket.receive_text())
+            if not isinstance(config, dict):
+                raise ValueError(config)
+        except (ValueError, KeyError):
+            await _close_rppg_stream(websocket, 1003, "INVALID_STREAM_CONFIG", "El primer mensaje debe ser la configuración JSON")
+            return
+        tracker = config.get("tracker")
+        if tracker is not None and tracker != "none" and tracker not in FACE_TRACKERS:
+            await _close_rppg_stream(websocket, 1008, "INVALID_STREAM_CONFIG", f"Tracker no soportado. Opciones: none, {', '.join(FACE_TRACKERS)}")
+            return
+        try:
+            session = RPPGStreamSession(
+                config.get("fps"),
+                frame_format=config.get("format", "jpeg"),
+                width=config.get("width"),
+                height=config.get("height"),
+                detection_stride=config.get("detection_stride"),
+                tracker=tracker,
+                detection_width=config.get("detection_width"),
+                skin_mask=bool(config.get("skin_mask", False))
+            )
+        except ValidationError as e:
+            await _close_rppg_stream(websocket, 1008, e.error_code, e.message)
+            return
+        await websocket.send_json({
+            "type": "ready",
+            "fps": session.fps,
+            "format": session.frame_format,
+            "window_seconds": session.chrom.WinL / session.fps,
+            "buffer_seconds": session.chrom.capacity / session.fps
+        })
+        
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            payload = message.get("bytes")
+            if payload is None:
+                await websocket.send_json({"type": "error", "error_code": "BINARY_FRAME_EXPECTED", "message": "Se esperaba un frame binario"})
+                continue
+            if len(payload) > STREAM_MAX_FRAME_BYTES:
+                await _close_rppg_stream(websocket, 1009, "FRAME_TOO_LARGE", f"Frame mayor de {STREAM_MAX_FRAME_BYTES} bytes")
+                break
+            estimate = await session.process_frame(payload)
+            if estimate is not None:
+                await websocket.send_json(estimate)
+                registry.record_estimate()
+    except WebSocketDisconnect:
+        pass
+    except ImportError as e:
+        logger.error(f"rPPG stream unavailable: {e}")
+        await _close_rppg_stream(websocket, 1011, "RPPG_UNAVAILABLE", str(e))
+    except Exception as e:
+        logger.error(f"Error in rPPG stream: {e}")
+        await _close_rppg_stream(websocket, 1011, "INTERNAL_ERROR", "Error interno procesando el stream")
+    finally:
+        registry.close(session)
+
+if RPPG_AVAILABLE:
+    app.include_router(rppg_router)
+else:
+    # Sin OpenCV/SciPy las rutas rPPG responden 503 en lugar de 404
+    @app.api_route("/rppg{path:path}", methods=["GET", "POST", "PUT"], include_in_schema=False)
+    async def rppg_unavailable(path: str):
+        return _rppg_unavailable_response()
+
+    @app.websocket("/ws/rppg")
+    async def rppg_stream_unavailable(websocket: WebSocket):
+        await websocket.accept()
+        await _close_rppg_stream(websocket, 1011, "RPPG_UNAVAILABLE", "RPPG processing is not available")
+
 # Endpoint para registrar diagnostico
 @app.post("/diagnosticos")
 def crear_diagnostico(diagnostico_data: DiagnosticoCreate):
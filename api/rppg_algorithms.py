@@ -0,0 +1,196 @@
+"""
+Registro de algoritmos rPPG (extractores de BVP)
+
+Todos consumen la traza RGB (N, 3) de ``process_video`` / lectura en
+streaming. El preprocesado (máscara de outliers, normalización, tendencia y
+pasa banda) se calcula una sola vez en ``PreprocessedTrace`` y se comparte,
+de modo que varios algoritmos pueden ejecutarse sobre una misma decodificación.
+"""
+
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Optional
+
+import numpy as np
+from scipy import signal
+
+from .dsp import hann_window, sliding_windows
+from .rppg_core import (
+    CHROM_LPF, CHROM_HPF, CHROM_WIN_SEC, chrom_bvp, chrom_filter_design, chrom_window_starts, rgb_outlier_mask
+)
+from .rppg_profiling import count_frames, profiled
+
+DEFAULT_ALGORITHM = "chrom"
+ICA_EIGEN_EPS = 1e-10             # piso de los autovalores, relativo al mayor
+
+
+@dataclass
+class PreprocessedTrace:
+    """Traza RGB preprocesada, compartida entre algoritmos"""
+    FS: float
+    rgb: np.ndarray                      # (N, 3) sin frames atípicos
+    _cache: dict = field(default_factory=dict, repr=False)
+
+    @property
+    def normalized(self) -> np.ndarray:
+        """Variación relativa por canal (C / media - 1) sin tendencia lineal"""
+        if "normalized" not in self._cache:
+            means = self.rgb.mean(axis=0)
+            means[means == 0] = 1
+            self._cache["normalized"] = signal.detrend(self.rgb / means - 1, axis=0)
+        return self._cache["normalized"]
+
+    @property
+    def filtered(self) -> Optional[np.ndarray]:
+        """``normalized`` filtrada en la banda cardíaca, o None si la traza es muy corta"""
+        if "filtered" not in self._cache:
+            self._cache["filtered"] = bandpass(self.normalized, self.FS, axis=0)
+        return self._cache["filtered"]
+
+
+def preprocess_rgb(RGB, FS) -> PreprocessedTrace:
+    """Preprocesado común: descarta frames atípicos de la traza RGB (N, 3)"""
+    RGB = np.asarray(RGB, dtype=np.float64)
+    mask = rgb_outlier_mask(RGB)
+    count_frames("dropped_outlier", len(mask) - int(np.count_nonzero(mask)))
+    return PreprocessedTrace(FS=FS, rgb=RGB[mask])
+
+
+def bandpass(x, FS, axis=-1):
+    """Pasa banda cardíaco de CHROM aplicado con sosfiltfilt, o None si no es posible"""
+    sos = chrom_filter_design(FS)
+    if sos is None:
+        return None
+    try:
+        return signal.sosfiltfilt(sos, x, axis=axis)
+    except ValueError:
+        return None
+
+
+def _select_pulse_component(components, trace: PreprocessedTrace):
+    """Componente (fila) con mayor fracción de potencia en la banda cardíaca
+
+    PCA e ICA devuelven componentes de signo arbitrario: la elegida se orienta
+    para que correlacione positivamente con el canal verde filtrado.
+    """
+    FS = trace.FS
+    spectrum = np.abs(np.fft.rfft(components, axis=-1)) ** 2
+    freqs = np.fft.rfftfreq(components.shape[-1], d=1.0 / FS)
+    band = (freqs >= CHROM_LPF) & (freqs <= CHROM_HPF)
+    total = spectrum.sum(axis=-1)
+    total[total == 0] = 1
+    ratio = spectrum[:, band].max(axis=-1) / total
+    component = components[int(np.argmax(ratio))]
+    green = trace.filtered[:, 1]
+    if np.dot(component - component.mean(), green - green.mean()) < 0:
+        component = -component
+    return component
+
+
+def _floor_eigenvalues(eigvals):
+    """Autovalores acotados a ICA_EIGEN_EPS veces el mayor, para dividir por su raíz sin explotar"""
+    floor = max(float(eigvals.max()), 0.0) * ICA_EIGEN_EPS or ICA_EIGEN_EPS
+    return np.maximum(eigvals, floor)
+
+
+BVP_ALGORITHMS: Dict[str, Callable[[PreprocessedTrace], Optional[np.ndarray]]] = {}
+
+
+def register_bvp_algorithm(name: str):
+    """Decorador para registrar un extractor de BVP"""
+    def decorator(fn):
+        BVP_ALGORITHMS[name] = fn
+        return fn
+    return decorator
+
+
+@register_bvp_algorithm("chrom")
+def chrom(trace: PreprocessedTrace):
+    """CHROM (de Haan y Jeanne, 2013), idéntico a CHROME_DEHAAN"""
+    return chrom_bvp(trace.rgb, trace.FS)
+
+
+@register_bvp_algorithm("pos")
+def pos(trace: PreprocessedTrace):
+    """POS (Wang et al., 2017): proyección ortogonal al tono de piel
+
+    Mismas ventanas que CHROM (solape del 50 %, Hann) y overlap-add sobre
+    vistas de la traza, en lugar de una ventana por muestra.
+    """
+    RGB = trace.rgb
+    FN = RGB.shape[0]
+    L = int(CHROM_WIN_SEC * trace.FS)
+    if L < 2 or FN < L:
+        return None
+    starts = chrom_window_starts(FN, L)
+    windows = sliding_windows(RGB, starts, L)                  # (n_win, 3, L)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        Cn = windows / windows.mean(axis=2, keepdims=True)
+        S1 = Cn[:, 1] - Cn[:, 2]
+        S2 = -2 * Cn[:, 0] + Cn[:, 1] + Cn[:, 2]
+        alpha = S1.std(axis=1) / S2.std(axis=1)
+        h = S1 + alpha[:, None] * S2
+        h -= h.mean(axis=1, keepdims=True)
+    h[~np.isfinite(h).all(axis=1)] = 0
+    h *= hann_window(L)
+    idx = starts[:, None] + np.arange(L)
+    H = np.bincount(idx.ravel(), weights=h.ravel(), minlength=FN)
+    return bandpass(H, trace.FS)
+
+
+@register_bvp_algorithm("green")
+def green(trace: PreprocessedTrace):
+    """Canal verde normalizado y filtrado (Verkruysse et al., 2008)"""
+    filtered = trace.filtered
+    return None if filtered is None else filtered[:, 1].copy()
+
+
+@register_bvp_algorithm("pca")
+def pca(trace: PreprocessedTrace):
+    """Componente principal de la traza filtrada con más potencia cardíaca (Lewandowska et al., 2011)"""
+    filtered = trace.filtered
+    if filtered is None:
+        return None
+    _, _, Vt = np.linalg.svd(filtered - filtered.mean(axis=0), full_matrices=False)
+    return _select_pulse_component(Vt @ filtered.T, trace)
+
+
+@register_bvp_algorithm("ica")
+def ica(trace: PreprocessedTrace, max_iter: int = 200, tol: float = 1e-6):
+    """FastICA simétrico (tanh) sobre la traza filtrada y blanqueada (Poh et al., 2010)"""
+    filtered = trace.filtered
+    if filtered is None:
+        return None
+    X = (filtered - filtered.mean(axis=0)).T                  # (3, N)
+    # Blanqueo
+    eigvals, eigvecs = np.linalg.eigh(np.cov(X))
+    eigvals = _floor_eigenvalues(eigvals)
+    Z = (eigvecs / np.sqrt(eigvals)).T @ X
+    n = Z.shape[0]
+    W = np.linalg.qr(np.random.default_rng(0).normal(size=(n, n)))[0]
+    for _ in range(max_iter):
+        WZ = np.tanh(W @ Z)
+        W_new = (WZ @ Z.T) / Z.shape[1] - np.diag((1 - WZ ** 2).mean(axis=1)) @ W
+        # Decorrelación simétrica: W <- (W W^T)^(-1/2) W
+        s, u = np.linalg.eigh(W_new @ W_new.T)
+        s = _floor_eigenvalues(s)
+        W_new = (u / np.sqrt(s)) @ u.T @ W_new
+        converged = np.max(np.abs(np.abs(np.diag(W_new @ W.T)) - 1)) < tol
+        W = W_new
+        if converged:
+            break
+    return _select_pulse_component(W @ Z, trace)
+
+
+@profiled("filter")
+def extract_bvp(RGB, FS, algorithm: str = DEFAULT_ALGORITHM):
+    """BVP de una traza RGB (N, 3) o de un ``PreprocessedTrace`` con el algoritmo indicado"""
+    if algorithm not in BVP_ALGORITHMS:
+        raise ValueError(f"Unknown rPPG algorithm: {algorithm}")
+    trace = RGB if isinstance(RGB, PreprocessedTrace) else preprocess_rgb(RGB, FS)
+    return BVP_ALGORITHMS[algorithm](trace)
+
+
+def extract_bvp_multi(RGB, FS, algorithms: Iterable[str]) -> Dict[str, Optional[np.ndarray]]:
+    """Varios algoritmos sobre un único preprocesado de la traza"""
+    trace = preprocess_rgb(RGB, FS)
+    return {name: extract_bvp(trace, FS, name) for name in algorithms}
@@ -0,0 +1,222 @@
+"""
+Caché de resultados rPPG direccionada por contenido
+
+La clave es el SHA-256 de los bytes del video más los parámetros de análisis,
+así que reenviar el mismo clip (tras un timeout o una recarga) devuelve el
+resultado guardado sin decodificar el video ni detectar caras. Hay dos
+niveles: un LRU en memoria y un directorio en disco con desalojo por tamaño.
+
+La interfaz pública es asíncrona: el LRU se consulta en el event loop y todo
+lo que toca el disco (o serializa el resultado completo) corre en el executor
+por defecto, para no bloquear las demás peticiones.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from .face_detection import DEFAULT_FACE_DETECTOR
+
+logger = logging.getLogger("signaapi.rppg_cache")
+
+# Incrementar cuando cambie el formato o el cálculo de los resultados
+RPPG_CACHE_VERSION = 4
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def rppg_cache_key(video_sha256: str, params: Dict[str, Any]) -> str:
+    """Clave de caché: hash del video + parámetros de análisis + detector y versión"""
+    material = json.dumps(
+        {"video": video_sha256, "params": params, "detector": DEFAULT_FACE_DETECTOR, "version": RPPG_CACHE_VERSION},
+        sort_keys=True
+    )
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+def file_sha256(path: str) -> str:
+    """SHA-256 de un archivo leído por bloques"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class RPPGResultCache:
+    """LRU en memoria + directorio en disco, ambos acotados en bytes"""
+
+    def __init__(self, memory_bytes: int, disk_bytes: int, cache_dir: Optional[str] = None):
+        self.memory_limit = memory_bytes
+        self.disk_limit = disk_bytes if cache_dir else 0
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()   # clave -> (contenido, bytes)
+        self.memory_bytes = 0
+        self.disk_bytes = 0
+        self.disk_items = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.bytes_served = 0
+        if self.disk_limit:
+            os.makedirs(cache_dir, exist_ok=True)
+            for entry in os.scandir(cache_dir):
+                if entry.name.endswith(".json"):
+                    self.disk_bytes += entry.stat().st_size
+                    self.disk_items += 1
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        content = self._get_memory(key)
+        if content is not None:
+            return content
+        return await asyncio.get_running_loop().run_in_executor(None, self._get_disk, key)
+
+    async def contains(self, key: str) -> bool:
+        """Si hay resultado para ``key``, sin contar acierto ni fallo"""
+        with self._lock:
+            if key in self._memory:
+                return True
+        if not self.disk_limit:
+            return False
+        return await asyncio.get_running_loop().run_in_executor(None, os.path.exists, self._disk_path(key))
+
+    async def put(self, key: str, content: Dict[str, Any]):
+        await asyncio.get_running_loop().run_in_executor(None, self._store, key, content)
+
+    def _get_memory(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if key not in self._memory:
+                return None
+            self._memory.move_to_end(key)
+            content, size = self._memory[key]
+            self.memory_hits += 1
+            self.bytes_served += size
+            return content
+
+    def _get_disk(self, key: str) -> Optional[Dict[str, Any]]:
+        if self.disk_limit:
+            path = self._disk_path(key)
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                content = json.loads(data)
+                # Marcar como usado recientemente para el desalojo en disco
+                os.utime(path)
+            except (OSError, ValueError):
+                pass
+            else:
+                with self._lock:
+                    self.disk_hits += 1
+                    self.bytes_served += len(data)
+                    self._remember(key, content, len(data))
+                return content
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _store(self, key: str, content: Dict[str, Any]):
+        data = json.dumps(content).encode()
+        with self._lock:
+            self.stores += 1
+            self._remember(key, content, len(data))
+        if self.disk_limit and len(data) <= self.disk_limit:
+            self._write_disk(key, data)
+
+    def _remember(self, key: str, content: Dict[str, Any], size: int):
+        if size > self.memory_limit:
+            return
+        if key in self._memory:
+            self.memory_bytes -= self._memory.pop(key)[1]
+        self._memory[key] = (content, size)
+        self.memory_bytes += size
+        while self.memory_bytes > self.memory_limit:
+            _, (_, evicted) = self._memory.popitem(last=False)
+            self.memory_bytes -= evicted
+            self.evictions += 1
+
+    def _write_disk(self, key: str, data: bytes):
+        path = self._disk_path(key)
+        existed = os.path.exists(path)
+        previous = os.path.getsize(path) if existed else 0
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"No se pudo escribir la caché rPPG en disco: {e}")
+            return
+        with self._lock:
+            self.disk_bytes += len(data) - previous
+            self.disk_items += 0 if existed else 1
+            over = self.disk_bytes > self.disk_limit
+        if over:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        """Elimina los resultados menos usados (mtime) hasta volver al límite"""
+        entries = sorted(
+            (entry for entry in os.scandir(self.cache_dir) if entry.name.endswith(".json")),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        for entry in entries:
+            with self._lock:
+                if self.disk_bytes <= self.disk_limit:
+                    return
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+            except OSError:
+                continue
+            with self._lock:
+                self.disk_bytes -= size
+                self.disk_items -= 1
+                self.evictions += 1
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": (self.memory_hits + self.disk_hits) / lookups if lookups else 0,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "bytes_served": self.bytes_served,
+                "memory_items": len(self._memory),
+                "memory_bytes": self.memory_bytes,
+                "memory_limit_bytes": self.memory_limit,
+                "disk_items": self.disk_items,
+                "disk_bytes": self.disk_bytes,
+                "disk_limit_bytes": self.disk_limit,
+                "timestamp": datetime.now().isoformat()
+            }
+
+
+# Instancia global de la caché
+rppg_result_cache = None
+
+def get_rppg_cache() -> RPPGResultCache:
+    """Obtener (creando si hace falta) la caché de resultados rPPG"""
+    global rppg_result_cache
+    if rppg_result_cache is None:
+        rppg_result_cache = RPPGResultCache(
+            memory_bytes=int(float(os.getenv("RPPG_CACHE_MEMORY_MB", "64")) * 1024 * 1024),
+            disk_bytes=int(float(os.getenv("RPPG_CACHE_DISK_MB", "512")) * 1024 * 1024),
+            cache_dir=os.getenv("RPPG_CACHE_DIR", os.path.join(tempfile.gettempdir(), "signaapi_rppg_cache"))
+        )
+    return rppg_result_cache
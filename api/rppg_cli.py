@@ -0,0 +1,438 @@
+"""
+Reprocesado rPPG por lotes, sin pasar por HTTP
+
+Recorre directorios (o manifiestos con una ruta por línea, o CSV con una
+columna ``path``) y reparte los videos entre los procesos del mismo
+``ComputeExecutor`` que usa la API. Cada video pasa por ``probe_video`` y
+``analyze_video_file`` con los mismos parámetros que ``/rppg``, así que los
+números offline y online coinciden. Los resultados se escriben a medida que
+terminan (CSV, NDJSON o Parquet) y, al relanzar con la misma salida, se
+saltan los videos ya registrados.
+
+Uso:
+    python -m api.rppg_cli /data/clips --output results.csv --workers 4
+    python -m api.rppg_cli manifest.txt --output results.ndjson --algorithm pos --detection-stride 5
+    python -m api.rppg_cli /data/clips --output results.parquet --retry-failed
+"""
+
+import abc
+import argparse
+import asyncio
+import csv
+import functools
+import glob
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from .compute_executor import ComputeExecutor
+from .error_handlers import RPPGProcessingError, VideoRejectedError
+from .face_detection import DEFAULT_FACE_DETECTOR, FACE_TRACKERS, preload_face_detector
+from .rppg_algorithms import BVP_ALGORITHMS, DEFAULT_ALGORITHM
+from .rppg_cache import file_sha256
+from .rppg_pipeline import CONVERGENCE_TOLERANCE_BPM, DEFAULT_MODE, RPPG_MODES, analyze_video_file
+from .rppg_probe import probe_video
+from .rppg_uploads import RPPG_ALLOWED_EXTENSIONS
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+logger = logging.getLogger("signaapi.rppg_cli")
+
+OUTPUT_FORMATS = ("csv", "ndjson", "parquet")
+_FORMAT_BY_EXTENSION = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson", ".parquet": "parquet"}
+# Columnas de cada fila de resultados, en orden
+RESULT_COLUMNS = (
+    "path", "sha256", "status", "error_code", "message",
+    "hr", "hr_method", "hr_spectral", "hr_confidence", "respiratory_rate", "sdnn", "rmssd",
+    "algorithm", "mode", "fps", "frames_used", "seconds_used", "fraction_decoded", "stopped",
+    "processing_seconds", "params", "bvp", "timestamp",
+)
+# Estados terminales: "ok"; "rejected" (sondeo) y "failed" (análisis) llevan error_code
+RESULT_STATUSES = ("ok", "rejected", "failed")
+PARQUET_ROWS_PER_PART = 100
+
+
+def find_videos(inputs: Iterable[str]) -> List[str]:
+    """Rutas absolutas de los videos de los directorios y manifiestos indicados, sin duplicados"""
+    extensions = {f".{ext}" for ext in RPPG_ALLOWED_EXTENSIONS}
+    videos = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                videos.extend(
+                    os.path.join(root, name) for name in sorted(files)
+                    if os.path.splitext(name)[1].lower() in extensions
+                )
+        elif os.path.splitext(item)[1].lower() in extensions:
+            videos.append(item)
+        else:
+            videos.extend(_read_manifest(item))
+    seen = set()
+    unique = []
+    for path in (os.path.abspath(p) for p in videos):
+        if path not in seen:
+            seen.add(path)
+            unique.append(path)
+    return unique
+
+
+def _read_manifest(manifest_path: str) -> List[str]:
+    """Rutas de un manifiesto: CSV con columna ``path`` o texto con una ruta por línea"""
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    with open(manifest_path, newline="") as f:
+        if manifest_path.lower().endswith(".csv"):
+            paths = [row["path"] for row in csv.DictReader(f) if row.get("path")]
+        else:
+            paths = [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+    # Las rutas relativas se resuelven respecto al manifiesto
+    return [p if os.path.isabs(p) else os.path.join(base, p) for p in paths]
+
+
+def _result_row(path: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    return {column: None for column in RESULT_COLUMNS} | {
+        "path": path,
+        "params": json.dumps(params, sort_keys=True),
+        "timestamp": datetime.now().isoformat(),
+    }
+
+
+def process_video(path: str, params: Dict[str, Any], probe: bool = True, include_bvp: bool = False) -> Dict[str, Any]:
+    """Analiza un video en el worker y devuelve su fila de resultados (nunca lanza por el video)
+
+    Mismo camino que ``/rppg``: sondeo (``probe_video``) y ``analyze_video_file``.
+    """
+    row = _result_row(path, params)
+    start = time.perf_counter()
+    try:
+        row["sha256"] = file_sha256(path)
+        if probe:
+            try:
+                probe_video(path, params.get("detector_backend"))
+            except ImportError as e:
+                # Igual que en la API: sin sondeo posible, decide el análisis
+                logger.warning(f"Video probe skipped: {e}")
+        result = analyze_video_file(path, **params)
+    except VideoRejectedError as e:
+        row.update(status="rejected", error_code=e.error_code, message=e.message)
+    except RPPGProcessingError as e:
+        row.update(status="failed", error_code=e.error_code, message=e.message)
+    except Exception as e:
+        row.update(status="failed", error_code="INTERNAL_ERROR", message=str(e))
+    else:
+        sdnn, rmssd = result["hrv"]
+        coverage = result["coverage"]
+        row.update(
+            status="ok",
+            hr=result["hr"],
+            hr_method=result["hr_method"],
+            hr_spectral=result["hr_spectral"],
+            hr_confidence=result["hr_confidence"],
+            respiratory_rate=result["respiratory_rate"],
+            sdnn=sdnn,
+            rmssd=rmssd,
+            algorithm=result["algorithm"],
+            mode=result["mode"],
+            fps=result["fps"],
+            frames_used=coverage["frames_used"],
+            seconds_used=coverage["seconds_used"],
+            fraction_decoded=coverage["fraction_decoded"],
+            stopped=coverage["stopped"],
+        )
+        if include_bvp:
+            row["bvp"] = json.dumps([round(float(v), 6) for v in result["bvp"]])
+    row["processing_seconds"] = round(time.perf_counter() - start, 3)
+    return row
+
+
+class ResultWriter(abc.ABC):
+    """Salida incremental; ``completed`` son las rutas ya registradas (para reanudar)"""
+
+    def __init__(self, path: str, resume: bool = True, retry_failed: bool = False):
+        self.path = path
+        self.retry_failed = retry_failed
+        self.completed: Set[str] = set()
+        if resume and os.path.exists(path):
+            for row in self._read_existing():
+                if row.get("status") in RESULT_STATUSES and (row["status"] != "failed" or not retry_failed):
+                    self.completed.add(row["path"])
+        elif os.path.exists(path):
+            self._remove_existing()
+        self.written = 0
+
+    @abc.abstractmethod
+    def _read_existing(self) -> Iterable[Dict[str, Any]]:
+        """Filas ya escritas en ``path``"""
+
+    def _remove_existing(self):
+        os.remove(self.path)
+
+    @abc.abstractmethod
+    def write(self, row: Dict[str, Any]):
+        """Añade una fila y la deja en disco"""
+
+    def close(self):
+        pass
+
+
+def _truncate_partial_line(path: str):
+    """Descarta una última línea a medio escribir (proceso interrumpido durante la escritura)"""
+    with open(path, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size == 0:
+            return
+        f.seek(max(0, size - 1))
+        if f.read(1) == b"\n":
+            return
+        # Retroceder hasta el último salto de línea completo
+        position = size
+        while position > 0:
+            step = min(65536, position)
+            f.seek(position - step)
+            block = f.read(step)
+            newline = block.rfind(b"\n")
+            if newline >= 0:
+                f.truncate(position - step + newline + 1)
+                return
+            position -= step
+        f.truncate(0)
+
+
+class CsvResultWriter(ResultWriter):
+    def _read_existing(self):
+        _truncate_partial_line(self.path)
+        with open(self.path, newline="") as f:
+            yield from csv.DictReader(f)
+
+    def write(self, row):
+        new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        with open(self.path, "a", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=RESULT_COLUMNS)
+            if new_file:
+                writer.writeheader()
+            writer.writerow(row)
+        self.written += 1
+
+
+class NdjsonResultWriter(ResultWriter):
+    def _read_existing(self):
+        _truncate_partial_line(self.path)
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+    def write(self, row):
+        with open(self.path, "a") as f:
+            f.write(json.dumps(row) + "\n")
+        self.written += 1
+
+
+class ParquetResultWriter(ResultWriter):
+    """Directorio de ficheros ``part-NNNNN.parquet`` (un conjunto de datos de Parquet)
+
+    Parquet no admite añadir filas a un fichero cerrado, así que cada bloque
+    de ``PARQUET_ROWS_PER_PART`` filas se escribe como una parte nueva. Tras
+    una interrupción brusca solo se pierden las filas del bloque en curso,
+    que se recalculan al reanudar.
+    """
+
+    SCHEMA_TYPES = {
+        "hr": "float64", "hr_spectral": "float64", "hr_confidence": "float64", "respiratory_rate": "float64",
+        "sdnn": "float64", "rmssd": "float64", "fps": "float64", "frames_used": "int64",
+        "seconds_used": "float64", "fraction_decoded": "float64", "processing_seconds": "float64",
+    }
+
+    def __init__(self, path: str, resume: bool = True, retry_failed: bool = False,
+                 rows_per_part: int = PARQUET_ROWS_PER_PART):
+        if not PYARROW_AVAILABLE:
+            raise ImportError("pyarrow is not installed. Cannot write Parquet output.")
+        self.rows_per_part = rows_per_part
+        self._buffer: List[Dict[str, Any]] = []
+        self._schema = pa.schema([
+            (column, getattr(pa, self.SCHEMA_TYPES.get(column, "string"))()) for column in RESULT_COLUMNS
+        ])
+        super().__init__(path, resume, retry_failed)
+        os.makedirs(path, exist_ok=True)
+
+    def _parts(self):
+        return sorted(glob.glob(os.path.join(self.path, "part-*.parquet")))
+
+    def _read_existing(self):
+        for part in self._parts():
+            try:
+                table = pq.read_table(part, columns=["path", "status"])
+            except Exception:
+                # Parte sin pie (escritura interrumpida): sus filas se recalculan
+                logger.warning(f"Ignorando parte Parquet ilegible: {part}")
+                continue
+            yield from table.to_pylist()
+
+    def _remove_existing(self):
+        for part in self._parts():
+            os.remove(part)
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        table = pa.Table.from_pylist(self._buffer, schema=self._schema)
+        index = len(self._parts())
+        final_path = os.path.join(self.path, f"part-{index:05d}.parquet")
+        tmp_path = final_path + ".tmp"
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, final_path)
+        self._buffer = []
+
+    def write(self, row):
+        self._buffer.append(row)
+        self.written += 1
+        if len(self._buffer) >= self.rows_per_part:
+            self._flush()
+
+    def close(self):
+        self._flush()
+
+
+def open_result_writer(path: str, fmt: Optional[str] = None, resume: bool = True,
+                       retry_failed: bool = False) -> ResultWriter:
+    """Escritor según ``fmt`` o, si no se indica, según la extensión de ``path``"""
+    fmt = fmt or _FORMAT_BY_EXTENSION.get(os.path.splitext(path)[1].lower())
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"Formato de salida no soportado. Opciones: {', '.join(OUTPUT_FORMATS)}")
+    writer_cls = {"csv": CsvResultWriter, "ndjson": NdjsonResultWriter, "parquet": ParquetResultWriter}[fmt]
+    return writer_cls(path, resume=resume, retry_failed=retry_failed)
+
+
+async def run_batch(
+    videos: List[str],
+    writer: ResultWriter,
+    params: Dict[str, Any],
+    workers: Optional[int] = None,
+    probe: bool = True,
+    include_bvp: bool = False
+) -> Dict[str, int]:
+    """Reparte los videos pendientes entre los workers y escribe cada fila al terminar"""
+    pending = [path for path in videos if path not in writer.completed]
+    counts = {"total": len(videos), "skipped": len(videos) - len(pending)}
+    counts.update({status: 0 for status in RESULT_STATUSES})
+    if not pending:
+        return counts
+
+    executor = ComputeExecutor(
+        max_workers=workers,
+        cv_threads=int(os.getenv("RPPG_CV_THREADS", "1")),
+        warmup=functools.partial(preload_face_detector, params.get("detector_backend"))
+    )
+    # Como mucho una tarea en espera por worker: el resto de videos no ocupa memoria del pool
+    slots = asyncio.Semaphore(2 * executor.max_workers)
+    done = 0
+
+    async def process(path):
+        nonlocal done
+        async with slots:
+            row = await executor.run(process_video, path, params, probe, include_bvp)
+        writer.write(row)
+        counts[row["status"]] += 1
+        done += 1
+        if row["status"] != "ok":
+            detail = row["error_code"]
+        else:
+            # Un análisis correcto puede no dar HR (p. ej. sin latidos ni pico espectral)
+            detail = f"hr={row['hr']:.1f}" if row["hr"] is not None else "hr=n/a"
+        print(
+            f"[{done}/{len(pending)}] {row['status']:<8} {detail} ({row['processing_seconds']:.1f} s) {path}",
+            file=sys.stderr, flush=True
+        )
+
+    try:
+        await asyncio.gather(*(process(path) for path in pending))
+    finally:
+        executor.shutdown(wait=False)
+    return counts
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m api.rppg_cli", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("inputs", nargs="+", help="Directorios, videos o manifiestos (.txt / .csv con columna path)")
+    parser.add_argument("--output", "-o", required=True, help="Fichero de resultados (.csv, .ndjson, .parquet)")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, help="Formato de salida (por defecto, según la extensión)")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("RPPG_WORKERS", "0")) or None,
+                        help="Procesos del pool (por defecto RPPG_WORKERS o núcleos disponibles)")
+    parser.add_argument("--no-resume", action="store_true", help="Sobrescribir la salida en lugar de reanudar")
+    parser.add_argument("--retry-failed", action="store_true", help="Al reanudar, repetir los videos con status failed")
+    parser.add_argument("--no-probe", action="store_true", help="No sondear los videos antes de analizarlos")
+    parser.add_argument("--bvp", action="store_true", help="Incluir el BVP (lista JSON) en cada fila")
+    # Mismos parámetros de análisis que /rppg
+    parser.add_argument("--detector", default=DEFAULT_FACE_DETECTOR, help="Backend de detección facial")
+    parser.add_argument("--detection-stride", type=int, default=None)
+    parser.add_argument("--tracker", choices=["none", *FACE_TRACKERS], default=None)
+    parser.add_argument("--detection-width", type=int, default=None)
+    parser.add_argument("--skin-mask", action="store_true")
+    parser.add_argument("--algorithm", choices=list(BVP_ALGORITHMS), default=DEFAULT_ALGORITHM)
+    parser.add_argument("--mode", choices=RPPG_MODES, default=DEFAULT_MODE)
+    parser.add_argument("--converge", action="store_true")
+    parser.add_argument("--convergence-tolerance", type=float, default=CONVERGENCE_TOLERANCE_BPM)
+    parser.add_argument("--max-seconds", type=float, default=None)
+    parser.add_argument("--max-frames", type=int, default=None)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+
+    # Mismo diccionario de parámetros que arma rppg_analysis_params en la API
+    params = {
+        "detector_backend": args.detector,
+        "detection_stride": args.detection_stride,
+        "tracker": args.tracker,
+        "detection_width": args.detection_width,
+        "skin_mask": args.skin_mask,
+        "algorithm": args.algorithm,
+        "converge": args.converge,
+        "convergence_tolerance": args.convergence_tolerance,
+        "max_seconds": args.max_seconds,
+        "max_frames": args.max_frames,
+        "mode": args.mode,
+    }
+    videos = find_videos(args.inputs)
+    try:
+        writer = open_result_writer(args.output, args.format, resume=not args.no_resume, retry_failed=args.retry_failed)
+    except (ImportError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    start = time.perf_counter()
+    try:
+        counts = asyncio.run(run_batch(
+            videos, writer, params, workers=args.workers, probe=not args.no_probe, include_bvp=args.bvp
+        ))
+    except KeyboardInterrupt:
+        print("Interrumpido: relance el mismo comando para continuar", file=sys.stderr)
+        return 130
+    finally:
+        writer.close()
+    print(
+        f"{counts['total']} videos: {counts['ok']} ok, {counts['rejected']} rechazados, "
+        f"{counts['failed']} fallidos, {counts['skipped']} ya procesados "
+        f"({time.perf_counter() - start:.1f} s) -> {args.output}",
+        file=sys.stderr
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
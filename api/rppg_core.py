@@ -1,3 +1,4 @@
+import time
 import numpy as np
 try:
     import cv2
@@ -8,81 +9,384 @@ except ImportError as e:
 
 from scipy import signal
 
-# Importar FaceDetector solo si OpenCV está disponible
-if CV2_AVAILABLE:
-    try:
-        from cvzone.FaceDetectionModule import FaceDetector
-        FACE_DETECTOR_AVAILABLE = True
-    except ImportError as e:
-        print(f"Warning: FaceDetector not available: {e}")
-        FACE_DETECTOR_AVAILABLE = False
-else:
-    FACE_DETECTOR_AVAILABLE = False
-
-def read_video_with_face_detection_and_FS(video_file_path):
+from .dsp import bandpass_sos, filtfilt_padlen, hann_window, sliding_windows
+from .face_detection import (
+    get_face_detector, FaceLocator, DEFAULT_DETECTION_STRIDE, DEFAULT_TRACKER, DEFAULT_DETECTION_WIDTH
+)
+from .rppg_profiling import active_profiler, count_frames, profiled
+from .vitails import heart_rate_from_peaks
+
+# Umbral de varianza del Laplaciano para descartar frames desenfocados
+BLUR_THRESHOLD = 10  # umbral bajo para aceptar más frames
+# Lado de la miniatura gris sobre la que se mide el desenfoque en el camino rápido
+BLUR_THUMBNAIL_SIZE = 64
+# Rango de piel en YCrCb (Cr, Cb) para la máscara opcional
+SKIN_YCRCB_LOW = (0, 133, 77)
+SKIN_YCRCB_HIGH = (255, 173, 127)
+
+def face_roi_bounds(frame, bbox):
+    """Caja (x, y, w, h) recortada al frame como (x1, y1, x2, y2), o None si es demasiado pequeña"""
+    if not bbox:
+        return None
+    x, y, w, h = bbox
+    y1, y2 = max(0, y), min(frame.shape[0], y + h)
+    x1, x2 = max(0, x), min(frame.shape[1], x + w)
+    if y2 - y1 < 10 or x2 - x1 < 10:
+        return None
+    return x1, y1, x2, y2
+
+def _seek(cap, video_file_path, frame_index):
+    """Posiciona el video en ``frame_index``; si el contenedor no permite un seek
+    exacto, lo reabre y avanza con ``grab`` (más lento, pero el frame es el mismo)."""
+    if frame_index <= 0:
+        return cap
+    cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+    if int(cap.get(cv2.CAP_PROP_POS_FRAMES)) == frame_index:
+        return cap
+    cap.release()
+    cap = cv2.VideoCapture(video_file_path)
+    for _ in range(frame_index):
+        if not cap.grab():
+            break
+    return cap
+
+def _iter_face_rois(video_file_path, detector_backend=None, detection_stride=None, tracker=None, stats=None,
+                    detection_width=None, max_fps=None, segment=None):
+    """Decodifica el video y genera, frame a frame, la caja de la cara más grande.
+
+    Se devuelve primero el FS del video y luego tuplas ``(frame, x1, y1, x2, y2)``.
+    El buffer del frame se reutiliza en la siguiente iteración: el consumidor
+    debe terminar con el ROI antes de pedir el siguiente. Si se pasa ``stats``
+    (dict), se acumulan ahí los tiempos por etapa; con un perfilador activo se
+    registran además pared y CPU de decodificación y detección. Con ``max_fps`` se procesa
+    un frame de cada ``round(FS / max_fps)``: los demás se saltan con ``grab``
+    (sin convertir a BGR) y el FS devuelto es el efectivo.
+
+    ``segment = (warmup_start, start, end)`` limita la decodificación a los
+    frames ``[warmup_start, end)``: los anteriores a ``start`` solo sirven
+    para poner en marcha el detector/tracker y no se devuelven.
+    """
     if not CV2_AVAILABLE:
         raise ImportError("OpenCV is not available. Cannot process video.")
     
-    if not FACE_DETECTOR_AVAILABLE:
-        raise ImportError("FaceDetector is not available. Cannot process video.")
+    # Detector persistente del worker (ImportError si el backend no está disponible)
+    locator = FaceLocator(
+        get_face_detector(detector_backend),
+        detection_stride=detection_stride or DEFAULT_DETECTION_STRIDE,
+        tracker=tracker or DEFAULT_TRACKER,
+        detection_width=DEFAULT_DETECTION_WIDTH if detection_width is None else detection_width,
+        first_frame=segment[0] if segment is not None else 0
+    )
+    profiler = active_profiler()
+    decode_time = decode_cpu = locate_time = locate_cpu = 0.0
+    frames_decoded = frames_skipped = frames_with_face = frames_warmup = 0
+    frame_step = 1
+    warmup_start, emit_from, end_frame = segment if segment is not None else (0, 0, None)
     
     cap = cv2.VideoCapture(video_file_path)
-    FS = cap.get(cv2.CAP_PROP_FPS)
-    if FS <= 0:
-        FS = 30
-    face_frames = []
-    detector = FaceDetector(minDetectionCon=0.6)  # Menor umbral para aceptar más caras
-    target_size = (128, 128)
+    try:
+        FS = cap.get(cv2.CAP_PROP_FPS)
+        if FS <= 0:
+            FS = 30
+        if stats is not None:
+            stats["frames_total"] = max(0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+        if max_fps and FS > max_fps:
+            frame_step = max(1, int(round(FS / max_fps)))
+        yield FS / frame_step
+        cap = _seek(cap, video_file_path, warmup_start)
+        index = warmup_start
+        frame = None
+        while end_frame is None or index < end_frame:
+            start, cpu_start = time.perf_counter(), time.thread_time()
+            ret, frame = cap.read(frame)
+            # Submuestreo temporal: avanzar el demuxer sin recuperar los frames intermedios
+            for _ in range(frame_step - 1):
+                if not cap.grab():
+                    break
+                frames_skipped += 1
+            decode_time += time.perf_counter() - start
+            decode_cpu += time.thread_time() - cpu_start
+            if not ret or frame is None:
+                break
+            warmup = index < emit_from
+            index += frame_step
+            if warmup:
+                frames_warmup += 1
+            else:
+                frames_decoded += 1
+            if frame.shape[0] < 32 or frame.shape[1] < 32:
+                continue
+            start, cpu_start = time.perf_counter(), time.thread_time()
+            bbox = locator.locate(frame)
+            locate_time += time.perf_counter() - start
+            locate_cpu += time.thread_time() - cpu_start
+            bounds = face_roi_bounds(frame, bbox)
+            if bounds is not None and not warmup:
+                frames_with_face += 1
+                yield (frame, *bounds)
+    finally:
+        cap.release()
+        if stats is not None:
+            stats.update({
+                "decode": decode_time,
+                "detect": locator.timings["detect"] + locator.timings["resize"],
+                "track": locator.timings["track"],
+                "frames_decoded": frames_decoded,
+                "frames_skipped": frames_skipped,
+                "frames_warmup": frames_warmup,
+                "frame_step": frame_step,
+                "frames_with_face": frames_with_face,
+                **locator.counts
+            })
+        if profiler is not None:
+            frames_read = frames_decoded + frames_warmup
+            profiler.add("decode", decode_time, decode_cpu, frames_read)
+            # Detección completa y seguimiento entre detecciones
+            profiler.add("detect", locate_time, locate_cpu, frames_read)
+            profiler.count("decoded", frames_decoded)
+            profiler.count("skipped", frames_skipped)
+            profiler.count("warmup", frames_warmup)
+            profiler.count("detected", locator.counts["detected"])
+            profiler.count("tracked", locator.counts["tracked"])
+            profiler.count("with_face", frames_with_face)
+
+def _iter_face_crops(video_file_path, detector_backend=None, stats=None):
+    """Recortes de cara redimensionados al tamaño de la primera cara válida,
+    sin frames desenfocados (camino original, usado por la API de lista de frames).
+    """
+    rois = _iter_face_rois(video_file_path, detector_backend, stats=stats)
+    yield next(rois)
     std_height, std_width = None, None
-    while True:
-        ret, frame = cap.read()
-        if not ret or frame is None:
-            break
-        if frame.shape[0] < 32 or frame.shape[1] < 32:
+    for frame, x1, y1, x2, y2 in rois:
+        face_frame = frame[y1:y2, x1:x2]
+        # Establecer tamaño estándar según la primera cara válida
+        if std_height is None or std_width is None:
+            std_height, std_width = face_frame.shape[0], face_frame.shape[1]
+        try:
+            face_frame_resized = cv2.resize(face_frame, (std_width, std_height), interpolation=cv2.INTER_AREA)
+            # Detección de desenfoque
+            gray = cv2.cvtColor(face_frame_resized, cv2.COLOR_BGR2GRAY)
+            fm = cv2.Laplacian(gray, cv2.CV_64F).var()
+            if fm < BLUR_THRESHOLD:
+                continue
+        except Exception:
             continue
+        yield face_frame_resized
+
+class RoiStatistics:
+    """Promedio RGB y desenfoque de un ROI sin copias por frame.
+
+    Las medias se calculan con ``cv2.mean`` directamente sobre la vista uint8
+    del recorte (opcionalmente con máscara de piel) y el desenfoque sobre una
+    miniatura gris de tamaño fijo. Todos los buffers intermedios se reservan
+    una vez y se reutilizan.
+    """
+
+    def __init__(self, skin_mask=False, blur_threshold=BLUR_THRESHOLD, thumbnail_size=BLUR_THUMBNAIL_SIZE):
+        self.skin_mask = skin_mask
+        self.blur_threshold = blur_threshold
+        self._thumb_size = (thumbnail_size, thumbnail_size)
+        self._thumb = np.empty((thumbnail_size, thumbnail_size, 3), dtype=np.uint8)
+        self._thumb_gray = np.empty((thumbnail_size, thumbnail_size), dtype=np.uint8)
+        self._laplacian = np.empty((thumbnail_size, thumbnail_size), dtype=np.int16)
+        # Buffers planos para la máscara de piel; se amplían solo si crece el ROI
+        self._ycrcb = np.empty(0, dtype=np.uint8)
+        self._mask = np.empty(0, dtype=np.uint8)
+
+    def is_blurry(self, roi):
+        cv2.resize(roi, self._thumb_size, dst=self._thumb, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self._thumb, cv2.COLOR_BGR2GRAY, dst=self._thumb_gray)
+        cv2.Laplacian(self._thumb_gray, cv2.CV_16S, dst=self._laplacian)
+        _, std = cv2.meanStdDev(self._laplacian)
+        return std[0, 0] ** 2 < self.blur_threshold
+
+    def _skin_mask(self, roi):
+        height, width = roi.shape[:2]
+        n = height * width
+        if self._mask.size < n:
+            self._ycrcb = np.empty(3 * n, dtype=np.uint8)
+            self._mask = np.empty(n, dtype=np.uint8)
+        # Vistas contiguas sobre los buffers planos: OpenCV escribe en ellas sin reasignar
+        ycrcb = self._ycrcb[:3 * n].reshape(height, width, 3)
+        mask = self._mask[:n].reshape(height, width)
+        cv2.cvtColor(roi, cv2.COLOR_BGR2YCrCb, dst=ycrcb)
+        cv2.inRange(ycrcb, SKIN_YCRCB_LOW, SKIN_YCRCB_HIGH, dst=mask)
+        return mask
+
+    def rgb_mean(self, roi):
+        """Promedio (R, G, B) normalizado a [0, 1]"""
+        mask = None
+        if self.skin_mask:
+            mask = self._skin_mask(roi)
+            if cv2.countNonZero(mask) == 0:
+                mask = None
+        # cv2.mean devuelve (B, G, R, 0) en float64 sin copiar el recorte
+        b, g, r, _ = cv2.mean(roi, mask=mask)
+        return (r / 255.0, g / 255.0, b / 255.0)
+
+def iter_face_rgb_means(video_file_path, detector_backend=None, detection_stride=None, tracker=None, stats=None,
+                        detection_width=None, skin_mask=False, max_fps=None, segment=None):
+    """Genera el promedio RGB (normalizado a [0, 1]) de la cara en cada frame válido.
+
+    Fusiona decodificación, detección y reducción por frame: ningún recorte
+    sobrevive a su iteración. El primer valor generado es el FS del video.
+    """
+    rois = _iter_face_rois(
+        video_file_path, detector_backend, detection_stride, tracker, stats, detection_width, max_fps, segment
+    )
+    yield next(rois)
+    profiler = active_profiler()
+    roi_stats = RoiStatistics(skin_mask=skin_mask)
+    roi_time = roi_cpu = 0.0
+    frames_roi = frames_blurry = 0
+    try:
+        for frame, x1, y1, x2, y2 in rois:
+            start, cpu_start = time.perf_counter(), time.thread_time()
+            frames_roi += 1
+            roi = frame[y1:y2, x1:x2]
+            if roi_stats.is_blurry(roi):
+                frames_blurry += 1
+                roi_time += time.perf_counter() - start
+                roi_cpu += time.thread_time() - cpu_start
+                continue
+            row = roi_stats.rgb_mean(roi)
+            roi_time += time.perf_counter() - start
+            roi_cpu += time.thread_time() - cpu_start
+            yield row
+    finally:
+        rois.close()
+        if stats is not None:
+            stats["roi"] = roi_time
+            stats["frames_blurry"] = frames_blurry
+        if profiler is not None:
+            profiler.add("roi", roi_time, roi_cpu, frames_roi)
+            profiler.count("dropped_blur", frames_blurry)
+
+class FaceRgbSampler:
+    """Promedio RGB de la cara frame a frame, para fuentes en vivo (sin video en disco).
+
+    Mismo camino que ``iter_face_rgb_means``: detect-then-track, recorte,
+    descarte de frames desenfocados y media con ``RoiStatistics``. Cada
+    instancia tiene su propio estado de seguimiento; el detector es el del
+    hilo que la crea, así que debe usarse siempre desde ese hilo.
+    """
+
+    def __init__(self, detector_backend=None, detection_stride=None, tracker=None, detection_width=None,
+                 skin_mask=False):
+        if not CV2_AVAILABLE:
+            raise ImportError("OpenCV is not available. Cannot process frames.")
+        self.locator = FaceLocator(
+            get_face_detector(detector_backend),
+            detection_stride=detection_stride or DEFAULT_DETECTION_STRIDE,
+            tracker=tracker or DEFAULT_TRACKER,
+            detection_width=DEFAULT_DETECTION_WIDTH if detection_width is None else detection_width
+        )
+        self.roi_stats = RoiStatistics(skin_mask=skin_mask)
+        self.frames = 0
+        self.frames_with_face = 0
+        self.frames_blurry = 0
+
+    def sample(self, frame):
+        """Promedio (R, G, B) de la cara en un frame BGR, o None si no hay cara utilizable"""
+        self.frames += 1
+        if frame.shape[0] < 32 or frame.shape[1] < 32:
+            return None
+        bounds = face_roi_bounds(frame, self.locator.locate(frame))
+        if bounds is None:
+            return None
+        self.frames_with_face += 1
+        x1, y1, x2, y2 = bounds
+        roi = frame[y1:y2, x1:x2]
+        if self.roi_stats.is_blurry(roi):
+            self.frames_blurry += 1
+            return None
+        return self.roi_stats.rgb_mean(roi)
+
+def read_video_rgb_trace_and_FS(video_file_path, detector_backend=None, detection_stride=None, tracker=None, stats=None,
+                                detection_width=None, skin_mask=False, stop_condition=None, max_fps=None,
+                                segment=None):
+    """Lee el video en modo streaming y devuelve la traza RGB (N, 3) y el FS.
+
+    ``stop_condition(FS)``, si se pasa, devuelve un callable que recibe cada media RGB
+    y devuelve True para dejar de decodificar (corte anticipado).
+    """
+    means = iter_face_rgb_means(
+        video_file_path, detector_backend, detection_stride, tracker, stats, detection_width, skin_mask, max_fps,
+        segment
+    )
+    FS = next(means)
+    if stop_condition is None:
+        rows = list(means)
+    else:
+        stop = stop_condition(FS)
+        rows = []
+        for row in means:
+            rows.append(row)
+            if stop(row):
+                break
+        # Cerrar el generador libera el video y vuelca las estadísticas
+        means.close()
+    RGB = np.asarray(rows, dtype=np.float64)
+    if RGB.shape[0] == 0:
+        return None, None
+    return RGB, FS
+
+def video_frame_info(video_file_path):
+    """(FS, número de frames) según los metadatos del contenedor; 0 frames si no se conoce"""
+    if not CV2_AVAILABLE:
+        raise ImportError("OpenCV is not available. Cannot process video.")
+    cap = cv2.VideoCapture(video_file_path)
+    try:
+        FS = cap.get(cv2.CAP_PROP_FPS)
+        return (FS if FS > 0 else 30), max(0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+    finally:
+        cap.release()
+
+def video_segments(frame_count, n_segments, overlap, align=1):
+    """Divide ``[0, frame_count)`` en tramos contiguos ``(warmup_start, start, end)``.
+
+    Los límites se alinean a múltiplos de ``align`` (el paso de detección)
+    para que cada tramo detecte en los mismos frames que la pasada serie.
+    Cada tramo empieza a decodificar ``overlap`` frames antes de ``start``
+    (una ventana CHROM) para que la cara ya esté localizada al llegar a su
+    parte; esos frames los aporta el tramo anterior, así que al concatenar
+    las trazas en orden no hay huecos ni duplicados. El último tramo no
+    tiene fin (``None``): llega hasta el final real del video aunque el
+    número de frames del contenedor no sea exacto.
+    """
+    align = max(1, int(align))
+    n_segments = max(1, min(int(n_segments), frame_count // max(1, overlap, align)))
+    bounds = [0]
+    for i in range(1, n_segments):
+        bound = int(round(frame_count * i / n_segments / align)) * align
+        if bound > bounds[-1]:
+            bounds.append(bound)
+    bounds.append(frame_count)
+    segments = []
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        warmup_start = max(0, (start - overlap) // align * align)
+        segments.append((warmup_start, start, end))
+    segments[-1] = segments[-1][:2] + (None,)
+    return segments
+
+def read_video_with_face_detection_and_FS(video_file_path, detector_backend=None):
+    crops = _iter_face_crops(video_file_path, detector_backend)
+    FS = next(crops)
+    face_frames = []
+    for face_frame_resized in crops:
         try:
-            img_with_faces, bboxs = detector.findFaces(frame, draw=False)
+            face_frame_rgb = cv2.cvtColor(face_frame_resized, cv2.COLOR_BGR2RGB)
+            # Normalización
+            face_frame_rgb = face_frame_rgb.astype(np.float32) / 255.0
+            face_frames.append(face_frame_rgb)
         except Exception:
             continue
-        if bboxs:
-            # Buscar la cara más grande
-            largest_bbox = None
-            max_area = 0
-            for bbox_info in bboxs:
-                x, y, w, h = bbox_info['bbox']
-                area = w * h
-                if area > max_area:
-                    max_area = area
-                    largest_bbox = bbox_info['bbox']
-            if largest_bbox:
-                x, y, w, h = largest_bbox
-                y1, y2 = max(0, y), min(frame.shape[0], y + h)
-                x1, x2 = max(0, x), min(frame.shape[1], x + w)
-                face_frame = frame[y1:y2, x1:x2]
-                if face_frame.size == 0 or face_frame.shape[0] < 10 or face_frame.shape[1] < 10:
-                    continue
-                # Establecer tamaño estándar según la primera cara válida
-                if std_height is None or std_width is None:
-                    std_height, std_width = face_frame.shape[0], face_frame.shape[1]
-                try:
-                    face_frame_resized = cv2.resize(face_frame, (std_width, std_height), interpolation=cv2.INTER_AREA)
-                    face_frame_rgb = cv2.cvtColor(face_frame_resized, cv2.COLOR_BGR2RGB)
-                    # Detección de desenfoque
-                    gray = cv2.cvtColor(face_frame_resized, cv2.COLOR_BGR2GRAY)
-                    fm = cv2.Laplacian(gray, cv2.CV_64F).var()
-                    if fm < 10:  # umbral más bajo para aceptar más frames
-                        continue
-                    # Normalización
-                    face_frame_rgb = face_frame_rgb.astype(np.float32) / 255.0
-                    face_frames.append(face_frame_rgb)
-                except Exception:
-                    continue
-    cap.release()
     if not face_frames:
         return None, None
     return face_frames, FS
 
-def process_video(frames):
+def frames_to_rgb(frames):
+    """Reduce una lista de frames RGB a su promedio por canal, (N, 3)."""
     RGB = []
     for frame in frames:
         if frame.size == 0:
@@ -91,20 +395,43 @@ def process_video(frames):
         if frame_area > 0:
             sum_vals = np.sum(np.sum(frame, axis=0), axis=0)
             RGB.append(sum_vals / frame_area)
-    RGB = np.asarray(RGB)
-    # Filtro de frames atípicos (outliers por color)
+    return np.asarray(RGB)
+
+def rgb_outlier_mask(RGB):
+    """Máscara de frames no atípicos (a menos de 3 desviaciones de la mediana por canal)."""
     if len(RGB) > 10:
         medians = np.median(RGB, axis=0)
         stds = np.std(RGB, axis=0)
-        mask = np.all(np.abs(RGB - medians) < 3 * stds, axis=1)
+        return np.all(np.abs(RGB - medians) < 3 * stds, axis=1)
+    return np.ones(len(RGB), dtype=bool)
+
+def reject_rgb_outliers(RGB):
+    """Filtro de frames atípicos (outliers por color) sobre la traza (N, 3)."""
+    if len(RGB) > 10:
+        mask = rgb_outlier_mask(RGB)
+        count_frames("dropped_outlier", len(mask) - int(np.count_nonzero(mask)))
         RGB = RGB[mask]
     return RGB
 
-def CHROME_DEHAAN(frames, FS):
-    LPF, HPF = 0.7, 2.5
-    WinSec = 1.6
-    RGB = process_video(frames)
-    FN = RGB.shape[0]
+def process_video(frames):
+    return reject_rgb_outliers(frames_to_rgb(frames))
+
+def _is_rgb_trace(frames):
+    return isinstance(frames, np.ndarray) and frames.ndim == 2 and frames.shape[1] == 3
+
+# Parámetros de CHROM: banda cardíaca (Hz), orden del Butterworth y ventana (s)
+CHROM_LPF, CHROM_HPF = 0.7, 2.5
+CHROM_FILTER_ORDER = 3
+CHROM_WIN_SEC = 1.6
+
+def chrom_window_starts(FN, WinL):
+    """Inicio de cada ventana CHROM (solape del 50 %), como en la implementación original"""
+    NWin = max(1, int((FN - WinL) / (WinL / 2)) + 1)
+    return (np.arange(NWin) * WinL / 2).astype(int)
+
+def chrom_filter_design(FS):
+    """SOS del pasa banda de CHROM para este FS (cacheado), o None si no es válido"""
+    LPF, HPF = CHROM_LPF, CHROM_HPF
     NyquistF = FS / 2.0
     # Validar frecuencias de corte
     if LPF >= HPF or HPF >= NyquistF:
@@ -112,55 +439,138 @@ def CHROME_DEHAAN(frames, FS):
         LPF = min(LPF, HPF * 0.98)
         if LPF <= 0: return None
     try:
-        B, A = signal.butter(3, [LPF / NyquistF, HPF / NyquistF], btype='bandpass')
+        return bandpass_sos(float(FS), LPF, HPF, CHROM_FILTER_ORDER)
     except Exception:
         return None
-    WinL = int(WinSec * FS)
-    NWin = max(1, int((FN - WinL) / (WinL / 2)) + 1)
-    S = np.zeros(FN)
-    for i in range(NWin):
-        WinS = int(i * WinL / 2)
-        WinE = min(WinS + WinL, FN)
-        RGB_win = RGB[WinS:WinE, :]
-        if RGB_win.shape[0] < 2: continue
-        RGBBase = np.mean(RGB_win, axis=0)
-        if np.any(RGBBase == 0): continue
-        RGBNorm = RGB_win / RGBBase
+
+def chrom_windows(RGB_windows, sos):
+    """Señal CHROM con ventana de Hann para un lote de ventanas RGB (n_win, 3, L).
+
+    Las ventanas inválidas (base RGB nula o Y filtrada constante) quedan en cero.
+    """
+    n_win, _, L = RGB_windows.shape
+    with np.errstate(divide='ignore', invalid='ignore'):
+        RGBBase = RGB_windows.mean(axis=2)
+        valid = np.all(RGBBase != 0, axis=1)
+        RGBNorm = RGB_windows / RGBBase[:, :, None]
         Xs = 3 * RGBNorm[:, 0] - 2 * RGBNorm[:, 1]
         Ys = 1.5 * RGBNorm[:, 0] + RGBNorm[:, 1] - 1.5 * RGBNorm[:, 2]
-        min_signal_length = 3 * 2 * 2
-        if len(Xs) <= min_signal_length:
-            continue
-        try:
-            Xf = signal.filtfilt(B, A, Xs)
-            Yf = signal.filtfilt(B, A, Ys)
-        except Exception:
-            continue
-        std_Xf = np.std(Xf)
-        std_Yf = np.std(Yf)
-        if std_Yf == 0: continue
-        Alpha = std_Xf / std_Yf
-        SWin = Xf - Alpha * Yf
-        hann_win = signal.windows.hann(len(SWin))
-        SWin_hann = SWin * hann_win
-        WinM = WinS + (WinE - WinS) // 2
-        len1 = min(len(SWin_hann)//2, WinM - WinS)
-        len2 = min(len(SWin_hann) - len1, WinE - WinM)
-        if len1 > 0:
-            S[WinS : WinS + len1] += SWin_hann[:len1]
-        if len2 > 0:
-            S[WinM : WinM + len2] += SWin_hann[len1 : len1+len2]
+        Xs[~valid] = 0
+        Ys[~valid] = 0
+        # Filtrado de todas las ventanas a la vez; padlen igual al de filtfilt(B, A)
+        XYf = signal.sosfiltfilt(sos, np.concatenate([Xs, Ys]), axis=-1, padlen=filtfilt_padlen(CHROM_FILTER_ORDER))
+        Xf, Yf = XYf[:n_win], XYf[n_win:]
+        std_Xf = Xf.std(axis=1)
+        std_Yf = Yf.std(axis=1)
+        valid &= std_Yf != 0
+        Alpha = np.where(valid, std_Xf / std_Yf, 0)
+    SWin = (Xf - Alpha[:, None] * Yf) * hann_window(L)
+    SWin[~valid] = 0
+    return SWin
+
+def chrom_bvp(RGB, FS):
+    """CHROM vectorizado sobre una traza RGB (N, 3) ya filtrada de outliers"""
+    FN = RGB.shape[0]
+    sos = chrom_filter_design(FS)
+    if sos is None:
+        return None
+    WinL = int(CHROM_WIN_SEC * FS)
+    if WinL < 1:
+        return None
+    S = np.zeros(FN)
+    L = min(WinL, FN)
+    # Ventanas de 12 muestras o menos (o más cortas que el padding del filtro) no aportan
+    if L <= max(3 * 2 * 2, filtfilt_padlen(CHROM_FILTER_ORDER)):
+        return S
+    starts = chrom_window_starts(FN, WinL)
+    SWin = chrom_windows(sliding_windows(RGB, starts, L), sos)
+    # Overlap-add de todas las ventanas en una sola pasada
+    idx = starts[:, None] + np.arange(L)
+    S += np.bincount(idx.ravel(), weights=SWin.ravel(), minlength=FN)
     return S
 
+# Historia mínima (s) antes de rechazar outliers en CHROM en línea
+INCREMENTAL_OUTLIER_HISTORY_SEC = 8.0
+
+class IncrementalChrom:
+    """CHROM en línea sobre un buffer circular de medias RGB.
+
+    Cada vez que llegan ``WinL/2`` muestras nuevas se procesa solo la ventana
+    recién completada (mismos inicios que ``chrom_window_starts``) y se suma
+    al BVP por overlap-add, en lugar de recalcular toda la traza. Una muestra
+    es definitiva cuando ninguna ventana futura puede cubrirla. La memoria
+    es fija: ``buffer_seconds`` de RGB y de BVP.
+
+    Los outliers de color se rechazan de forma causal, contra la mediana y
+    la desviación de las muestras ya aceptadas en el buffer.
+    """
+
+    def __init__(self, FS, buffer_seconds=30.0, reject_outliers=True):
+        self.FS = float(FS)
+        self.sos = chrom_filter_design(self.FS)
+        self.WinL = int(CHROM_WIN_SEC * self.FS)
+        if self.sos is None or self.WinL <= max(3 * 2 * 2, filtfilt_padlen(CHROM_FILTER_ORDER)):
+            raise ValueError(f"FS no válido para CHROM en línea: {FS}")
+        self.capacity = max(int(buffer_seconds * self.FS), 2 * self.WinL)
+        self.reject_outliers = reject_outliers
+        self._rgb = np.zeros((self.capacity, 3))
+        self._bvp = np.zeros(self.capacity)
+        self.count = 0          # muestras aceptadas desde el inicio (índice absoluto)
+        self.rejected = 0
+        self.windows = 0        # ventanas ya sumadas al BVP
+
+    def _window_start(self, i):
+        return int(i * self.WinL / 2)
+
+    @property
+    def finalized(self):
+        """Número absoluto de muestras de BVP definitivas"""
+        return self._window_start(self.windows) if self.windows else 0
+
+    def _is_outlier(self, row):
+        n = min(self.count, self.capacity)
+        # Hace falta historia suficiente (más de un ciclo respiratorio) para que la desviación sea representativa
+        if not self.reject_outliers or n < max(self.WinL, int(INCREMENTAL_OUTLIER_HISTORY_SEC * self.FS)):
+            return False
+        recent = self._rgb[:n]
+        return not np.all(np.abs(row - np.median(recent, axis=0)) < 3 * np.std(recent, axis=0))
+
+    def push(self, rgb):
+        """Añade una media (R, G, B); devuelve cuántas ventanas nuevas se completaron"""
+        row = np.asarray(rgb, dtype=np.float64)
+        if self._is_outlier(row):
+            self.rejected += 1
+            return 0
+        pos = self.count % self.capacity
+        self._rgb[pos] = row
+        # La posición se recicla: su BVP anterior ya salió de la ventana retenida
+        self._bvp[pos] = 0.0
+        self.count += 1
+        completed = 0
+        while self._window_start(self.windows) + self.WinL <= self.count:
+            idx = (self._window_start(self.windows) + np.arange(self.WinL)) % self.capacity
+            self._bvp[idx] += chrom_windows(self._rgb[idx].T[None], self.sos)[0]
+            self.windows += 1
+            completed += 1
+        return completed
+
+    def bvp(self, seconds=None):
+        """Últimas muestras definitivas del BVP (todas las retenidas si ``seconds`` es None)"""
+        end = self.finalized
+        start = max(0, self.count - self.capacity)
+        if seconds is not None:
+            start = max(start, end - int(seconds * self.FS))
+        return self._bvp[np.arange(start, end) % self.capacity]
+
+@profiled("filter")
+def CHROME_DEHAAN(frames, FS):
+    """CHROM (de Haan) sobre una traza RGB (N, 3) o, por compatibilidad, una lista de frames."""
+    if _is_rgb_trace(frames):
+        RGB = reject_rgb_outliers(np.asarray(frames, dtype=np.float64))
+    else:
+        RGB = process_video(frames)
+    return chrom_bvp(RGB, FS)
+
+@profiled("peaks")
 def extract_heart_rate(BVP_signal, FS):
-    min_peak_dist = FS * (60.0 / 180.0)
-    peaks, _ = signal.find_peaks(BVP_signal, distance=min_peak_dist, prominence=np.std(BVP_signal)*0.1)
-    if len(peaks) < 2:
-        return None, None
-    peak_intervals_sec = np.diff(peaks) / FS
-    valid_intervals = peak_intervals_sec[(peak_intervals_sec >= 60.0/180.0) & (peak_intervals_sec <= 60.0/40.0)]
-    if len(valid_intervals) < 1:
-        return None, None
-    avg_ibi = np.mean(valid_intervals)
-    heart_rate_bpm = 60.0 / avg_ibi
-    return heart_rate_bpm, peaks
+    return heart_rate_from_peaks(BVP_signal, FS)
@@ -0,0 +1,156 @@
+"""
+Codificación compacta de las respuestas rPPG
+
+El BVP es un float por frame y en JSON (``bvp.tolist()``) domina el tamaño y
+el tiempo de serialización de la respuesta. Aquí se negocia el formato por
+``Accept``: JSON (por defecto, compatible), ``application/x-npy`` (solo el
+BVP, metadatos en la cabecera ``X-RPPG-Meta``) o msgpack (opcional, si el
+paquete está instalado). En JSON el BVP puede ir como float32 en base64 y,
+en cualquier formato, diezmado por un factor entero.
+"""
+
+import base64
+import io
+import json
+from typing import Any, Dict, Optional
+
+import numpy as np
+from fastapi.responses import JSONResponse, Response
+from scipy import signal
+
+from .error_handlers import ValidationError
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+JSON_MEDIA_TYPE = "application/json"
+NPY_MEDIA_TYPE = "application/x-npy"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+RPPG_MEDIA_TYPES = {
+    JSON_MEDIA_TYPE: "json",
+    NPY_MEDIA_TYPE: "npy",
+    MSGPACK_MEDIA_TYPE: "msgpack",
+    "application/x-msgpack": "msgpack",
+}
+BVP_ENCODINGS = ("list", "base64")
+BVP_DTYPE = "<f4"
+MAX_BVP_DOWNSAMPLE = 16
+# Campos con arrays largos que no viajan en la cabecera de metadatos de application/x-npy
+_ARRAY_FIELDS = ("bvp", "ibi", "hr_series")
+
+
+def negotiate_rppg_format(accept: Optional[str]) -> str:
+    """Formato de respuesta ("json", "npy" o "msgpack") según la cabecera ``Accept``
+
+    Sin cabecera, con ``*/*`` o con tipos desconocidos se responde JSON.
+    """
+    best, best_q = "json", 0.0
+    for part in (accept or "").split(","):
+        media_type, _, rest = part.strip().partition(";")
+        fmt = RPPG_MEDIA_TYPES.get(media_type.strip().lower())
+        if fmt is None:
+            continue
+        q = 1.0
+        for param in rest.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > best_q:
+            best, best_q = fmt, q
+    if best == "msgpack" and not MSGPACK_AVAILABLE:
+        raise ValidationError(
+            "msgpack no está instalado en el servidor",
+            "UNSUPPORTED_ENCODING",
+            {"accept": accept, "available": ["json", "npy"]}
+        )
+    return best
+
+
+def downsample_bvp(bvp: np.ndarray, factor: int) -> np.ndarray:
+    """Diezma el BVP por ``factor`` con filtro antialiasing de fase cero"""
+    if factor <= 1:
+        return bvp
+    # decimate(fir) usa un FIR de 20·factor+1 coeficientes y filtfilt necesita 3x su longitud
+    if len(bvp) <= 3 * (20 * factor + 1):
+        return bvp[::factor]
+    return signal.decimate(bvp, factor, ftype="fir", zero_phase=True)
+
+
+def encode_array_base64(values: np.ndarray) -> Dict[str, Any]:
+    """Array como float32 little-endian en base64, con dtype y forma para decodificarlo"""
+    data = np.ascontiguousarray(values, dtype=BVP_DTYPE)
+    return {
+        "encoding": "base64",
+        "dtype": BVP_DTYPE,
+        "shape": list(data.shape),
+        "data": base64.b64encode(data.tobytes()).decode("ascii"),
+    }
+
+
+def _npy_bytes(values: np.ndarray) -> bytes:
+    buffer = io.BytesIO()
+    np.save(buffer, np.ascontiguousarray(values, dtype=BVP_DTYPE), allow_pickle=False)
+    return buffer.getvalue()
+
+
+def encode_rppg_content(
+    content: Dict[str, Any], fmt: str = "json", bvp_encoding: str = "list", bvp_downsample: int = 1
+) -> Dict[str, Any]:
+    """Cuerpo de ``/rppg`` con el BVP convertido para JSON o msgpack
+
+    ``bvp_fs`` indica la frecuencia de muestreo del BVP devuelto; ``ibi``
+    sigue en índices de frame del video.
+    """
+    if fmt == "json" and bvp_encoding == "list" and bvp_downsample <= 1:
+        return content
+    bvp = downsample_bvp(np.asarray(content["bvp"], dtype=np.float64), bvp_downsample)
+    fps = content.get("fps")
+    body = {**content, "bvp_fs": fps / bvp_downsample if fps else None}
+    if fmt == "msgpack":
+        # Los bytes crudos float32 viajan como bin de msgpack, sin pasar por texto
+        body["bvp"] = np.ascontiguousarray(bvp, dtype=BVP_DTYPE).tobytes()
+        body["bvp_dtype"] = BVP_DTYPE
+    elif bvp_encoding == "base64":
+        body["bvp"] = encode_array_base64(bvp)
+    else:
+        body["bvp"] = bvp.tolist()
+    return body
+
+
+def render_rppg_body(
+    body: Dict[str, Any], fmt: str = "json", headers: Optional[Dict[str, str]] = None, status_code: int = 200
+) -> Response:
+    """Serializa un documento ya codificado como JSON o msgpack"""
+    if fmt == "msgpack":
+        return Response(
+            content=msgpack.packb(body, use_bin_type=True),
+            media_type=MSGPACK_MEDIA_TYPE, headers=headers, status_code=status_code
+        )
+    return JSONResponse(content=body, headers=headers, status_code=status_code)
+
+
+def render_rppg_response(
+    content: Dict[str, Any],
+    fmt: str = "json",
+    bvp_encoding: str = "list",
+    bvp_downsample: int = 1,
+    headers: Optional[Dict[str, str]] = None,
+    status_code: int = 200
+) -> Response:
+    """Respuesta de un análisis rPPG en el formato negociado"""
+    if fmt != "npy":
+        body = encode_rppg_content(content, fmt, bvp_encoding, bvp_downsample)
+        return render_rppg_body(body, fmt, headers, status_code)
+
+    bvp = downsample_bvp(np.asarray(content["bvp"], dtype=np.float64), bvp_downsample)
+    fps = content.get("fps")
+    meta = {key: value for key, value in content.items() if key not in _ARRAY_FIELDS}
+    meta["bvp_fs"] = fps / bvp_downsample if fps else None
+    headers = {**(headers or {}), "X-RPPG-Meta": json.dumps(meta)}
+    return Response(content=_npy_bytes(bvp), media_type=NPY_MEDIA_TYPE, headers=headers, status_code=status_code)
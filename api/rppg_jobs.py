@@ -0,0 +1,399 @@
+"""
+Cola persistente de trabajos rPPG para SignaApi
+
+``POST /rppg/jobs`` guarda el video y encola el trabajo en una base SQLite
+local; unos workers asíncronos vacían la cola a través del ejecutor de
+cómputo y guardan el resultado, que el cliente consulta con
+``GET /rppg/jobs/{id}``. Los trabajos que quedaron en ejecución al caer el
+proceso se vuelven a encolar al arrancar.
+
+El orden de atención es WFQ por (tenant, clase de triaje), ver
+``rppg_scheduler``: las etiquetas virtuales se guardan con cada trabajo.
+
+Todas las operaciones sobre SQLite corren en un hilo dedicado (uno solo, así
+que además quedan serializadas); la interfaz que usan los endpoints y los
+workers es asíncrona y nunca bloquea el event loop.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from .error_handlers import ComputeQueueFullError, RPPGProcessingError
+from .rppg_scheduler import (
+    DEFAULT_TENANT, DEFAULT_TRIAGE, TRIAGE_WEIGHTS, FairShareClock, wait_percentiles
+)
+
+logger = logging.getLogger("signaapi.rppg_jobs")
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+MAX_JOB_ATTEMPTS = 3
+THROUGHPUT_WINDOW_SEC = 300
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS rppg_jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    filename TEXT,
+    video_path TEXT NOT NULL,
+    params TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    error_code TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    tenant TEXT NOT NULL DEFAULT '{DEFAULT_TENANT}',
+    triage TEXT NOT NULL DEFAULT '{DEFAULT_TRIAGE}',
+    virtual_start REAL NOT NULL DEFAULT 0,
+    virtual_finish REAL NOT NULL DEFAULT 0,
+    cache_key TEXT,
+    provisional TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_rppg_jobs_status ON rppg_jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS idx_rppg_jobs_fair ON rppg_jobs (status, virtual_finish, created_at);
+"""
+
+
+def _iso(ts: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(ts).isoformat() if ts else None
+
+
+class RPPGJobQueue:
+    """Cola de trabajos rPPG respaldada por SQLite (sobrevive a reinicios)"""
+
+    def __init__(self, db_path: str, upload_dir: str):
+        self.db_path = db_path
+        self.upload_dir = upload_dir
+        os.makedirs(upload_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rppg-jobs-db")
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self.clock = self._restore_clock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+
+    # --- Persistencia (síncrona: se llama desde el hilo de la base) ---
+
+    async def _call(self, fn: Callable, *args):
+        """Ejecuta ``fn`` en el hilo dedicado a SQLite"""
+        return await asyncio.get_running_loop().run_in_executor(self._db, fn, *args)
+
+    def _restore_clock(self) -> FairShareClock:
+        """Reconstruye el reloj WFQ a partir de los trabajos pendientes"""
+        virtual_time = self._conn.execute(
+            "SELECT COALESCE(MAX(virtual_start), 0) FROM rppg_jobs WHERE status != ?", (JOB_QUEUED,)
+        ).fetchone()[0]
+        last_finish = {
+            (row["tenant"], row["triage"]): row["finish"]
+            for row in self._conn.execute(
+                "SELECT tenant, triage, MAX(virtual_finish) AS finish FROM rppg_jobs "
+                "WHERE status IN (?, ?) GROUP BY tenant, triage",
+                (JOB_QUEUED, JOB_RUNNING)
+            )
+        }
+        return FairShareClock(virtual_time, last_finish)
+
+    def new_job(self, suffix: str = ""):
+        """Reserva un id de trabajo y la ruta donde guardar su video"""
+        job_id = uuid.uuid4().hex
+        return job_id, os.path.join(self.upload_dir, f"{job_id}{suffix}")
+
+    async def enqueue(
+        self,
+        job_id: str,
+        video_path: str,
+        filename: str,
+        params: Dict[str, Any],
+        tenant: str = DEFAULT_TENANT,
+        triage: str = DEFAULT_TRIAGE,
+        cache_key: Optional[str] = None,
+        result: Optional[Dict[str, Any]] = None,
+        provisional: Optional[Dict[str, Any]] = None
+    ):
+        """Encola el trabajo; si ya se tiene ``result`` (caché), se registra directamente como terminado
+
+        ``provisional`` (p. ej. el resultado de ``mode=quick``) se devuelve mientras el trabajo no termine.
+        Los aciertos de caché nunca pasan por un worker: quedan con ``attempts = 0`` y no cuentan
+        en los tiempos de espera de la cola.
+        """
+        await self._call(
+            self._insert, job_id, video_path, filename, params, tenant, triage, cache_key, result, provisional
+        )
+        if result is None and self._wakeup is not None:
+            self._wakeup.set()
+
+    def _insert(
+        self,
+        job_id: str,
+        video_path: str,
+        filename: str,
+        params: Dict[str, Any],
+        tenant: str,
+        triage: str,
+        cache_key: Optional[str],
+        result: Optional[Dict[str, Any]],
+        provisional: Optional[Dict[str, Any]]
+    ):
+        now = time.time()
+        with self._lock:
+            if result is None:
+                virtual_start, virtual_finish = self.clock.tag(tenant, triage)
+                self._conn.execute(
+                    "INSERT INTO rppg_jobs (id, status, filename, video_path, params, created_at, "
+                    "tenant, triage, virtual_start, virtual_finish, cache_key, provisional) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, JOB_QUEUED, filename, video_path, json.dumps(params), now,
+                     tenant, triage, virtual_start, virtual_finish, cache_key,
+                     json.dumps(provisional) if provisional is not None else None)
+                )
+            else:
+                self._conn.execute(
+                    "INSERT INTO rppg_jobs (id, status, filename, video_path, params, created_at, "
+                    "started_at, finished_at, result, tenant, triage, cache_key) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, JOB_DONE, filename, video_path, json.dumps(params), now, now, now,
+                     json.dumps(result), tenant, triage, cache_key)
+                )
+
+    def _claim_next(self) -> Optional[sqlite3.Row]:
+        """Marca como en ejecución el trabajo con menor finalización virtual y lo devuelve"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT * FROM rppg_jobs WHERE status = ? ORDER BY virtual_finish, created_at LIMIT 1",
+                    (JOB_QUEUED,)
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE rppg_jobs SET status = ?, started_at = ?, attempts = attempts + 1 WHERE id = ?",
+                        (JOB_RUNNING, time.time(), row["id"])
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            if row is not None:
+                self.clock.advance(row["virtual_start"])
+        return row
+
+    def _release(self, job_id: str):
+        """Devuelve a la cola un trabajo que no pudo ejecutarse (sin contar el intento)"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE rppg_jobs SET status = ?, started_at = NULL, attempts = attempts - 1 WHERE id = ?",
+                (JOB_QUEUED, job_id)
+            )
+
+    def _complete(self, job_id: str, result: Dict[str, Any]):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE rppg_jobs SET status = ?, result = ?, finished_at = ? WHERE id = ?",
+                (JOB_DONE, json.dumps(result), time.time(), job_id)
+            )
+
+    def _fail(self, job_id: str, message: str, error_code: str):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE rppg_jobs SET status = ?, error = ?, error_code = ?, finished_at = ? WHERE id = ?",
+                (JOB_FAILED, message, error_code, time.time(), job_id)
+            )
+
+    def _recover(self) -> int:
+        """Reencola los trabajos que quedaron en ejecución tras una caída del proceso"""
+        with self._lock:
+            failed = self._conn.execute(
+                "UPDATE rppg_jobs SET status = ?, error = ?, error_code = ?, finished_at = ? "
+                "WHERE status = ? AND attempts >= ?",
+                (JOB_FAILED, "El trabajo se interrumpió demasiadas veces", "JOB_ABANDONED",
+                 time.time(), JOB_RUNNING, MAX_JOB_ATTEMPTS)
+            ).rowcount
+            requeued = self._conn.execute(
+                "UPDATE rppg_jobs SET status = ?, started_at = NULL WHERE status = ?",
+                (JOB_QUEUED, JOB_RUNNING)
+            ).rowcount
+        if requeued or failed:
+            logger.warning(f"rPPG jobs recovered after restart: {requeued} requeued, {failed} abandoned")
+        return requeued
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Estado público del trabajo (con el resultado si terminó)"""
+        return await self._call(self._get, job_id)
+
+    def _get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM rppg_jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            position = None
+            if row["status"] == JOB_QUEUED:
+                position = self._conn.execute(
+                    "SELECT COUNT(*) FROM rppg_jobs WHERE status = ? AND "
+                    "(virtual_finish < ? OR (virtual_finish = ? AND created_at < ?))",
+                    (JOB_QUEUED, row["virtual_finish"], row["virtual_finish"], row["created_at"])
+                ).fetchone()[0]
+
+        job = {
+            "job_id": row["id"],
+            "status": row["status"],
+            "filename": row["filename"],
+            "tenant": row["tenant"],
+            "triage": row["triage"],
+            "created_at": _iso(row["created_at"]),
+            "started_at": _iso(row["started_at"]),
+            "finished_at": _iso(row["finished_at"]),
+        }
+        if position is not None:
+            job["queue_position"] = position
+        if row["status"] == JOB_DONE:
+            job["result"] = json.loads(row["result"])
+        elif row["status"] != JOB_FAILED and row["provisional"]:
+            job["provisional_result"] = json.loads(row["provisional"])
+        elif row["status"] == JOB_FAILED:
+            job["error"] = {"message": row["error"], "code": row["error_code"]}
+        return job
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Backlog por estado y rendimiento de la cola"""
+        since = time.time() - THROUGHPUT_WINDOW_SEC
+        with self._lock:
+            counts = dict(self._conn.execute(
+                "SELECT status, COUNT(*) FROM rppg_jobs GROUP BY status"
+            ).fetchall())
+            # Los aciertos de caché (attempts = 0) no esperaron en la cola: se cuentan aparte
+            recent = self._conn.execute(
+                "SELECT COUNT(*), AVG(started_at - created_at), AVG(finished_at - started_at) "
+                "FROM rppg_jobs WHERE status IN (?, ?) AND finished_at >= ? AND attempts > 0",
+                (JOB_DONE, JOB_FAILED, since)
+            ).fetchone()
+            cache_hits = self._conn.execute(
+                "SELECT COUNT(*) FROM rppg_jobs WHERE status = ? AND finished_at >= ? AND attempts = 0",
+                (JOB_DONE, since)
+            ).fetchone()[0]
+            oldest = self._conn.execute(
+                "SELECT MIN(created_at) FROM rppg_jobs WHERE status = ?", (JOB_QUEUED,)
+            ).fetchone()[0]
+            backlog_by_triage = dict(self._conn.execute(
+                "SELECT triage, COUNT(*) FROM rppg_jobs WHERE status = ? GROUP BY triage", (JOB_QUEUED,)
+            ).fetchall())
+            waits = self._conn.execute(
+                "SELECT triage, started_at - created_at FROM rppg_jobs "
+                "WHERE started_at IS NOT NULL AND started_at >= ? AND attempts > 0",
+                (since,)
+            ).fetchall()
+
+        wait_by_triage = {}
+        for triage in TRIAGE_WEIGHTS:
+            wait_by_triage[triage] = {
+                "backlog": backlog_by_triage.get(triage, 0),
+                **wait_percentiles(wait for t, wait in waits if t == triage)
+            }
+
+        return {
+            "backlog": counts.get(JOB_QUEUED, 0),
+            "running": counts.get(JOB_RUNNING, 0),
+            "done": counts.get(JOB_DONE, 0),
+            "failed": counts.get(JOB_FAILED, 0),
+            "oldest_queued_age": time.time() - oldest if oldest else 0,
+            "throughput_per_minute": recent[0] * 60 / THROUGHPUT_WINDOW_SEC,
+            "average_queue_time": recent[1] or 0,
+            "average_run_time": recent[2] or 0,
+            "cache_hits": cache_hits,
+            "wait_by_triage": wait_by_triage,
+            "workers": len(self._tasks),
+            "timestamp": datetime.now().isoformat()
+        }
+
+    # --- Workers ---
+
+    async def start(self, n_workers: int, run: Callable):
+        """Arranca ``n_workers`` tareas que vacían la cola con ``await run(job)``
+
+        ``job`` es la fila del trabajo: video_path, filename, params (JSON), tenant, triage y cache_key.
+        """
+        await self._call(self._recover)
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(run)) for _ in range(n_workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self, run: Callable):
+        while True:
+            # Limpiar antes de consultar: un encolado durante la consulta no se pierde
+            self._wakeup.clear()
+            job = await self._call(self._claim_next)
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=5)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run_job(job, run)
+
+    async def _run_job(self, job: sqlite3.Row, run: Callable):
+        job_id = job["id"]
+        try:
+            result = await run(job)
+        except asyncio.CancelledError:
+            # Al apagar, el trabajo queda "running" y se reencola en el próximo arranque
+            raise
+        except ComputeQueueFullError:
+            # El ejecutor está saturado por peticiones síncronas: reintentar más tarde
+            await self._call(self._release, job_id)
+            await asyncio.sleep(1)
+            return
+        except RPPGProcessingError as e:
+            await self._call(self._fail, job_id, e.message, e.error_code)
+        except Exception as e:
+            logger.error(f"rPPG job {job_id} failed: {e}\n{traceback.format_exc()}")
+            await self._call(self._fail, job_id, "Error interno del servidor", "INTERNAL_ERROR")
+        else:
+            await self._call(self._complete, job_id, result)
+            logger.info(f"rPPG job {job_id} completed")
+
+        try:
+            os.remove(job["video_path"])
+        except OSError:
+            pass
+
+    def close(self):
+        self._db.shutdown(wait=True)
+        with self._lock:
+            self._conn.close()
+
+
+# Instancia global de la cola
+rppg_job_queue = None
+
+def get_rppg_job_queue() -> RPPGJobQueue:
+    """Obtener (creando si hace falta) la cola de trabajos rPPG"""
+    global rppg_job_queue
+    if rppg_job_queue is None:
+        rppg_job_queue = RPPGJobQueue(
+            db_path=os.getenv("RPPG_JOBS_DB", "rppg_jobs.db"),
+            upload_dir=os.getenv("RPPG_JOBS_DIR", os.path.join(tempfile.gettempdir(), "signaapi_rppg_jobs"))
+        )
+    return rppg_job_queue
@@ -0,0 +1,311 @@
+"""
+Pipeline rPPG completo: video -> traza RGB -> BVP -> signos vitales.
+
+Las funciones de este módulo se ejecutan dentro de los procesos del
+ejecutor de cómputo, por lo que reciben y devuelven solo objetos picklables.
+"""
+
+import logging
+import os
+from collections import deque
+from typing import Optional
+
+import numpy as np
+
+from .error_handlers import RPPGProcessingError
+from .rppg_algorithms import DEFAULT_ALGORITHM, extract_bvp
+from .rppg_profiling import StageProfiler
+from .face_detection import DEFAULT_DETECTION_STRIDE
+from .rppg_core import (
+    CHROM_WIN_SEC, IncrementalChrom, iter_face_rgb_means, read_video_rgb_trace_and_FS, video_segments
+)
+from .vitails import vitals_extractor
+
+logger = logging.getLogger("signaapi.rppg")
+
+# Corte anticipado: señal limpia mínima, tramo estable, tolerancia y confianza
+CONVERGENCE_MIN_SEC = 20.0
+CONVERGENCE_STABLE_SEC = 6.0
+CONVERGENCE_TOLERANCE_BPM = 2.0
+CONVERGENCE_MIN_CONFIDENCE = 0.3
+# BVP retenido por el monitor de convergencia
+CONVERGENCE_BUFFER_SEC = 120.0
+
+# Modos de análisis: "quick" da una HR provisional en ~1 s con una pasada
+# submuestreada en el tiempo, a baja resolución y con detección espaciada
+RPPG_MODES = ("precise", "quick")
+DEFAULT_MODE = "precise"
+QUICK_PRESET = {
+    "max_fps": 15,
+    "detection_width": 160,
+    "detection_stride": 10,
+    "max_seconds": 15.0,
+}
+
+# Videos largos en paralelo: duración mínima de cada tramo; un video se
+# divide solo si dura al menos dos tramos
+SEGMENT_MIN_SEC = float(os.getenv("RPPG_SEGMENT_MIN_SEC", "30"))
+
+
+class ConvergenceMonitor:
+    """Re-estima la HR tras cada media ventana CHROM y detecta cuándo se estabiliza
+
+    El BVP se mantiene con ``IncrementalChrom`` (cada ventana se procesa una
+    vez) y tras cada ventana nueva se recalcula la HR espectral. La
+    estimación converge cuando, con al menos ``min_seconds`` de señal
+    limpia, todas las estimaciones de los últimos ``stable_seconds`` caben en
+    ``tolerance_bpm`` con confianza suficiente.
+    """
+
+    def __init__(
+        self,
+        fps: float,
+        tolerance_bpm: float = CONVERGENCE_TOLERANCE_BPM,
+        min_seconds: float = CONVERGENCE_MIN_SEC,
+        stable_seconds: float = CONVERGENCE_STABLE_SEC,
+        min_confidence: float = CONVERGENCE_MIN_CONFIDENCE
+    ):
+        self.fps = fps
+        self.vitals = vitals_extractor(fps)
+        self.chrom = IncrementalChrom(fps, buffer_seconds=max(CONVERGENCE_BUFFER_SEC, min_seconds))
+        self.tolerance_bpm = tolerance_bpm
+        self.min_samples = int(min_seconds * fps)
+        self.stable_samples = int(stable_seconds * fps)
+        self.min_confidence = min_confidence
+        self._estimates = deque()   # (muestra, hr) del tramo estable actual
+        self.estimates = 0
+        self.converged = False
+
+    def push(self, rgb) -> bool:
+        """Añade una media RGB; True si la HR ya convergió"""
+        if not self.chrom.push(rgb):
+            return False
+        bvp = self.chrom.bvp()
+        hr, confidence = self.vitals.heart_rate_spectral(bvp)
+        self.estimates += 1
+        now = self.chrom.finalized
+        if hr is None or confidence < self.min_confidence:
+            self._estimates.clear()
+            return False
+        self._estimates.append((now, hr))
+        # Descartar las estimaciones antiguas que ya no caben en la tolerancia con la nueva
+        while max(h for _, h in self._estimates) - min(h for _, h in self._estimates) > self.tolerance_bpm:
+            self._estimates.popleft()
+        stable_since = self._estimates[0][0]
+        self.converged = len(bvp) >= self.min_samples and now - stable_since >= self.stable_samples
+        return self.converged
+
+
+def _frame_budget(fps: float, max_seconds: Optional[float], max_frames: Optional[int]) -> Optional[int]:
+    """Límite de frames limpios (el menor de ``max_frames`` y ``max_seconds`` x fps)"""
+    limits = [int(max_frames)] if max_frames else []
+    if max_seconds:
+        limits.append(max(1, int(max_seconds * fps)))
+    return min(limits) if limits else None
+
+
+def analyze_video_file(
+    video_file_path: str,
+    detector_backend: Optional[str] = None,
+    detection_stride: Optional[int] = None,
+    tracker: Optional[str] = None,
+    detection_width: Optional[int] = None,
+    skin_mask: bool = False,
+    algorithm: str = DEFAULT_ALGORITHM,
+    converge: bool = False,
+    convergence_tolerance: float = CONVERGENCE_TOLERANCE_BPM,
+    max_seconds: Optional[float] = None,
+    max_frames: Optional[int] = None,
+    mode: str = DEFAULT_MODE,
+    max_fps: Optional[float] = None
+) -> dict:
+    """Procesa un video y devuelve BVP, picos, HR, frecuencia respiratoria y HRV
+
+    Con ``converge`` la decodificación se detiene en cuanto la HR se
+    estabiliza; ``max_seconds``/``max_frames`` limitan los frames limpios
+    usados. ``coverage`` indica qué parte del video se analizó y ``timings``
+    el tiempo de pared y CPU por etapa (``StageProfiler``). En modo
+    ``quick`` los parámetros no indicados toman los valores de ``QUICK_PRESET``.
+    """
+    if mode == "quick":
+        detection_width = QUICK_PRESET["detection_width"] if detection_width is None else detection_width
+        detection_stride = detection_stride or QUICK_PRESET["detection_stride"]
+        max_fps = max_fps or QUICK_PRESET["max_fps"]
+        max_seconds = max_seconds or QUICK_PRESET["max_seconds"]
+    state = {"reason": "end"}
+
+    def stop_condition(fps):
+        budget = _frame_budget(fps, max_seconds, max_frames)
+        monitor = ConvergenceMonitor(fps, tolerance_bpm=convergence_tolerance) if converge else None
+        used = 0
+
+        def stop(row):
+            nonlocal used
+            used += 1
+            if monitor is not None and monitor.push(row):
+                state["reason"] = "converged"
+                return True
+            if budget is not None and used >= budget:
+                state["reason"] = "budget"
+                return True
+            return False
+        return stop
+
+    stages = {}
+    profiler = StageProfiler()
+    with profiler.activate(), profiler.stage("total"):
+        # Leer el video en streaming: detección (o seguimiento) y promedio RGB por frame
+        rgb_trace, fps = read_video_rgb_trace_and_FS(
+            video_file_path, detector_backend, detection_stride, tracker, stats=stages,
+            detection_width=detection_width, skin_mask=skin_mask,
+            stop_condition=stop_condition if converge or max_seconds or max_frames else None,
+            max_fps=max_fps
+        )
+        logger.info(f"rPPG stages: {stages}")
+
+        if rgb_trace is None or fps is None:
+            raise RPPGProcessingError(
+                "No se pudieron detectar caras en el video o el video es inválido",
+                "NO_FACE_DETECTED"
+            )
+
+        result = analyze_rgb_trace(rgb_trace, fps, algorithm)
+    result["mode"] = mode
+    result["timings"] = profiler.as_dict()
+    frames_total = stages.get("frames_total") or 0
+    frame_step = stages.get("frame_step", 1)
+    # Frames del video recorridos (los saltados por el submuestreo también cuentan)
+    frames_read = stages.get("frames_decoded", 0) + stages.get("frames_skipped", 0)
+    result["coverage"] = {
+        "stopped": state["reason"],
+        "frames_total": frames_total or None,
+        "frames_decoded": frames_read,
+        "frames_used": len(rgb_trace),
+        "frame_step": frame_step,
+        "seconds_decoded": round(frames_read / (fps * frame_step), 2),
+        "seconds_used": round(len(rgb_trace) / fps, 2),
+        "fraction_decoded": round(min(1.0, frames_read / frames_total), 3) if frames_total else None,
+    }
+    return result
+
+
+def plan_video_segments(
+    fps: float, frame_count: int, max_workers: int, detection_stride: Optional[int] = None
+) -> list:
+    """Tramos ``(warmup_start, start, end)`` para decodificar el video en paralelo
+
+    Lista vacía si no compensa dividirlo (un solo worker, duración
+    desconocida o menor que dos tramos de ``SEGMENT_MIN_SEC``). El solape
+    entre tramos es una ventana CHROM.
+    """
+    if max_workers < 2 or fps <= 0 or frame_count <= 0:
+        return []
+    n_segments = min(max_workers, int(frame_count / (SEGMENT_MIN_SEC * fps)))
+    if n_segments < 2:
+        return []
+    overlap = max(1, int(CHROM_WIN_SEC * fps))
+    return video_segments(frame_count, n_segments, overlap, align=detection_stride or DEFAULT_DETECTION_STRIDE)
+
+
+def read_video_segment(
+    video_file_path: str,
+    segment: tuple,
+    detector_backend: Optional[str] = None,
+    detection_stride: Optional[int] = None,
+    tracker: Optional[str] = None,
+    detection_width: Optional[int] = None,
+    skin_mask: bool = False
+) -> tuple:
+    """Traza RGB (N, 3) de un tramo del video, su FS y las estadísticas por etapa
+
+    Se ejecuta en un worker del ejecutor; un tramo sin caras devuelve una
+    traza vacía y la decisión de error se toma al unir los tramos.
+    """
+    stages = {}
+    profiler = StageProfiler()
+    with profiler.activate(), profiler.stage("total"):
+        means = iter_face_rgb_means(
+            video_file_path, detector_backend, detection_stride, tracker, stages, detection_width, skin_mask,
+            segment=segment
+        )
+        fps = next(means)
+        rgb_trace = np.asarray(list(means), dtype=np.float64).reshape(-1, 3)
+    stages["timings"] = profiler.as_dict()
+    return rgb_trace, fps, stages
+
+
+def analyze_segment_traces(parts: list, algorithm: str = DEFAULT_ALGORITHM) -> dict:
+    """Une las trazas de los tramos en orden y analiza la traza completa
+
+    Los tramos no comparten frames (el solape solo sirve de arranque del
+    seguimiento) y empiezan en un múltiplo del paso de detección, con el que
+    ``FaceLocator`` fija su calendario de detecciones: la traza unida es la de
+    la pasada serie y el BVP se calcula sobre ella de una vez, sin costuras
+    entre ventanas CHROM.
+    Los ``timings`` suman los de todos los tramos: son trabajo, no latencia.
+    """
+    fps = parts[0][1]
+    rgb_trace = np.concatenate([part[0] for part in parts])
+    stages = [part[2] for part in parts]
+    logger.info(f"rPPG segment stages: {stages}")
+    if len(rgb_trace) == 0:
+        raise RPPGProcessingError(
+            "No se pudieron detectar caras en el video o el video es inválido",
+            "NO_FACE_DETECTED"
+        )
+
+    profiler = StageProfiler()
+    for part_stages in stages:
+        profiler.merge(part_stages.get("timings"))
+    with profiler.activate(), profiler.stage("total"):
+        result = analyze_rgb_trace(rgb_trace, fps, algorithm)
+    result["mode"] = "precise"
+    result["timings"] = profiler.as_dict()
+    frames_total = stages[0].get("frames_total") or 0
+    frames_read = sum(s.get("frames_decoded", 0) for s in stages)
+    result["coverage"] = {
+        "stopped": "end",
+        "frames_total": frames_total or None,
+        "frames_decoded": frames_read,
+        "frames_used": len(rgb_trace),
+        "frame_step": 1,
+        "seconds_decoded": round(frames_read / fps, 2),
+        "seconds_used": round(len(rgb_trace) / fps, 2),
+        "fraction_decoded": round(min(1.0, frames_read / frames_total), 3) if frames_total else None,
+        "segments": len(parts),
+    }
+    return result
+
+
+def analyze_rgb_trace(rgb_trace, fps: float, algorithm: str = DEFAULT_ALGORITHM) -> dict:
+    """BVP y signos vitales a partir de la traza RGB (N, 3) ya extraída del video"""
+    # Procesar la traza con el algoritmo rPPG elegido (CHROM por defecto)
+    bvp = extract_bvp(rgb_trace, fps, algorithm)
+
+    if bvp is None:
+        raise RPPGProcessingError(
+            "Error al procesar la señal BVP del video",
+            "BVP_ERROR"
+        )
+
+    # HR (picos y espectral), serie por segundo, respiración y HRV en una sola pasada
+    vitals = vitals_extractor(fps).extract(bvp)
+
+    return {
+        "algorithm": algorithm,
+        "fps": fps,
+        "bvp": bvp,
+        "peaks": vitals.peaks,
+        "hr": float(vitals.hr) if vitals.hr is not None else 0.0,
+        "hr_method": vitals.hr_method,
+        "hr_spectral": vitals.hr_spectral,
+        "hr_confidence": vitals.hr_confidence,
+        "respiratory_rate": float(vitals.respiratory_rate) if vitals.respiratory_rate is not None else 0.0,
+        "hrv": [vitals.sdnn, vitals.rmssd],
+        "quality": vitals.quality,
+        "hr_series": {
+            "t": np.round(vitals.series_t, 2).tolist(),
+            "hr": np.round(vitals.series_hr, 1).tolist(),
+            "quality": np.round(vitals.series_quality, 3).tolist(),
+        },
+    }
@@ -0,0 +1,225 @@
+"""
+Sondeo barato de videos rPPG antes del análisis completo
+
+Lee los metadatos del contenedor (fps, número de frames, duración y
+resolución) y decodifica unos pocos frames repartidos por el video para
+comprobar exposición y presencia de cara. Un video corrupto, demasiado
+corto, oscuro o sin cara se rechaza en milisegundos con un código de error
+específico, en lugar de descubrirlo tras decodificar y detectar todos los
+frames en el pool de procesos.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from .error_handlers import VideoRejectedError
+from .face_detection import DEFAULT_DETECTION_WIDTH, FaceLocator, get_face_detector
+from .rppg_core import CV2_AVAILABLE
+from .rppg_scheduler import wait_percentiles
+
+if CV2_AVAILABLE:
+    import cv2
+
+logger = logging.getLogger("signaapi.rppg_probe")
+
+PROBE_ENABLED = os.getenv("RPPG_PROBE", "1") != "0"
+PROBE_THREADS = int(os.getenv("RPPG_PROBE_THREADS", "2"))
+PROBE_SAMPLE_FRAMES = 5
+PROBE_MIN_DURATION_SEC = float(os.getenv("RPPG_MIN_VIDEO_SEC", "5"))
+PROBE_MIN_FPS = 8.0
+PROBE_MIN_SIDE = 64
+# Luma media (0-255) de los frames muestreados fuera de la cual se rechaza
+PROBE_DARK_LUMA = 25.0
+PROBE_BRIGHT_LUMA = 235.0
+
+
+def _reject(message: str, error_code: str, details: Dict[str, Any]) -> VideoRejectedError:
+    return VideoRejectedError(message, error_code, details)
+
+
+def _sample_frames(cap, video_path: str, frame_count: int, fps: float, n: int):
+    """Genera hasta ``n`` frames repartidos por el video
+
+    Con número de frames conocido se salta directamente a cada posición; si
+    no, o si un salto no devuelve frame (contenedor sin índice, cabecera con
+    más frames de los que hay), se reabre el video y se toma un frame por
+    segundo desde el principio, a continuación de los ya muestreados.
+    """
+    taken = 0
+    start = 0
+    if frame_count > 0:
+        # Evitar el primer y el último frame (fundidos, frames negros de cabecera)
+        for position in np.linspace(0, frame_count - 1, n + 2)[1:-1].astype(int):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, int(position))
+            ok, frame = cap.read()
+            if not ok or frame is None:
+                break
+            taken += 1
+            start = int(position) + 1
+            yield frame
+        else:
+            return
+        cap.open(video_path)
+    step = max(1, int(round(fps)))
+    index = 0
+    while taken < n:
+        ok = cap.grab()
+        if not ok:
+            return
+        if index >= start and (index - start) % step == 0:
+            ok, frame = cap.retrieve()
+            if ok and frame is not None:
+                taken += 1
+                yield frame
+        index += 1
+
+
+def probe_video(video_path: str, detector_backend: Optional[str] = None,
+                sample_frames: int = PROBE_SAMPLE_FRAMES) -> Dict[str, Any]:
+    """Metadatos y muestras del video; lanza ``VideoRejectedError`` si no es utilizable"""
+    if not CV2_AVAILABLE:
+        raise ImportError("OpenCV is not available. Cannot probe video.")
+
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if not cap.isOpened():
+            raise _reject("No se pudo abrir el video", "VIDEO_UNREADABLE", {})
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        frame_count = max(0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        info = {
+            "fps": fps,
+            "frame_count": frame_count or None,
+            "duration": frame_count / fps if frame_count and fps > 0 else None,
+            "width": width,
+            "height": height,
+        }
+
+        if 0 < fps < PROBE_MIN_FPS:
+            raise _reject(f"FPS demasiado bajo (mínimo {PROBE_MIN_FPS:g})", "VIDEO_LOW_FPS", info)
+        if info["duration"] is not None and info["duration"] < PROBE_MIN_DURATION_SEC:
+            raise _reject(
+                f"El video es demasiado corto (mínimo {PROBE_MIN_DURATION_SEC:g} s)", "VIDEO_TOO_SHORT", info
+            )
+        if width and height and min(width, height) < PROBE_MIN_SIDE:
+            raise _reject(
+                f"Resolución demasiado baja (mínimo {PROBE_MIN_SIDE} px)", "VIDEO_LOW_RESOLUTION", info
+            )
+
+        locator = FaceLocator(
+            get_face_detector(detector_backend), detection_stride=1, tracker=None,
+            detection_width=DEFAULT_DETECTION_WIDTH
+        )
+        lumas = []
+        faces = 0
+        sampling_start = time.perf_counter()
+        for frame in _sample_frames(cap, video_path, frame_count, fps if fps > 0 else 30, sample_frames):
+            lumas.append(cv2.mean(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))[0])
+            if locator.locate(frame) is not None:
+                faces += 1
+        sampling_time = time.perf_counter() - sampling_start
+    finally:
+        cap.release()
+
+    info["frames_sampled"] = len(lumas)
+    info["sampling_time"] = sampling_time
+    info["frames_with_face"] = faces
+    if not lumas:
+        raise _reject("No se pudo decodificar ningún frame del video", "VIDEO_UNREADABLE", info)
+    info["brightness"] = float(np.median(lumas))
+    if info["brightness"] < PROBE_DARK_LUMA:
+        raise _reject("El video está demasiado oscuro", "VIDEO_TOO_DARK", info)
+    if info["brightness"] > PROBE_BRIGHT_LUMA:
+        raise _reject("El video está sobreexpuesto", "VIDEO_OVEREXPOSED", info)
+    if faces == 0:
+        raise _reject("No se detectó ninguna cara en los frames muestreados", "VIDEO_NO_FACE", info)
+    return info
+
+
+class VideoProber:
+    """Sondeo en un pool de hilos propio (cada hilo con su detector) y métricas de rechazos
+
+    El tiempo de CPU ahorrado por un rechazo se estima como el coste medio
+    por frame muestreado (decodificar y detectar) multiplicado por los frames
+    del video, menos lo que costó el sondeo. Los rechazos por metadatos no
+    muestrean frames y no suman ahorro.
+    """
+
+    def __init__(self, threads: int = PROBE_THREADS, enabled: bool = PROBE_ENABLED):
+        self.enabled = enabled
+        self._executor = ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix="rppg-probe")
+        self._lock = threading.Lock()
+        self.probes = 0
+        self.accepted = 0
+        self.rejected: Dict[str, int] = {}
+        self.saved_cpu_seconds = 0.0
+        self.probe_times = deque(maxlen=1000)
+
+    def _probe(self, video_path: str) -> Dict[str, Any]:
+        start = time.perf_counter()
+        try:
+            info = probe_video(video_path)
+        except VideoRejectedError as e:
+            elapsed = time.perf_counter() - start
+            sampled = e.details.get("frames_sampled") or 0
+            frames = e.details.get("frame_count") or 0
+            # Coste por frame (decodificación + detección) sin contar la carga del detector
+            per_frame = e.details.get("sampling_time", 0.0) / sampled if sampled else 0.0
+            saved = max(0.0, per_frame * frames - elapsed)
+            with self._lock:
+                self.probes += 1
+                self.rejected[e.error_code] = self.rejected.get(e.error_code, 0) + 1
+                self.saved_cpu_seconds += saved
+                self.probe_times.append(elapsed)
+            raise
+        with self._lock:
+            self.probes += 1
+            self.accepted += 1
+            self.probe_times.append(time.perf_counter() - start)
+        return info
+
+    async def probe(self, video_path: str) -> Optional[Dict[str, Any]]:
+        """Sondea el video fuera del event loop; None si el sondeo está desactivado"""
+        if not self.enabled:
+            return None
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._executor, self._probe, video_path)
+        except ImportError as e:
+            # Sin OpenCV o sin detector no se puede sondear: el análisis decidirá
+            logger.warning(f"Video probe skipped: {e}")
+            return None
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "probes": self.probes,
+                "accepted": self.accepted,
+                "rejected": sum(self.rejected.values()),
+                "rejected_by_reason": dict(self.rejected),
+                "saved_cpu_seconds_estimate": round(self.saved_cpu_seconds, 3),
+                "probe_time": wait_percentiles(self.probe_times),
+                "timestamp": datetime.now().isoformat()
+            }
+
+
+# Instancia global del sondeo
+video_prober = None
+
+def get_video_prober() -> VideoProber:
+    """Obtener (creando si hace falta) el sondeo de videos rPPG"""
+    global video_prober
+    if video_prober is None:
+        video_prober = VideoProber()
+    return video_prober
@@ -0,0 +1,195 @@
+"""
+Perfilado por etapas del análisis rPPG
+
+``StageProfiler`` acumula tiempo de pared y de CPU (del hilo) por etapa
+(decodificación, detección, ROI, filtrado, picos...) y contadores de frames
+(decodificados, detectados, descartados por desenfoque o por atípicos). El
+perfilador activo se guarda en una ``ContextVar``: ``rppg_core``, ``vitails``
+y ``rppg_algorithms`` registran sus etapas sin cambiar sus firmas y, sin
+perfilador activo, la instrumentación no hace nada. El resultado viaja en
+``timings``, en la cabecera ``Server-Timing`` y en los histogramas de
+``/metrics``.
+"""
+
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional
+
+_active_profiler = contextvars.ContextVar("rppg_profiler", default=None)
+
+# Límites superiores (ms) de los cubos de los histogramas de /metrics
+PROFILE_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 30000, 60000)
+
+
+class StageProfiler:
+    """Tiempos de pared y CPU por etapa y contadores de frames de un análisis"""
+
+    def __init__(self):
+        self.stages: Dict[str, list] = {}
+        self.frames: Dict[str, int] = {}
+
+    def add(self, name: str, wall: float, cpu: float, calls: int = 1):
+        stage = self.stages.get(name)
+        if stage is None:
+            self.stages[name] = [wall, cpu, calls]
+        else:
+            stage[0] += wall
+            stage[1] += cpu
+            stage[2] += calls
+
+    def count(self, name: str, n: int = 1):
+        self.frames[name] = self.frames.get(name, 0) + int(n)
+
+    @contextmanager
+    def stage(self, name: str):
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - wall, time.thread_time() - cpu)
+
+    @contextmanager
+    def activate(self):
+        """Hace de este el perfilador activo del contexto actual"""
+        token = _active_profiler.set(self)
+        try:
+            yield self
+        finally:
+            _active_profiler.reset(token)
+
+    def merge(self, timings: Optional[Dict[str, Any]]):
+        """Suma el ``as_dict()`` de otro perfilador (p. ej. de un tramo en otro proceso)"""
+        if not timings:
+            return
+        for name, stage in timings.get("stages", {}).items():
+            self.add(name, stage["wall_ms"] / 1000, stage["cpu_ms"] / 1000, stage["calls"])
+        for name, n in timings.get("frames", {}).items():
+            self.count(name, n)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "stages": {
+                name: {"wall_ms": round(wall * 1000, 3), "cpu_ms": round(cpu * 1000, 3), "calls": calls}
+                for name, (wall, cpu, calls) in self.stages.items()
+            },
+            "frames": dict(self.frames),
+        }
+
+
+def active_profiler() -> Optional[StageProfiler]:
+    """Perfilador activo en este contexto, o None"""
+    return _active_profiler.get()
+
+
+@contextmanager
+def profile_stage(name: str):
+    """Mide el bloque como la etapa ``name`` si hay un perfilador activo"""
+    profiler = _active_profiler.get()
+    if profiler is None:
+        yield
+        return
+    with profiler.stage(name):
+        yield
+
+
+def profiled(name: str):
+    """Decorador: cada llamada a la función cuenta como la etapa ``name``"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            profiler = _active_profiler.get()
+            if profiler is None:
+                return fn(*args, **kwargs)
+            with profiler.stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count_frames(name: str, n: int = 1):
+    """Suma ``n`` al contador de frames ``name`` del perfilador activo"""
+    profiler = _active_profiler.get()
+    if profiler is not None:
+        profiler.count(name, n)
+
+
+def server_timing_header(timings: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Cabecera ``Server-Timing`` (pared en ``dur``, CPU en ``desc``) de un ``as_dict()``"""
+    if not timings or not timings.get("stages"):
+        return None
+    return ", ".join(
+        f'{name};dur={stage["wall_ms"]:.1f};desc="cpu {stage["cpu_ms"]:.1f}ms"'
+        for name, stage in timings["stages"].items()
+    )
+
+
+class RPPGProfileMetrics:
+    """Histogramas por etapa (pared y CPU) y totales de frames de los análisis recientes"""
+
+    def __init__(self, buckets_ms: Iterable[float] = PROFILE_BUCKETS_MS):
+        self.buckets_ms = tuple(buckets_ms)
+        self._lock = threading.Lock()
+        self.analyses = 0
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self.frames: Dict[str, int] = {}
+
+    def _histogram(self):
+        return {"counts": [0] * (len(self.buckets_ms) + 1), "sum_ms": 0.0}
+
+    def _observe(self, histogram, value_ms: float):
+        index = len(self.buckets_ms)
+        for i, bound in enumerate(self.buckets_ms):
+            if value_ms <= bound:
+                index = i
+                break
+        histogram["counts"][index] += 1
+        histogram["sum_ms"] += value_ms
+
+    def record(self, timings: Optional[Dict[str, Any]]):
+        if not timings:
+            return
+        with self._lock:
+            self.analyses += 1
+            for name, stage in timings.get("stages", {}).items():
+                entry = self.stages.get(name)
+                if entry is None:
+                    entry = self.stages[name] = {"wall": self._histogram(), "cpu": self._histogram()}
+                self._observe(entry["wall"], stage["wall_ms"])
+                self._observe(entry["cpu"], stage["cpu_ms"])
+            for name, n in timings.get("frames", {}).items():
+                self.frames[name] = self.frames.get(name, 0) + n
+
+    def get_metrics(self) -> Dict[str, Any]:
+        labels = [f"le_{bound:g}ms" for bound in self.buckets_ms] + ["inf"]
+        with self._lock:
+            return {
+                "analyses": self.analyses,
+                "stages": {
+                    name: {
+                        kind: {
+                            "buckets": dict(zip(labels, histogram["counts"])),
+                            "count": sum(histogram["counts"]),
+                            "sum_ms": round(histogram["sum_ms"], 3),
+                        }
+                        for kind, histogram in entry.items()
+                    }
+                    for name, entry in self.stages.items()
+                },
+                "frames": dict(self.frames),
+                "timestamp": datetime.now().isoformat()
+            }
+
+
+# Instancia global de los histogramas de perfilado
+rppg_profile_metrics = None
+
+def get_rppg_profile_metrics() -> RPPGProfileMetrics:
+    """Obtener (creando si hace falta) los histogramas de perfilado rPPG"""
+    global rppg_profile_metrics
+    if rppg_profile_metrics is None:
+        rppg_profile_metrics = RPPGProfileMetrics()
+    return rppg_profile_metrics
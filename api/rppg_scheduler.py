@@ -0,0 +1,130 @@
+"""
+Planificación por prioridad de triaje y reparto justo entre tenants para rPPG
+
+Cada flujo (tenant, clase de triaje) recibe etiquetas de tiempo virtual al
+estilo de weighted fair queuing (start-time fair queuing): se atiende primero
+la tarea con menor tiempo de finalización virtual. El peso de la clase
+(Rojo > Amarillo > Verde) reparte la CPU y un tenant con mucho backlog solo
+adelanta sus propias tareas, sin dejar sin servicio al resto.
+"""
+
+import asyncio
+import heapq
+import itertools
+import unicodedata
+from collections import deque
+from typing import Any, Dict, Optional, Tuple
+
+TRIAGE_WEIGHTS = {"rojo": 8.0, "amarillo": 3.0, "verde": 1.0}
+DEFAULT_TRIAGE = "verde"
+DEFAULT_TENANT = "default"
+
+
+def normalize_triage(value: Optional[str]) -> Optional[str]:
+    """Clase de triaje normalizada ("Rojo" -> "rojo"), o None si no es válida"""
+    if not value:
+        return None
+    text = unicodedata.normalize("NFKD", str(value)).encode("ascii", "ignore").decode().strip().lower()
+    return text if text in TRIAGE_WEIGHTS else None
+
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return 0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def wait_percentiles(values) -> Dict[str, Any]:
+    """Resumen p50/p95/p99 de tiempos de espera"""
+    values = list(values)
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+    }
+
+
+class FairShareClock:
+    """Reloj virtual de WFQ: asigna etiquetas (inicio, fin) por flujo (tenant, triaje)"""
+
+    def __init__(self, virtual_time: float = 0.0, last_finish: Optional[Dict[Tuple[str, str], float]] = None):
+        self.virtual_time = virtual_time
+        self.last_finish = dict(last_finish or {})
+
+    def tag(self, tenant: str, triage: str, cost: float = 1.0) -> Tuple[float, float]:
+        flow = (tenant, triage)
+        start = max(self.virtual_time, self.last_finish.get(flow, 0.0))
+        finish = start + cost / TRIAGE_WEIGHTS[triage]
+        self.last_finish[flow] = finish
+        return start, finish
+
+    def advance(self, start: float):
+        """El tiempo virtual avanza al inicio de la tarea que empieza a ejecutarse"""
+        if start > self.virtual_time:
+            self.virtual_time = start
+            # Los flujos ya atendidos no necesitan recordarse
+            self.last_finish = {f: t for f, t in self.last_finish.items() if t > start}
+
+
+class FairShareGate:
+    """Admisión a ``slots`` ejecuciones concurrentes en orden de WFQ"""
+
+    def __init__(self, slots: int):
+        self.slots = slots
+        self.active = 0
+        self.clock = FairShareClock()
+        self._waiting = []
+        self._seq = itertools.count()
+        self.wait_times = {triage: deque(maxlen=1000) for triage in TRIAGE_WEIGHTS}
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiting)
+
+    def waiting_by_triage(self) -> Dict[str, int]:
+        counts = dict.fromkeys(TRIAGE_WEIGHTS, 0)
+        for entry in self._waiting:
+            counts[entry[3]] += 1
+        return counts
+
+    async def acquire(self, tenant: str, triage: str):
+        start, finish = self.clock.tag(tenant, triage)
+        if self.active < self.slots and not self._waiting:
+            self.active += 1
+            self.clock.advance(start)
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (finish, next(self._seq), start, triage, future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # El turno ya se había concedido: cederlo al siguiente
+                self.release()
+            else:
+                self._waiting = [entry for entry in self._waiting if entry[4] is not future]
+                heapq.heapify(self._waiting)
+            raise
+
+    def release(self):
+        while self._waiting:
+            _, _, start, _, future = heapq.heappop(self._waiting)
+            if future.cancelled():
+                continue
+            self.clock.advance(start)
+            future.set_result(None)
+            return
+        self.active -= 1
+
+    def record_wait(self, triage: str, wait_time: float):
+        self.wait_times[triage].append(wait_time)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        waiting = self.waiting_by_triage()
+        return {
+            triage: {"waiting": waiting[triage], **wait_percentiles(self.wait_times[triage])}
+            for triage in TRIAGE_WEIGHTS
+        }
@@ -0,0 +1,306 @@
+"""
+rPPG en tiempo real sobre WebSocket
+
+El cliente envía frames (JPEG o BGR crudo) y el servidor mantiene, por
+conexión, un buffer circular de medias RGB de la cara con CHROM incremental
+(``IncrementalChrom``): cada frame cuesta una detección/seguimiento y, cada
+medio segundo y pico, una sola ventana CHROM. Aproximadamente una vez por
+segundo de video se envía la estimación de FC, FR y calidad, calculada con
+el mismo ``VitalsExtractor`` (y los mismos criterios) que ``/rppg``. La memoria por
+conexión es fija (``STREAM_BUFFER_SEC``) sea cual sea la duración.
+
+El trabajo por frame corre en un pequeño conjunto de hilos compartido
+(``StreamThreadPool``); cada sesión se fija a uno de ellos, así que todas
+las sesiones de un hilo reutilizan su detector facial ya cargado.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from .error_handlers import ValidationError
+from .rppg_core import CV2_AVAILABLE, FaceRgbSampler, IncrementalChrom
+from .rppg_scheduler import wait_percentiles
+from .vitails import VITALS_QUALITY_UNAVAILABLE, vitals_extractor
+
+if CV2_AVAILABLE:
+    import cv2
+
+STREAM_FRAME_FORMATS = ("jpeg", "raw")
+STREAM_BUFFER_SEC = 30.0
+STREAM_UPDATE_SEC = 1.0
+STREAM_HR_WINDOW_SEC = 10.0
+STREAM_RR_MIN_SEC = 15.0
+STREAM_MAX_FPS = 120
+STREAM_MAX_FRAME_BYTES = int(float(os.getenv("RPPG_STREAM_MAX_FRAME_MB", "8")) * 1024 * 1024)
+STREAM_MAX_SESSIONS = int(os.getenv("RPPG_STREAM_MAX_SESSIONS", "16"))
+STREAM_THREADS = int(os.getenv("RPPG_STREAM_THREADS", "0")) or min(4, os.cpu_count() or 1)
+
+
+def _config_error(message: str, details: Optional[Dict[str, Any]] = None) -> ValidationError:
+    return ValidationError(message, "INVALID_STREAM_CONFIG", details or {})
+
+
+def _noop():
+    return None
+
+
+class StreamThreadPool:
+    """Hilos de un solo worker compartidos por las sesiones en vivo
+
+    El detector de caras se crea una vez por hilo; cada sesión se asigna al
+    hilo con menos sesiones y se queda en él, de modo que su seguimiento y el
+    detector del hilo nunca se usan desde dos hilos a la vez.
+    """
+
+    def __init__(self, threads: int = STREAM_THREADS, warmup: Optional[Callable] = None):
+        self.threads = max(1, threads)
+        self._warmup = warmup or _noop
+        self._executors = [
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"rppg-stream-{i}") for i in range(self.threads)
+        ]
+        self._sessions: List[int] = [0] * self.threads
+        self._lock = threading.Lock()
+
+    def prestart(self):
+        """Carga el detector en todos los hilos sin esperar a la primera conexión"""
+        for executor in self._executors:
+            executor.submit(self._warmup)
+
+    def acquire(self) -> int:
+        """Asigna a una sesión el hilo menos cargado; devuelve su índice"""
+        with self._lock:
+            index = min(range(self.threads), key=self._sessions.__getitem__)
+            self._sessions[index] += 1
+            return index
+
+    def release(self, index: int):
+        with self._lock:
+            self._sessions[index] -= 1
+
+    def executor(self, index: int) -> ThreadPoolExecutor:
+        return self._executors[index]
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"threads": self.threads, "sessions_per_thread": list(self._sessions)}
+
+    def shutdown(self, wait: bool = True):
+        for executor in self._executors:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+class RPPGStreamSession:
+    """Estado de una conexión: decodificación, cara, CHROM incremental y estimaciones
+
+    El trabajo por frame se ejecuta siempre en el mismo hilo de
+    ``StreamThreadPool``: el muestreador se crea allí con el detector de ese
+    hilo y el seguimiento es secuencial.
+    """
+
+    def __init__(
+        self,
+        fps: float,
+        frame_format: str = "jpeg",
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+        detection_stride: Optional[int] = None,
+        tracker: Optional[str] = None,
+        detection_width: Optional[int] = None,
+        skin_mask: bool = False,
+        buffer_seconds: float = STREAM_BUFFER_SEC,
+        pool: Optional[StreamThreadPool] = None
+    ):
+        try:
+            fps = float(fps)
+        except (TypeError, ValueError):
+            raise _config_error("fps debe ser numérico", {"fps": fps})
+        if not 0 < fps <= STREAM_MAX_FPS:
+            raise _config_error(f"fps fuera de rango (0, {STREAM_MAX_FPS}]", {"fps": fps})
+        if frame_format not in STREAM_FRAME_FORMATS:
+            raise _config_error(
+                f"Formato de frame no soportado. Opciones: {', '.join(STREAM_FRAME_FORMATS)}",
+                {"format": frame_format}
+            )
+        if frame_format == "raw":
+            if not isinstance(width, int) or not isinstance(height, int) or width <= 0 or height <= 0:
+                raise _config_error("Los frames raw requieren width y height enteros", {"width": width, "height": height})
+            if width * height * 3 > STREAM_MAX_FRAME_BYTES:
+                raise _config_error("Frame raw demasiado grande", {"max_frame_bytes": STREAM_MAX_FRAME_BYTES})
+        try:
+            self.chrom = IncrementalChrom(fps, buffer_seconds=buffer_seconds)
+        except ValueError as e:
+            raise _config_error(str(e), {"fps": fps})
+
+        self.fps = fps
+        self.vitals = vitals_extractor(fps)
+        self.frame_format = frame_format
+        self.width = width
+        self.height = height
+        self._sampler_args = (None, detection_stride, tracker, detection_width, skin_mask)
+        self._sampler = None
+        self._pool = pool or get_stream_thread_pool()
+        self._thread = self._pool.acquire()
+        self._executor = self._pool.executor(self._thread)
+        self.frames = 0
+        self.frames_with_face = 0
+        self.frames_invalid = 0
+        self._interval_frames = 0
+        self._interval_faces = 0
+        self.processing_times = deque(maxlen=1000)
+
+    def _decode(self, payload: bytes):
+        if self.frame_format == "jpeg":
+            # IMREAD_COLOR devuelve siempre BGR de 3 canales; None si los bytes no son una imagen
+            return cv2.imdecode(np.frombuffer(payload, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if len(payload) != self.width * self.height * 3:
+            return None
+        # Vista sin copia sobre el mensaje recibido
+        return np.frombuffer(payload, dtype=np.uint8).reshape(self.height, self.width, 3)
+
+    def _process(self, payload: bytes) -> bool:
+        if self._sampler is None:
+            self._sampler = FaceRgbSampler(*self._sampler_args)
+        start = time.perf_counter()
+        frame = self._decode(payload)
+        if frame is None:
+            self.frames_invalid += 1
+            return False
+        rgb = self._sampler.sample(frame)
+        if rgb is not None:
+            self.chrom.push(rgb)
+        self.processing_times.append(time.perf_counter() - start)
+        return rgb is not None
+
+    async def process_frame(self, payload: bytes) -> Optional[Dict[str, Any]]:
+        """Procesa un frame; devuelve una estimación cada ``STREAM_UPDATE_SEC`` de video"""
+        loop = asyncio.get_running_loop()
+        has_face = await loop.run_in_executor(self._executor, self._process, payload)
+        self.frames += 1
+        self._interval_frames += 1
+        if has_face:
+            self.frames_with_face += 1
+            self._interval_faces += 1
+        if self._interval_frames < self.fps * STREAM_UPDATE_SEC:
+            return None
+        return await loop.run_in_executor(self._executor, self.estimate)
+
+    def estimate(self) -> Dict[str, Any]:
+        """FC (últimos ``STREAM_HR_WINDOW_SEC``), FR y calidad del último intervalo"""
+        face_ratio = self._interval_faces / self._interval_frames if self._interval_frames else 0.0
+        self._interval_frames = self._interval_faces = 0
+        bvp = self.chrom.bvp()
+        hr = self.vitals.extract(bvp[-int(STREAM_HR_WINDOW_SEC * self.fps):], series=False, respiration=False)
+        respiratory_rate, respiratory_quality = None, VITALS_QUALITY_UNAVAILABLE
+        if len(bvp) >= STREAM_RR_MIN_SEC * self.fps:
+            respiratory_rate, respiratory_quality = self.vitals.respiratory_rate(bvp)
+        return {
+            "type": "estimate",
+            "frames": self.frames,
+            "t": round(self.frames / self.fps, 2),
+            "hr": round(hr.hr, 1) if hr.hr is not None else None,
+            "hr_method": hr.hr_method,
+            "hr_confidence": round(hr.hr_confidence, 3),
+            "respiratory_rate": round(respiratory_rate, 1) if respiratory_rate is not None else None,
+            "quality": {"hr": hr.quality["hr"], "respiratory_rate": respiratory_quality},
+            "face_ratio": round(face_ratio, 3),
+            "signal_seconds": round(len(bvp) / self.fps, 2),
+            "timestamp": datetime.now().isoformat()
+        }
+
+    def close(self):
+        # El muestreador (y su seguimiento) se libera con la sesión; el detector sigue en el hilo
+        self._pool.release(self._thread)
+
+
+class RPPGStreamRegistry:
+    """Límite de conexiones simultáneas y métricas agregadas de las sesiones en vivo"""
+
+    def __init__(self, max_sessions: int = STREAM_MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self.active = 0
+        self.sessions_total = 0
+        self.sessions_rejected = 0
+        self.frames = 0
+        self.frames_with_face = 0
+        self.frames_invalid = 0
+        self.estimates_sent = 0
+        self.processing_times = deque(maxlen=1000)
+
+    def try_open(self) -> bool:
+        with self._lock:
+            if self.active >= self.max_sessions:
+                self.sessions_rejected += 1
+                return False
+            self.active += 1
+            self.sessions_total += 1
+            return True
+
+    def close(self, session: Optional[RPPGStreamSession]):
+        with self._lock:
+            self.active -= 1
+            if session is not None:
+                self.frames += session.frames
+                self.frames_with_face += session.frames_with_face
+                self.frames_invalid += session.frames_invalid
+                self.processing_times.extend(session.processing_times)
+        if session is not None:
+            session.close()
+
+    def record_estimate(self):
+        with self._lock:
+            self.estimates_sent += 1
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "active_sessions": self.active,
+                "max_sessions": self.max_sessions,
+                "sessions_total": self.sessions_total,
+                "sessions_rejected": self.sessions_rejected,
+                "frames": self.frames,
+                "frames_with_face": self.frames_with_face,
+                "frames_invalid": self.frames_invalid,
+                "estimates_sent": self.estimates_sent,
+                "frame_processing_time": wait_percentiles(self.processing_times),
+                "thread_pool": stream_thread_pool.get_metrics() if stream_thread_pool else {},
+                "timestamp": datetime.now().isoformat()
+            }
+
+
+# Instancia global de los hilos de las sesiones en vivo
+stream_thread_pool = None
+
+def get_stream_thread_pool() -> StreamThreadPool:
+    """Obtener (creando si hace falta) los hilos compartidos de las sesiones en vivo"""
+    global stream_thread_pool
+    if stream_thread_pool is None:
+        from .face_detection import preload_face_detector
+        stream_thread_pool = StreamThreadPool(warmup=preload_face_detector)
+    return stream_thread_pool
+
+def shutdown_stream_thread_pool():
+    """Detener los hilos de las sesiones en vivo si fueron creados"""
+    global stream_thread_pool
+    if stream_thread_pool is not None:
+        stream_thread_pool.shutdown(wait=False)
+        stream_thread_pool = None
+
+
+# Instancia global del registro de sesiones
+rppg_stream_registry = None
+
+def get_rppg_stream_registry() -> RPPGStreamRegistry:
+    """Obtener (creando si hace falta) el registro de sesiones rPPG en vivo"""
+    global rppg_stream_registry
+    if rppg_stream_registry is None:
+        rppg_stream_registry = RPPGStreamRegistry()
+    return rppg_stream_registry
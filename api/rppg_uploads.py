@@ -0,0 +1,252 @@
+"""
+Subida de videos rPPG en streaming y por partes (reanudable)
+
+Los videos se copian a disco en bloques de tamaño fijo, comprobando el límite
+de tamaño a medida que llegan, de modo que la memoria por subida es constante.
+Las sesiones de subida permiten enviar un clip grande en varias peticiones
+``PUT`` y retomarlo desde el último byte recibido tras un corte de red.
+"""
+
+import asyncio
+import io
+import json
+import os
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict
+
+from fastapi import UploadFile
+
+from .error_handlers import ValidationError, ResourceNotFoundError, validate_file_upload
+
+RPPG_ALLOWED_EXTENSIONS = ['mp4', 'avi', 'mov', 'mkv', 'webm']
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_MB = int(os.getenv("RPPG_MAX_UPLOAD_MB", "200"))
+UPLOAD_SESSION_TTL_SEC = float(os.getenv("RPPG_UPLOAD_TTL_HOURS", "24")) * 3600
+
+
+def _too_large(filename: str, max_bytes: int) -> ValidationError:
+    return ValidationError(
+        f"El archivo es demasiado grande. Tamaño máximo: {max_bytes // (1024 * 1024)}MB",
+        "FILE_TOO_LARGE",
+        {"filename": filename, "max_size": max_bytes}
+    )
+
+
+def validate_rppg_upload(file: UploadFile) -> str:
+    """Valida nombre, extensión y tamaño declarado; devuelve la extensión con punto"""
+    validate_file_upload(file, RPPG_ALLOWED_EXTENSIONS, MAX_UPLOAD_MB)
+    return os.path.splitext(file.filename)[1].lower()
+
+
+async def _write_chunks(
+    chunks: AsyncIterator[bytes], out, filename: str, max_bytes: int, written: int = 0, digest=None
+) -> int:
+    """Escribe los bloques en ``out`` y devuelve el total escrito, cortando si se supera ``max_bytes``"""
+    async for chunk in chunks:
+        if not chunk:
+            continue
+        written += len(chunk)
+        if written > max_bytes:
+            raise _too_large(filename, max_bytes)
+        out.write(chunk)
+        if digest is not None:
+            digest.update(chunk)
+    return written
+
+
+async def _upload_chunks(upload: UploadFile) -> AsyncIterator[bytes]:
+    while True:
+        chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+async def save_upload_file(upload: UploadFile, out, max_mb: int = MAX_UPLOAD_MB, digest=None) -> int:
+    """Copia el archivo subido al archivo binario ``out`` por bloques; devuelve los bytes escritos
+
+    Si se pasa ``digest`` (p. ej. ``hashlib.sha256()``), se actualiza con cada bloque.
+    """
+    max_bytes = max_mb * 1024 * 1024
+    written = await _write_chunks(_upload_chunks(upload), out, upload.filename, max_bytes, digest=digest)
+    out.flush()
+    if written == 0:
+        raise ValidationError("El archivo está vacío", "EMPTY_FILE", {"filename": upload.filename})
+    return written
+
+
+async def read_upload_bytes(source, filename: str, max_mb: int = MAX_UPLOAD_MB) -> bytes:
+    """Lee en memoria un archivo subido o un cuerpo (iterador asíncrono de bloques) con límite de tamaño"""
+    chunks = _upload_chunks(source) if hasattr(source, "read") else source
+    buffer = io.BytesIO()
+    written = await _write_chunks(chunks, buffer, filename, max_mb * 1024 * 1024)
+    if written == 0:
+        raise ValidationError("El archivo está vacío", "EMPTY_FILE", {"filename": filename})
+    return buffer.getvalue()
+
+
+class UploadSessionStore:
+    """Sesiones de subida por partes guardadas en disco (datos + metadatos JSON)"""
+
+    def __init__(self, upload_dir: str, max_mb: int = MAX_UPLOAD_MB, ttl_sec: float = UPLOAD_SESSION_TTL_SEC):
+        self.upload_dir = upload_dir
+        self.max_bytes = max_mb * 1024 * 1024
+        self.ttl_sec = ttl_sec
+        os.makedirs(upload_dir, exist_ok=True)
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.sessions_created = 0
+        self.sessions_completed = 0
+        self.bytes_received = 0
+
+    def _meta_path(self, upload_id: str) -> str:
+        return os.path.join(self.upload_dir, f"{upload_id}.json")
+
+    def data_path(self, upload_id: str) -> str:
+        return os.path.join(self.upload_dir, f"{upload_id}.part")
+
+    def _save(self, session: Dict[str, Any]):
+        tmp_path = self._meta_path(session["upload_id"]) + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(session, f)
+        os.replace(tmp_path, self._meta_path(session["upload_id"]))
+
+    def create(self, filename: str, size: int) -> Dict[str, Any]:
+        """Abre una sesión para un archivo de ``size`` bytes"""
+        extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+        if extension not in RPPG_ALLOWED_EXTENSIONS:
+            raise ValidationError(
+                f"Tipo de archivo no soportado. Formatos permitidos: {', '.join(RPPG_ALLOWED_EXTENSIONS)}",
+                "INVALID_FILE_TYPE",
+                {"filename": filename, "extension": extension}
+            )
+        if size <= 0:
+            raise ValidationError("El archivo está vacío", "EMPTY_FILE", {"filename": filename})
+        if size > self.max_bytes:
+            raise _too_large(filename, self.max_bytes)
+
+        self.purge_expired()
+        upload_id = uuid.uuid4().hex
+        open(self.data_path(upload_id), "wb").close()
+        session = {
+            "upload_id": upload_id,
+            "filename": filename,
+            "size": size,
+            "offset": 0,
+            "created_at": time.time(),
+            "updated_at": time.time(),
+        }
+        self._save(session)
+        self.sessions_created += 1
+        return session
+
+    def get(self, upload_id: str) -> Dict[str, Any]:
+        try:
+            if not upload_id.isalnum():
+                raise ValueError(upload_id)
+            with open(self._meta_path(upload_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            raise ResourceNotFoundError("Sesión de subida no encontrada", "UPLOAD_NOT_FOUND", {"upload_id": upload_id})
+
+    async def append(self, upload_id: str, offset: int, chunks: AsyncIterator[bytes]) -> Dict[str, Any]:
+        """Añade los bytes recibidos a partir de ``offset`` (debe coincidir con lo ya recibido)"""
+        # Validar antes de crear el lock: los ids inexistentes no dejan entradas en _locks
+        self.get(upload_id)
+        lock = self._locks.setdefault(upload_id, asyncio.Lock())
+        async with lock:
+            try:
+                session = self.get(upload_id)
+            except ResourceNotFoundError:
+                # La sesión se descartó mientras se esperaba el lock
+                self._locks.pop(upload_id, None)
+                raise
+            if offset != session["offset"]:
+                raise ValidationError(
+                    "El offset no coincide con los bytes recibidos",
+                    "UPLOAD_OFFSET_MISMATCH",
+                    {"upload_id": upload_id, "offset": session["offset"]}
+                )
+            with open(self.data_path(upload_id), "r+b") as out:
+                out.seek(offset)
+                try:
+                    written = await _write_chunks(chunks, out, session["filename"], session["size"], offset)
+                except ValidationError:
+                    # Bloque rechazado: descartarlo entero, el cliente reintenta desde el offset previo
+                    out.truncate(offset)
+                    raise
+                except Exception:
+                    # Conexión cortada: conservar lo recibido para reanudar desde ahí
+                    self._commit(session, out, offset)
+                    raise
+                self._commit(session, out, offset)
+        return session
+
+    def _commit(self, session: Dict[str, Any], out, offset: int):
+        out.flush()
+        written = out.tell()
+        out.truncate(written)
+        self.bytes_received += written - offset
+        session["offset"] = written
+        session["updated_at"] = time.time()
+        self._save(session)
+
+    def complete(self, upload_id: str) -> Dict[str, Any]:
+        """Cierra la sesión si está completa; el archivo queda en ``data_path`` para procesarse"""
+        session = self.get(upload_id)
+        if session["offset"] != session["size"]:
+            raise ValidationError(
+                "La subida está incompleta",
+                "UPLOAD_INCOMPLETE",
+                {"upload_id": upload_id, "offset": session["offset"], "size": session["size"]}
+            )
+        self.sessions_completed += 1
+        return session
+
+    def discard(self, upload_id: str):
+        for path in (self.data_path(upload_id), self._meta_path(upload_id)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._locks.pop(upload_id, None)
+
+    def purge_expired(self) -> int:
+        """Elimina sesiones sin actividad durante más de ``ttl_sec``"""
+        now = time.time()
+        purged = 0
+        for name in os.listdir(self.upload_dir):
+            if not name.endswith(".json"):
+                continue
+            upload_id = name[:-len(".json")]
+            try:
+                if now - self.get(upload_id)["updated_at"] > self.ttl_sec:
+                    self.discard(upload_id)
+                    purged += 1
+            except ResourceNotFoundError:
+                continue
+        return purged
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "sessions_created": self.sessions_created,
+            "sessions_completed": self.sessions_completed,
+            "bytes_received": self.bytes_received,
+            "max_upload_mb": self.max_bytes // (1024 * 1024),
+            "timestamp": datetime.now().isoformat()
+        }
+
+
+# Instancia global del almacén de sesiones
+upload_session_store = None
+
+def get_upload_session_store() -> UploadSessionStore:
+    """Obtener (creando si hace falta) el almacén de sesiones de subida"""
+    global upload_session_store
+    if upload_session_store is None:
+        upload_session_store = UploadSessionStore(
+            os.getenv("RPPG_UPLOADS_DIR", os.path.join(tempfile.gettempdir(), "signaapi_rppg_uploads"))
+        )
+    return upload_session_store
@@ -1,37 +1,389 @@
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional
+
 import numpy as np
 from scipy import signal
 
-def extract_respiratory_rate(BVP_signal, FS):
-    resp_LPF = 0.1
-    resp_HPF = 0.5
-    NyquistF = FS / 2.0
-    if resp_LPF >= resp_HPF or resp_HPF >= NyquistF:
-        return None
-    try:
-        B_resp, A_resp = signal.butter(2, [resp_LPF / NyquistF, resp_HPF / NyquistF], btype='bandpass')
-        resp_signal = signal.filtfilt(B_resp, A_resp, BVP_signal)
-    except Exception:
-        return None
-    min_resp_peak_dist = FS * (60.0 / 30.0)
-    resp_peaks, _ = signal.find_peaks(resp_signal, distance=min_resp_peak_dist, prominence=np.std(resp_signal)*0.2)
-    if len(resp_peaks) < 2:
-        return None
-    resp_intervals_sec = np.diff(resp_peaks) / FS
-    valid_resp_intervals = resp_intervals_sec[(resp_intervals_sec >= 60.0/30.0) & (resp_intervals_sec <= 60.0/6.0)]
-    if len(valid_resp_intervals) < 1:
-        return None
-    avg_resp_interval = np.mean(valid_resp_intervals)
-    if avg_resp_interval <= 0: return None
-    respiratory_rate = 60.0 / avg_resp_interval
-    return respiratory_rate
+from .dsp import bandpass_sos, hann_window, sos_filtfilt_padlen
+from .rppg_profiling import profile_stage, profiled
 
-def calculate_hrv(peaks, FS):
-    if peaks is None or len(peaks) < 3:
+# Estimación espectral de HR
+HR_BAND = (0.7, 3.0)                 # Hz (42-180 lpm)
+HR_SPECTRAL_MIN_SEC = 4.0
+HR_SPECTRAL_RESOLUTION_BPM = 0.5     # zero-padding hasta esta resolución
+HR_SNR_HALF_WIDTH_HZ = 0.1           # ancho del pico (y su armónico) contado como señal
+HR_SERIES_WIN_SEC = 8.0
+HR_SERIES_STEP_SEC = 1.0
+
+# Detección de latidos (picos del BVP)
+HR_PEAK_MIN_BPM = 40.0
+HR_PEAK_MAX_BPM = 180.0
+HR_PEAK_PROMINENCE = 0.1             # fracción de la desviación típica del BVP
+
+# Respiración: pasa banda sobre el BVP y picos separados al menos 2 s
+RESP_BAND = (0.1, 0.5)               # Hz (6-30 rpm)
+RESP_FILTER_ORDER = 2
+RESP_MIN_BPM = 6.0
+RESP_MAX_BPM = 30.0
+
+# Calidad por métrica en VitalsExtractor
+VITALS_QUALITY_OK = "ok"
+VITALS_QUALITY_LOW = "low_confidence"
+VITALS_QUALITY_UNAVAILABLE = "unavailable"
+VITALS_METRICS = ("hr", "respiratory_rate", "hrv")
+HR_MIN_CONFIDENCE = 0.3              # confianza espectral mínima
+HR_AGREEMENT_BPM = 5.0               # discrepancia máxima entre HR por picos y espectral
+RESP_MIN_BREATHS = 3                 # intervalos respiratorios válidos mínimos
+HRV_MIN_BEATS = 30                   # intervalos RR válidos mínimos (~30 s de registro)
+MIN_VALID_FRACTION = 0.8             # fracción mínima de intervalos dentro de rango
+SPECTRUM_CHUNK_WINDOWS = 128         # ventanas por FFT (acota la memoria en registros largos)
+SPECTRUM_BATCH_WINDOWS = 4096        # ventanas espectrales en memoria por bloque de señales
+PULSE_FILTER_ORDER = 3               # pasa banda de HR para PPG crudo (extract_batch)
+
+def heart_rate_from_peaks(BVP_signal, FS):
+    """HR (lpm) por intervalos entre picos del BVP y los picos; (None, None) si no hay latidos válidos"""
+    min_peak_dist = FS * (60.0 / HR_PEAK_MAX_BPM)
+    peaks, _ = signal.find_peaks(BVP_signal, distance=min_peak_dist, prominence=np.std(BVP_signal)*HR_PEAK_PROMINENCE)
+    if len(peaks) < 2:
         return None, None
-    rr_intervals_ms = (np.diff(peaks) / FS) * 1000
-    rr_intervals_ms_filtered = rr_intervals_ms[(rr_intervals_ms > 300) & (rr_intervals_ms < 2000)]
-    if len(rr_intervals_ms_filtered) < 2:
+    peak_intervals_sec = np.diff(peaks) / FS
+    valid_intervals = peak_intervals_sec[(peak_intervals_sec >= 60.0/HR_PEAK_MAX_BPM) & (peak_intervals_sec <= 60.0/HR_PEAK_MIN_BPM)]
+    if len(valid_intervals) < 1:
         return None, None
-    sdnn = np.std(rr_intervals_ms_filtered)
-    rmssd = np.sqrt(np.mean(np.square(np.diff(rr_intervals_ms_filtered))))
-    return sdnn, rmssd
\ No newline at end of file
+    avg_ibi = np.mean(valid_intervals)
+    heart_rate_bpm = 60.0 / avg_ibi
+    return heart_rate_bpm, peaks
+
+@profiled("respiration")
+def extract_respiratory_rate(BVP_signal, FS):
+    """FR (rpm) del BVP, o None; envoltorio de ``VitalsExtractor.respiratory_rate``"""
+    return vitals_extractor(FS).respiratory_rate(BVP_signal)[0]
+
+@profiled("hrv")
+def calculate_hrv(peaks, FS):
+    """(SDNN, RMSSD) en ms de los picos, o (None, None); envoltorio de ``VitalsExtractor.hrv``"""
+    sdnn, rmssd, _ = vitals_extractor(FS).hrv(peaks)
+    return sdnn, rmssd
+
+def spectral_peak(freqs, power):
+    """Frecuencia del máximo en la banda de HR para cada fila de ``power``"""
+    band = (freqs >= HR_BAND[0]) & (freqs <= HR_BAND[1])
+    return freqs[band][np.argmax(power[:, band], axis=1)]
+
+def _near_bins(freqs, f):
+    """Tramo [start, stop) de bins con |freqs - f| <= HR_SNR_HALF_WIDTH_HZ para cada f (freqs ordenadas)"""
+    n = len(freqs)
+
+    def near(index):
+        return np.abs(freqs[np.clip(index, 0, n - 1)] - f) <= HR_SNR_HALF_WIDTH_HZ
+
+    # searchsorted sobre f ± ancho puede errar en un bin cuando el borde cae justo
+    # en un bin: se corrige con la misma comparación que el criterio
+    start = np.searchsorted(freqs, f - HR_SNR_HALF_WIDTH_HZ, side="left")
+    start = np.where((start > 0) & near(start - 1), start - 1, start)
+    start = np.where((start < n) & ~near(start) & (freqs[np.clip(start, 0, n - 1)] < f), start + 1, start)
+    stop = np.searchsorted(freqs, f + HR_SNR_HALF_WIDTH_HZ, side="right")
+    stop = np.where((stop < n) & near(stop), stop + 1, stop)
+    stop = np.where((stop > 0) & ~near(stop - 1) & (freqs[np.clip(stop - 1, 0, n - 1)] > f), stop - 1, stop)
+    return start, np.maximum(stop, start)
+
+def spectral_confidence(freqs, power, f0):
+    """Fracción de potencia en f0 y su primer armónico por ventana: SNR / (1 + SNR), en [0, 1]"""
+    f0 = np.asarray(f0, dtype=np.float64).reshape(-1)
+    upper = min(2 * HR_BAND[1], freqs[-1])
+    lo = np.searchsorted(freqs, HR_BAND[0], side="left")
+    hi = np.searchsorted(freqs, upper, side="right")
+    band_freqs = freqs[lo:hi]
+    # Sumas acumuladas por fila: la potencia de cualquier tramo de bins es una resta
+    cumulative = np.zeros((len(power), hi - lo + 1))
+    np.cumsum(power[:, lo:hi], axis=1, out=cumulative[:, 1:])
+    rows = np.arange(len(power))
+    total = cumulative[:, -1]
+    signal_power = np.zeros_like(total)
+    # f0 >= 0.7 Hz: los tramos de f0 y 2*f0 (± HR_SNR_HALF_WIDTH_HZ) nunca se solapan
+    for harmonic in (f0, 2 * f0):
+        start, stop = _near_bins(band_freqs, harmonic)
+        signal_power += cumulative[rows, stop] - cumulative[rows, start]
+    return np.divide(signal_power, total, out=np.zeros_like(total), where=total > 0)
+
+@profiled("spectrum")
+def extract_heart_rate_spectral(BVP_signal, FS):
+    """HR (lpm) por PSD de Welch en 0.7-3 Hz y su confianza; (None, 0.0) si no se puede estimar
+
+    Envoltorio de ``VitalsExtractor.heart_rate_spectral``: mismas ventanas y
+    mismo resultado que ``hr_spectral``/``hr_confidence`` de ``extract``.
+    """
+    return vitals_extractor(FS).heart_rate_spectral(BVP_signal)
+
+@profiled("spectrum")
+def heart_rate_series(BVP_signal, FS, win_sec=HR_SERIES_WIN_SEC, step_sec=HR_SERIES_STEP_SEC):
+    """Serie de HR (una ventana por segundo) con su calidad; envoltorio de ``VitalsExtractor.heart_rate_series``
+
+    Devuelve (t, hr, quality): centro de cada ventana en segundos, HR en lpm y
+    la confianza espectral de la ventana. Arrays vacíos si la señal es corta.
+    """
+    return vitals_extractor(FS, win_sec, step_sec).heart_rate_series(BVP_signal)
+
+@dataclass
+class VitalsResult:
+    """Signos vitales de un BVP con una calidad por métrica (``ok``, ``low_confidence``, ``unavailable``)"""
+    hr: Optional[float] = None
+    hr_method: Optional[str] = None      # "peaks", "spectral" o None
+    hr_spectral: Optional[float] = None
+    hr_confidence: float = 0.0
+    respiratory_rate: Optional[float] = None
+    sdnn: Optional[float] = None
+    rmssd: Optional[float] = None
+    peaks: List[int] = field(default_factory=list)
+    series_t: np.ndarray = field(default_factory=lambda: np.zeros(0))
+    series_hr: np.ndarray = field(default_factory=lambda: np.zeros(0))
+    series_quality: np.ndarray = field(default_factory=lambda: np.zeros(0))
+    quality: Dict[str, str] = field(default_factory=dict)
+
+class VitalsExtractor:
+    """HR, respiración y HRV de un BVP en una sola pasada
+
+    Todo se deriva de una única representación: un conjunto de picos (HR por
+    intervalos y HRV), un espectro de ventanas deslizantes limitado a la banda
+    0.7-6 Hz (HR de Welch, su confianza y la serie por segundo) y el pasa banda
+    respiratorio en SOS cacheado por FS. El HR espectral promedia las mismas
+    ventanas de la serie (8 s cada 1 s). ``heart_rate_spectral``,
+    ``heart_rate_series``, ``respiratory_rate`` y ``hrv`` calculan una sola
+    métrica con el mismo criterio (los usan las funciones sueltas del módulo y
+    el stream en vivo). El extractor no guarda estado entre llamadas:
+    ``vitals_extractor`` reutiliza uno por (FS, ventana, paso).
+
+    ``extract_batch`` procesa a la vez varias señales de la misma longitud (filas
+    de una matriz): filtros, espectros y picos espectrales se calculan sobre la
+    matriz completa y solo la búsqueda de picos en el tiempo recorre las filas.
+    """
+
+    def __init__(self, FS, win_sec: float = HR_SERIES_WIN_SEC, step_sec: float = HR_SERIES_STEP_SEC):
+        self.FS = float(FS)
+        self.win_sec = win_sec
+        self.step_sec = step_sec
+        nyquist = self.FS / 2.0
+        self.resp_sos = None
+        if RESP_BAND[1] < nyquist:
+            self.resp_sos = bandpass_sos(self.FS, RESP_BAND[0], RESP_BAND[1], RESP_FILTER_ORDER)
+        self.pulse_sos = None
+        if HR_BAND[1] < nyquist:
+            self.pulse_sos = bandpass_sos(self.FS, HR_BAND[0], HR_BAND[1], PULSE_FILTER_ORDER)
+
+    def spectrum(self, signals):
+        """Espectros (starts, freqs, power) en la banda de HR y su armónico, o None si la señal es corta
+
+        Ventanas de Hann de ``win_sec`` cada ``step_sec``, con zero-padding hasta
+        HR_SPECTRAL_RESOLUTION_BPM; las FFT se hacen por bloques de ventanas y
+        solo se guarda la banda HR_BAND[0]..2*HR_BAND[1].
+        Con una matriz (n_señales, n), power tiene forma (n_señales, n_win, n_freq).
+        """
+        FS = self.FS
+        if FS <= 0 or HR_BAND[0] >= FS / 2.0:
+            return None
+        x = np.asarray(signals, dtype=np.float64)
+        rows = np.atleast_2d(x)
+        n = rows.shape[1]
+        if n < HR_SPECTRAL_MIN_SEC * FS:
+            return None
+        win_len = min(int(self.win_sec * FS), n)
+        nfft = 1 << int(np.ceil(np.log2(max(win_len, FS * 60.0 / HR_SPECTRAL_RESOLUTION_BPM))))
+        freqs = np.fft.rfftfreq(nfft, d=1.0 / FS)
+        lo = np.searchsorted(freqs, HR_BAND[0], side="left")
+        hi = np.searchsorted(freqs, 2 * HR_BAND[1], side="right")
+        starts = np.arange(0, n - win_len + 1, max(1, int(self.step_sec * FS)))
+        window = hann_window(win_len)
+        # Pares (señal, ventana) aplanados: cada FFT toma SPECTRUM_CHUNK_WINDOWS de ellos
+        views = np.lib.stride_tricks.sliding_window_view(rows, win_len, axis=1)
+        row_index = np.repeat(np.arange(len(rows)), len(starts))
+        start_index = np.tile(starts, len(rows))
+        power = np.empty((len(row_index), hi - lo))
+        for i in range(0, len(row_index), SPECTRUM_CHUNK_WINDOWS):
+            chunk = slice(i, i + SPECTRUM_CHUNK_WINDOWS)
+            segments = views[row_index[chunk], start_index[chunk]]
+            segments = segments - segments.mean(axis=1, keepdims=True)
+            spectrum = np.fft.rfft(segments * window, n=nfft, axis=1)[:, lo:hi]
+            power[chunk] = spectrum.real ** 2 + spectrum.imag ** 2
+        power = power.reshape(len(rows), len(starts), hi - lo)
+        if x.ndim == 1:
+            power = power[0]
+            if not np.all(np.isfinite(power)):
+                return None
+        return starts, freqs[lo:hi], power
+
+    def heart_rate_spectral(self, BVP_signal):
+        """HR de Welch (lpm) y su confianza, como ``hr_spectral``/``hr_confidence`` de ``extract``"""
+        spectrum = self.spectrum(BVP_signal)
+        if spectrum is None:
+            return None, 0.0
+        _, freqs, power = spectrum
+        welch = power.mean(axis=0, keepdims=True)
+        band = (freqs >= HR_BAND[0]) & (freqs <= HR_BAND[1])
+        if not np.any(welch[:, band] > 0):
+            return None, 0.0
+        f0 = spectral_peak(freqs, welch)[0]
+        # La confianza premia ventanas con buena SNR que además coinciden con el pico global
+        confidence = spectral_confidence(freqs, power, np.full(len(power), f0))
+        return float(60.0 * f0), float(confidence.mean())
+
+    def heart_rate_series(self, BVP_signal):
+        """(t, hr, quality) por ventana, como ``series_*`` de ``extract``; arrays vacíos si la señal es corta"""
+        spectrum = self.spectrum(BVP_signal)
+        if spectrum is None:
+            empty = np.zeros(0)
+            return empty, empty, empty
+        starts, freqs, power = spectrum
+        f0 = spectral_peak(freqs, power)
+        win_len = min(int(self.win_sec * self.FS), len(BVP_signal))
+        t = (starts + win_len / 2.0) / self.FS
+        return t, 60.0 * f0, spectral_confidence(freqs, power, f0)
+
+    def respiratory_rate(self, BVP_signal):
+        """(rpm, calidad) del BVP, como ``respiratory_rate`` de ``extract``"""
+        resp = self._filter(self.resp_sos, np.asarray(BVP_signal, dtype=np.float64))
+        if resp is None:
+            return None, VITALS_QUALITY_UNAVAILABLE
+        return self._respiration(resp)
+
+    def _respiration(self, resp_signal):
+        """(rpm, calidad) a partir de la señal ya filtrada en la banda respiratoria"""
+        resp_peaks, _ = signal.find_peaks(resp_signal, distance=self.FS * (60.0 / RESP_MAX_BPM),
+                                          prominence=np.std(resp_signal)*0.2)
+        if len(resp_peaks) < 2:
+            return None, VITALS_QUALITY_UNAVAILABLE
+        resp_intervals_sec = np.diff(resp_peaks) / self.FS
+        in_range = (resp_intervals_sec >= 60.0 / RESP_MAX_BPM) & (resp_intervals_sec <= 60.0 / RESP_MIN_BPM)
+        valid = resp_intervals_sec[in_range]
+        if len(valid) < 1:
+            return None, VITALS_QUALITY_UNAVAILABLE
+        respiratory_rate = 60.0 / np.mean(valid)
+        ok = len(valid) >= RESP_MIN_BREATHS and in_range.mean() >= MIN_VALID_FRACTION
+        return float(respiratory_rate), VITALS_QUALITY_OK if ok else VITALS_QUALITY_LOW
+
+    def hrv(self, peaks):
+        """(sdnn, rmssd, calidad) de los intervalos RR entre picos"""
+        if peaks is None or len(peaks) < 3:
+            return None, None, VITALS_QUALITY_UNAVAILABLE
+        rr_intervals_ms = (np.diff(peaks) / self.FS) * 1000
+        in_range = (rr_intervals_ms > 300) & (rr_intervals_ms < 2000)
+        rr_ms = rr_intervals_ms[in_range]
+        if len(rr_ms) < 2:
+            return None, None, VITALS_QUALITY_UNAVAILABLE
+        sdnn = float(np.std(rr_ms))
+        rmssd = float(np.sqrt(np.mean(np.square(np.diff(rr_ms)))))
+        ok = len(rr_ms) >= HRV_MIN_BEATS and in_range.mean() >= MIN_VALID_FRACTION
+        return sdnn, rmssd, VITALS_QUALITY_OK if ok else VITALS_QUALITY_LOW
+
+    def _filter(self, sos, signals):
+        """filtfilt en SOS a lo largo de cada fila; None si las señales son demasiado cortas"""
+        if sos is None:
+            return None
+        try:
+            return signal.sosfiltfilt(sos, signals, axis=-1, padlen=sos_filtfilt_padlen(sos))
+        except ValueError:
+            return None
+
+    def extract(self, BVP_signal, series: bool = True, respiration: bool = True) -> VitalsResult:
+        """HR, serie de HR, respiración y HRV del BVP, con su calidad"""
+        signals = np.asarray(BVP_signal, dtype=np.float64).reshape(1, -1)
+        return self.extract_batch(signals, series=series, respiration=respiration)[0]
+
+    def extract_batch(
+        self, signals, pulse_filter: bool = False, series: bool = True, respiration: bool = True
+    ) -> List[VitalsResult]:
+        """``extract`` para cada fila de la matriz (n_señales, n), en bloques vectorizados
+
+        Con ``pulse_filter`` (PPG crudo de un dispositivo) HR, espectro y HRV se
+        calculan tras un pasa banda en la banda de HR; la respiración, siempre
+        sobre la señal original. Con ``series=False`` no se calcula la serie de
+        HR por ventana y con ``respiration=False`` tampoco la respiración (su
+        valor y su calidad quedan en None). Los bloques limitan a SPECTRUM_BATCH_WINDOWS las ventanas
+        espectrales en memoria.
+        """
+        signals = np.asarray(signals, dtype=np.float64)
+        n_windows = max(1, int((signals.shape[1] - self.win_sec * self.FS) // max(1, int(self.step_sec * self.FS))) + 1)
+        block = max(1, SPECTRUM_BATCH_WINDOWS // n_windows)
+        results = []
+        for i in range(0, len(signals), block):
+            results.extend(self._extract_block(signals[i:i + block], pulse_filter, series, respiration))
+        return results
+
+    def _extract_block(self, signals, pulse_filter: bool, series: bool, respiration: bool) -> List[VitalsResult]:
+        results = [VitalsResult(quality=dict.fromkeys(VITALS_METRICS)) for _ in range(len(signals))]
+        pulse = signals
+        if pulse_filter:
+            with profile_stage("filter"):
+                pulse = self._filter(self.pulse_sos, signals)
+            if pulse is None:
+                pulse = signals
+
+        with profile_stage("peaks"):
+            beats = [heart_rate_from_peaks(row, self.FS) for row in pulse]
+
+        with profile_stage("spectrum"):
+            spectrum = self.spectrum(pulse)
+            if spectrum is not None:
+                starts, freqs, power = spectrum
+                n_sig, n_win, n_freq = power.shape
+                flat = power.reshape(-1, n_freq)
+                finite = np.isfinite(power).all(axis=(1, 2))
+                welch = power.mean(axis=1)
+                band = (freqs >= HR_BAND[0]) & (freqs <= HR_BAND[1])
+                has_power = np.any(welch[:, band] > 0, axis=1)
+                f0 = spectral_peak(freqs, welch)
+                confidence = spectral_confidence(freqs, flat, np.repeat(f0, n_win)).reshape(n_sig, n_win).mean(axis=1)
+                if series:
+                    series_f0 = spectral_peak(freqs, flat)
+                    series_quality = spectral_confidence(freqs, flat, series_f0).reshape(n_sig, n_win)
+                    series_hr = (60.0 * series_f0).reshape(n_sig, n_win)
+                    win_len = min(int(self.win_sec * self.FS), signals.shape[1])
+                    series_t = (starts + win_len / 2.0) / self.FS
+                for k, result in enumerate(results):
+                    if not finite[k]:
+                        continue
+                    if has_power[k]:
+                        result.hr_spectral = float(60.0 * f0[k])
+                        result.hr_confidence = float(confidence[k])
+                    if series:
+                        result.series_t = series_t
+                        result.series_hr = series_hr[k]
+                        result.series_quality = series_quality[k]
+
+        if respiration:
+            with profile_stage("respiration"):
+                resp = self._filter(self.resp_sos, signals)
+                for k, result in enumerate(results):
+                    if resp is None:
+                        result.quality["respiratory_rate"] = VITALS_QUALITY_UNAVAILABLE
+                    else:
+                        result.respiratory_rate, result.quality["respiratory_rate"] = self._respiration(resp[k])
+
+        for result, (hr_peaks, peaks) in zip(results, beats):
+            if hr_peaks is not None:
+                result.hr, result.hr_method = float(hr_peaks), "peaks"
+                result.peaks = [int(p) for p in peaks]
+            elif result.hr_spectral is not None:
+                # Sin picos válidos: usar la estimación espectral
+                result.hr, result.hr_method = result.hr_spectral, "spectral"
+
+            if result.hr is None:
+                result.quality["hr"] = VITALS_QUALITY_UNAVAILABLE
+            elif result.hr_confidence < HR_MIN_CONFIDENCE or (
+                result.hr_spectral is not None and abs(result.hr - result.hr_spectral) > HR_AGREEMENT_BPM
+            ):
+                result.quality["hr"] = VITALS_QUALITY_LOW
+            else:
+                result.quality["hr"] = VITALS_QUALITY_OK
+
+        with profile_stage("hrv"):
+            for result in results:
+                result.sdnn, result.rmssd, result.quality["hrv"] = self.hrv(result.peaks)
+
+        return results
+
+
+@lru_cache(maxsize=32)
+def vitals_extractor(FS, win_sec: float = HR_SERIES_WIN_SEC, step_sec: float = HR_SERIES_STEP_SEC) -> VitalsExtractor:
+    """Extractor compartido para (FS, ventana, paso); los envoltorios del módulo no crean uno por llamada"""
+    return VitalsExtractor(FS, win_sec, step_sec)
@@ -0,0 +1,323 @@
+"""
+Signos vitales por lotes a partir de señales BVP/PPG ya adquiridas
+
+``POST /vitals/batch`` recibe muchas señales a la vez, como JSON o como
+archivos ``.npy``/``.npz``, cada una con su frecuencia de muestreo. Las
+señales con la misma longitud y FS se apilan en matrices 2-D para que
+``VitalsExtractor.extract_batch`` filtre y calcule los espectros de todas de
+una vez. Los grupos se empaquetan en tareas de tamaño acotado que se reparten
+entre los procesos del ``ComputeExecutor``. Las respuestas conservan el orden
+de entrada. El cuerpo (hasta ``VITALS_BATCH_MAX_MB``) también se decodifica
+en un worker, y las señales se agrupan en un hilo, fuera del event loop.
+"""
+
+import asyncio
+import io
+import json
+import math
+import os
+import threading
+import time
+import zipfile
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .error_handlers import ValidationError
+from .rppg_scheduler import wait_percentiles
+from .vitails import VitalsResult, vitals_extractor
+
+VITALS_BATCH_MAX_SIGNALS = int(os.getenv("VITALS_BATCH_MAX_SIGNALS", "10000"))
+VITALS_BATCH_MAX_MB = int(os.getenv("VITALS_BATCH_MAX_MB", "64"))
+# Muestras por tarea del pool: reparte los lotes grandes entre workers sin trocear los pequeños
+VITALS_BATCH_TASK_SAMPLES = int(os.getenv("VITALS_BATCH_TASK_SAMPLES", "2000000"))
+MAX_SIGNAL_FS = 10000.0
+NPZ_FS_KEY = "fs"
+
+
+def _invalid(message: str, details: Optional[Dict[str, Any]] = None) -> ValidationError:
+    return ValidationError(message, "INVALID_SIGNAL", details or {})
+
+
+def _signal_fs(value: Any, index: int) -> float:
+    try:
+        fs = float(value)
+    except (TypeError, ValueError):
+        fs = float("nan")
+    if not math.isfinite(fs) or fs <= 0 or fs > MAX_SIGNAL_FS:
+        raise _invalid(f"Frecuencia de muestreo inválida en la señal {index}", {"index": index, "fs": value})
+    return fs
+
+
+def _signal_values(values: Any, index: int) -> np.ndarray:
+    try:
+        array = np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        raise _invalid(f"La señal {index} no es una lista de números", {"index": index})
+    if array.ndim != 1 or len(array) == 0:
+        raise _invalid(f"La señal {index} debe ser un array 1-D no vacío", {"index": index})
+    if not np.all(np.isfinite(array)):
+        raise _invalid(f"La señal {index} contiene NaN o infinitos", {"index": index})
+    return array
+
+
+def _check_count(count: int):
+    if count == 0:
+        raise _invalid("No se recibió ninguna señal")
+    if count > VITALS_BATCH_MAX_SIGNALS:
+        raise _invalid(
+            f"Demasiadas señales en un lote. Máximo: {VITALS_BATCH_MAX_SIGNALS}",
+            {"count": count, "max_signals": VITALS_BATCH_MAX_SIGNALS}
+        )
+
+
+def parse_json_batch(payload: Any, default_fs: Optional[float] = None) -> List[Tuple[str, float, np.ndarray]]:
+    """Señales (id, fs, valores) de un cuerpo JSON
+
+    Formato: ``{"fs": 30, "signals": [{"id": "a", "fs": 64, "values": [...]}, [...]]}``.
+    Cada señal puede ser un objeto o un array; sin ``fs`` propio usa el del lote
+    o, en su defecto, el parámetro ``fs`` de la petición.
+    """
+    if not isinstance(payload, dict) or not isinstance(payload.get("signals"), list):
+        raise _invalid('El cuerpo debe ser un objeto con la lista "signals"')
+    items = payload["signals"]
+    _check_count(len(items))
+    batch_fs = payload.get("fs", default_fs)
+    signals = []
+    for index, item in enumerate(items):
+        if isinstance(item, dict):
+            values = item.get("values")
+            fs = item.get("fs", batch_fs)
+            signal_id = item.get("id", index)
+        else:
+            values, fs, signal_id = item, batch_fs, index
+        if fs is None:
+            raise _invalid(f"Falta la frecuencia de muestreo de la señal {index}", {"index": index})
+        signals.append((str(signal_id), _signal_fs(fs, index), _signal_values(values, index)))
+    return signals
+
+
+def load_array_batch(data: bytes, fs: Optional[float] = None) -> List[Tuple[str, float, np.ndarray]]:
+    """Señales (id, fs, valores) de un archivo ``.npy`` o ``.npz``
+
+    ``.npy``: un array 1-D (una señal) o 2-D (una señal por fila). ``.npz``:
+    cada array es una señal (1-D) o un grupo de señales (2-D, ids ``nombre[i]``).
+    La FS es el array ``fs`` del ``.npz`` (escalar, o uno por señal en orden) o
+    el parámetro ``fs`` de la petición.
+    """
+    try:
+        loaded = np.load(io.BytesIO(data), allow_pickle=False)
+    except (ValueError, OSError, EOFError, zipfile.BadZipFile):
+        raise _invalid("El archivo no es un .npy o .npz válido")
+
+    if isinstance(loaded, np.lib.npyio.NpzFile):
+        with loaded:
+            try:
+                names = [name for name in loaded.files if name != NPZ_FS_KEY]
+                arrays = [(name, loaded[name]) for name in names]
+                if NPZ_FS_KEY in loaded.files:
+                    fs = loaded[NPZ_FS_KEY]
+            except (ValueError, OSError, EOFError, zipfile.BadZipFile):
+                raise _invalid("El .npz contiene arrays ilegibles o de objetos")
+    else:
+        arrays = [("", loaded)]
+
+    entries = []
+    for name, array in arrays:
+        if array.ndim == 1:
+            entries.append((name or "0", array))
+        elif array.ndim == 2:
+            entries.extend((f"{name}[{i}]" if name else str(i), row) for i, row in enumerate(array))
+        else:
+            raise _invalid(f"El array {name or 'del archivo'} debe ser 1-D o 2-D", {"name": name})
+    _check_count(len(entries))
+
+    if fs is None:
+        raise _invalid('Falta la frecuencia de muestreo: parámetro "fs" o array "fs" en el .npz')
+    fs_values = np.ravel(fs)
+    if len(fs_values) not in (1, len(entries)):
+        raise _invalid(
+            'El array "fs" debe ser un escalar o tener una entrada por señal',
+            {"fs_count": len(fs_values), "signals": len(entries)}
+        )
+    if len(fs_values) == 1:
+        fs_values = np.repeat(fs_values, len(entries))
+    return [
+        (signal_id, _signal_fs(fs_values[index], index), _signal_values(values, index))
+        for index, (signal_id, values) in enumerate(entries)
+    ]
+
+
+def parse_batch_body(data: bytes, content_type: str, fs: Optional[float] = None) -> List[Tuple[str, float, np.ndarray]]:
+    """Señales (id, fs, valores) del cuerpo según su Content-Type: JSON o ``.npy``/``.npz``
+
+    Tarda segundos con lotes grandes (``json.loads`` retiene el GIL): se
+    ejecuta en un worker del ``ComputeExecutor``.
+    """
+    if content_type == "application/json":
+        try:
+            payload = json.loads(data)
+        except ValueError:
+            raise _invalid("El cuerpo no es un JSON válido")
+        return parse_json_batch(payload, fs)
+    # application/x-npy, application/octet-stream o application/zip (.npz)
+    return load_array_batch(data, fs)
+
+
+def plan_vitals_tasks(signals: List[Tuple[str, float, np.ndarray]], task_samples: int = VITALS_BATCH_TASK_SAMPLES):
+    """Agrupa las señales por (longitud, FS) en matrices y las empaqueta en tareas
+
+    Devuelve una lista de tareas; cada tarea es una lista de (fs, índices, matriz).
+    Un grupo mayor que ``task_samples`` se trocea por filas; los pequeños se
+    juntan en una misma tarea hasta llenarla.
+    """
+    groups: Dict[Tuple[int, float], List[int]] = {}
+    for index, (_, fs, values) in enumerate(signals):
+        groups.setdefault((len(values), fs), []).append(index)
+
+    tasks, current, current_samples = [], [], 0
+    for (length, fs), indices in groups.items():
+        rows = max(1, task_samples // length)
+        for start in range(0, len(indices), rows):
+            chunk = indices[start:start + rows]
+            if current and current_samples + len(chunk) * length > task_samples:
+                tasks.append(current)
+                current, current_samples = [], 0
+            current.append((fs, chunk, np.stack([signals[i][2] for i in chunk])))
+            current_samples += len(chunk) * length
+    if current:
+        tasks.append(current)
+    return tasks, len(groups)
+
+
+def vitals_summary(result: VitalsResult) -> Dict[str, Any]:
+    """Campos de un ``VitalsResult`` que devuelve ``/vitals/batch``"""
+    return {
+        "hr": result.hr,
+        "hr_method": result.hr_method,
+        "hr_spectral": result.hr_spectral,
+        "hr_confidence": result.hr_confidence,
+        "respiratory_rate": result.respiratory_rate,
+        "sdnn": result.sdnn,
+        "rmssd": result.rmssd,
+        "quality": result.quality,
+    }
+
+
+def extract_vitals_task(groups: List[Tuple[float, np.ndarray]], pulse_filter: bool = True) -> List[List[Dict[str, Any]]]:
+    """Tarea del pool: signos vitales de cada matriz (fs, señales) de la tarea"""
+    return [
+        [vitals_summary(result) for result in vitals_extractor(fs).extract_batch(matrix, pulse_filter, series=False)]
+        for fs, matrix in groups
+    ]
+
+
+async def run_vitals_batch(
+    executor,
+    signals: List[Tuple[str, float, np.ndarray]],
+    pulse_filter: bool = True,
+    tenant: Optional[str] = None,
+    triage: Optional[str] = None
+) -> Dict[str, Any]:
+    """Reparte el lote entre los workers del pool y devuelve los resultados en el orden de entrada"""
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    # np.stack de todo el lote: fuera del event loop
+    tasks, n_groups = await loop.run_in_executor(None, plan_vitals_tasks, signals)
+    # Como máximo un worker por tarea a la vez: el resto del pool sigue libre para otros tenants
+    slots = asyncio.Semaphore(executor.max_workers)
+
+    async def run_task(task):
+        async with slots:
+            return await executor.run(
+                extract_vitals_task, [(fs, matrix) for fs, _, matrix in task], pulse_filter,
+                tenant=tenant, triage=triage
+            )
+
+    runs = [asyncio.create_task(run_task(task)) for task in tasks]
+    try:
+        outputs = await asyncio.gather(*runs)
+    except Exception:
+        get_vitals_batch_metrics().record_failure()
+        # Si una tarea falla, las que esperan turno se descartan y las que ya
+        # corren en un worker se esperan (el ejecutor no puede interrumpirlas)
+        for run in runs:
+            run.cancel()
+        await asyncio.gather(*runs, return_exceptions=True)
+        raise
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(signals)
+    for task, output in zip(tasks, outputs):
+        for (_, indices, _), summaries in zip(task, output):
+            for index, summary in zip(indices, summaries):
+                signal_id, fs, values = signals[index]
+                results[index] = {"id": signal_id, "fs": fs, "samples": len(values), **summary}
+
+    elapsed = time.perf_counter() - started
+    samples = sum(len(values) for _, _, values in signals)
+    get_vitals_batch_metrics().record(len(signals), samples, n_groups, len(tasks), elapsed)
+    return {
+        "count": len(results),
+        "groups": n_groups,
+        "tasks": len(tasks),
+        "pulse_filter": pulse_filter,
+        "processing_ms": round(elapsed * 1000, 3),
+        "results": results,
+    }
+
+
+class VitalsBatchMetrics:
+    """Peticiones, señales y rendimiento de ``/vitals/batch``"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.failed = 0
+        self.signals = 0
+        self.samples = 0
+        self.groups = 0
+        self.tasks = 0
+        self.request_times = deque(maxlen=1000)
+        self.signals_per_sec = deque(maxlen=1000)
+
+    def record(self, signals: int, samples: int, groups: int, tasks: int, elapsed: float):
+        with self._lock:
+            self.requests += 1
+            self.signals += signals
+            self.samples += samples
+            self.groups += groups
+            self.tasks += tasks
+            self.request_times.append(elapsed)
+            if elapsed > 0:
+                self.signals_per_sec.append(signals / elapsed)
+
+    def record_failure(self):
+        with self._lock:
+            self.failed += 1
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "failed": self.failed,
+                "signals": self.signals,
+                "samples": self.samples,
+                "groups": self.groups,
+                "tasks": self.tasks,
+                "request_time": wait_percentiles(self.request_times),
+                "signals_per_sec": wait_percentiles(self.signals_per_sec),
+                "timestamp": datetime.now().isoformat()
+            }
+
+
+# Instancia global de las métricas de /vitals/batch
+vitals_batch_metrics = None
+
+def get_vitals_batch_metrics() -> VitalsBatchMetrics:
+    """Obtener (creando si hace falta) las métricas de /vitals/batch"""
+    global vitals_batch_metrics
+    if vitals_batch_metrics is None:
+        vitals_batch_metrics = VitalsBatchMetrics()
+    return vitals_batch_metrics
@@ -0,0 +1,107 @@
+"""
+Benchmark de latencia por frame de los backends de detección facial en CPU
+
+Uso:
+    python -m benchmarks.bench_face_detectors --video clip.mp4 --frames 200
+    python -m benchmarks.bench_face_detectors --backends haar mediapipe
+"""
+
+import argparse
+import json
+import time
+
+import cv2
+import numpy as np
+
+from api.face_detection import FACE_DETECTOR_BACKENDS, warm_up_detector
+
+
+def load_frames(video_path, max_frames, width, height):
+    """Frames del video indicado o, si no hay video, frames sintéticos"""
+    frames = []
+    if video_path:
+        cap = cv2.VideoCapture(video_path)
+        while len(frames) < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        cap.release()
+        return frames
+    rng = np.random.default_rng(0)
+    for _ in range(max_frames):
+        frame = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+        cv2.ellipse(frame, (width // 2, height // 2), (width // 8, height // 5), 0, 0, 360, (140, 160, 200), -1)
+        frames.append(frame)
+    return frames
+
+
+def bench_backend(name, frames):
+    """Costo de carga (lo que se pagaba por request) y latencia por frame"""
+    start = time.perf_counter()
+    detector = FACE_DETECTOR_BACKENDS[name]()
+    warm_up_detector(detector)
+    load_time = time.perf_counter() - start
+
+    latencies = []
+    detected = 0
+    for frame in frames:
+        start = time.perf_counter()
+        detections = detector.detect(frame)
+        latencies.append(time.perf_counter() - start)
+        detected += bool(detections)
+
+    latencies_ms = np.asarray(latencies) * 1000
+    return {
+        "backend": name,
+        "load_ms": load_time * 1000,
+        "mean_ms": float(latencies_ms.mean()),
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+        "fps": float(1000 / latencies_ms.mean()),
+        "detection_rate": detected / len(frames),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", help="Video de entrada (por defecto, frames sintéticos)")
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--backends", nargs="+", default=list(FACE_DETECTOR_BACKENDS))
+    parser.add_argument("--threads", type=int, default=1, help="Hilos de OpenCV (como en los workers)")
+    parser.add_argument("--json", action="store_true", help="Salida en JSON")
+    args = parser.parse_args()
+
+    cv2.setNumThreads(args.threads)
+    frames = load_frames(args.video, args.frames, args.width, args.height)
+    if not frames:
+        raise SystemExit("No se pudieron leer frames")
+
+    results = []
+    for name in args.backends:
+        try:
+            results.append(bench_backend(name, frames))
+        except Exception as e:
+            results.append({"backend": name, "error": str(e)})
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    height, width = frames[0].shape[:2]
+    print(f"{len(frames)} frames {width}x{height}, {args.threads} hilo(s) de OpenCV")
+    print(f"{'backend':<12} {'carga ms':>9} {'media ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'fps':>7} {'detección':>10}")
+    for r in results:
+        if "error" in r:
+            print(f"{r['backend']:<12} no disponible: {r['error']}")
+            continue
+        print(
+            f"{r['backend']:<12} {r['load_ms']:>9.1f} {r['mean_ms']:>9.2f} {r['p50_ms']:>8.2f} "
+            f"{r['p95_ms']:>8.2f} {r['fps']:>7.1f} {r['detection_rate']:>10.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
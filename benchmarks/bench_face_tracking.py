@@ -0,0 +1,73 @@
+"""
+Benchmark de localización facial: tiempo por etapa según la resolución de
+detección, el stride de detección y el tracker. La referencia es detectar en
+todos los frames a resolución completa.
+
+Uso:
+    python -m benchmarks.bench_face_tracking clip.mp4 --strides 1 5 10 --trackers template optical_flow
+    python -m benchmarks.bench_face_tracking clip.mp4 --detection-widths 160 320 640
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from api.face_detection import DEFAULT_FACE_DETECTOR
+from api.rppg_core import read_video_rgb_trace_and_FS
+
+
+def run(video, backend, stride, tracker, width):
+    stats = {}
+    start = time.perf_counter()
+    rgb, fs = read_video_rgb_trace_and_FS(video, backend, stride, tracker, stats=stats, detection_width=width)
+    stats["total"] = time.perf_counter() - start
+    return rgb, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("video")
+    parser.add_argument("--backend", default=DEFAULT_FACE_DETECTOR)
+    parser.add_argument("--strides", type=int, nargs="+", default=[1, 5, 10])
+    parser.add_argument("--trackers", nargs="+", default=["template", "optical_flow"])
+    parser.add_argument("--detection-widths", type=int, nargs="+", default=[320],
+                        help="Anchos de detección a comparar; los trackers usan el primero")
+    parser.add_argument("--json", action="store_true", help="Salida en JSON")
+    args = parser.parse_args()
+
+    reference, ref_stats = run(args.video, args.backend, 1, "none", 0)
+    results = [{"width": 0, "stride": 1, "tracker": "none", **ref_stats, "rgb_mae": 0.0}]
+
+    def record(stride, tracker, width):
+        rgb, stats = run(args.video, args.backend, stride, tracker, width)
+        # Diferencia de la traza RGB frente a la referencia
+        n = min(len(rgb), len(reference)) if rgb is not None and reference is not None else 0
+        mae = float(np.abs(rgb[:n] - reference[:n]).mean()) if n else None
+        results.append({"width": width, "stride": stride, "tracker": tracker, **stats, "rgb_mae": mae})
+
+    for width in args.detection_widths:
+        if width:
+            record(1, "none", width)
+    for tracker in args.trackers:
+        for stride in args.strides:
+            if stride > 1:
+                record(stride, tracker, args.detection_widths[0])
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    base = ref_stats["total"]
+    print(f"{'ancho':>5} {'tracker':<13} {'stride':>6} {'decode s':>9} {'detect s':>9} {'track s':>8} {'roi s':>7} {'total s':>8} {'speedup':>8} {'MAE rgb':>9}")
+    for r in results:
+        mae = f"{r['rgb_mae']:.2e}" if r["rgb_mae"] is not None else "-"
+        print(
+            f"{r['width'] or 'full':>5} {r['tracker']:<13} {r['stride']:>6} {r['decode']:>9.3f} {r['detect']:>9.3f} {r['track']:>8.3f} "
+            f"{r['roi']:>7.3f} {r['total']:>8.3f} {base / r['total']:>7.2f}x {mae:>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Benchmark de los algoritmos rPPG registrados (CHROM, POS, GREEN, PCA, ICA)
+
+Mide el coste del preprocesado compartido y de cada algoritmo sobre trazas RGB
+sintéticas, junto con el error de HR frente al pulso simulado.
+
+Uso:
+    python -m benchmarks.bench_rppg_algorithms --durations 30 120 --fps 30 --hr 72
+"""
+
+import argparse
+import json
+
+from api.rppg_algorithms import BVP_ALGORITHMS, extract_bvp, preprocess_rgb
+from api.rppg_core import extract_heart_rate
+from benchmarks.bench_chrom import best_of, synthetic_rgb
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--durations", type=float, nargs="+", default=[30, 120, 300], help="Segundos")
+    parser.add_argument("--fps", type=float, default=30)
+    parser.add_argument("--hr", type=float, default=72.0, help="HR simulada (lpm)")
+    parser.add_argument("--algorithms", nargs="+", default=list(BVP_ALGORITHMS), choices=list(BVP_ALGORITHMS))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="Salida en JSON")
+    args = parser.parse_args()
+
+    results = []
+    for seconds in args.durations:
+        rgb = synthetic_rgb(seconds, args.fps, hr_bpm=args.hr)
+        preprocess_ms = best_of(lambda: preprocess_rgb(rgb, args.fps).filtered, args.repeat) * 1000
+        for name in args.algorithms:
+            # Cada repetición parte de un preprocesado ya calculado, como al encadenar algoritmos
+            trace = preprocess_rgb(rgb, args.fps)
+            trace.filtered
+            bvp = extract_bvp(trace, args.fps, name)
+            hr = extract_heart_rate(bvp, args.fps)[0] if bvp is not None else None
+            results.append({
+                "seconds": seconds,
+                "frames": len(rgb),
+                "algorithm": name,
+                "preprocess_ms": preprocess_ms,
+                "algorithm_ms": best_of(lambda: extract_bvp(trace, args.fps, name), args.repeat) * 1000,
+                "hr": hr,
+                "hr_error": abs(hr - args.hr) if hr is not None else None,
+            })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'seg':>6} {'frames':>7} {'algoritmo':<9} {'prep ms':>8} {'algo ms':>8} {'HR':>7} {'error':>6}")
+    for r in results:
+        hr = f"{r['hr']:>7.1f}" if r["hr"] is not None else f"{'-':>7}"
+        err = f"{r['hr_error']:>6.1f}" if r["hr_error"] is not None else f"{'-':>6}"
+        print(
+            f"{r['seconds']:>6.0f} {r['frames']:>7} {r['algorithm']:<9} "
+            f"{r['preprocess_ms']:>8.2f} {r['algorithm_ms']:>8.2f} {hr} {err}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark de los formatos de respuesta de /rppg (JSON, base64, npy, msgpack)
+
+Mide el tamaño del cuerpo y el tiempo de codificación de una respuesta rPPG
+con un BVP sintético de la duración indicada, para cada formato y factor de
+diezmado. msgpack solo se mide si el paquete está instalado.
+
+Uso:
+    python -m benchmarks.bench_rppg_encoding --durations 60 300 600 --fps 30 --downsample 1 2
+"""
+
+import argparse
+import json
+
+import numpy as np
+
+from api.rppg_encoding import MSGPACK_AVAILABLE, render_rppg_response
+from benchmarks.bench_chrom import best_of
+
+
+def _content(seconds, fps):
+    rng = np.random.default_rng(0)
+    n = int(seconds * fps)
+    t = np.arange(n) / fps
+    bvp = np.sin(2 * np.pi * 1.2 * t) + rng.normal(0, 0.1, n)
+    return {
+        "message": "Video processed successfully",
+        "filename": "bench.mp4",
+        "algorithm": "chrom",
+        "fps": fps,
+        "bvp": bvp.tolist(),
+        "ibi": list(range(0, n, int(fps / 1.2))),
+        "hr": 72.0,
+        "hr_method": "peaks",
+        "hr_spectral": 72.0,
+        "hr_confidence": 0.8,
+        "respiratory_rate": 15.0,
+        "hrv": [45.0, 40.0],
+        "hr_series": {"t": list(range(int(seconds))), "hr": [72.0] * int(seconds), "quality": [0.8] * int(seconds)},
+        "timestamp": "2024-01-01T00:00:00",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--durations", type=float, nargs="+", default=[60, 300, 600], help="Segundos")
+    parser.add_argument("--fps", type=float, default=30)
+    parser.add_argument("--downsample", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="Salida en JSON")
+    args = parser.parse_args()
+
+    formats = [("json", "list"), ("json", "base64"), ("npy", "list")]
+    if MSGPACK_AVAILABLE:
+        formats.append(("msgpack", "list"))
+
+    results = []
+    for seconds in args.durations:
+        content = _content(seconds, args.fps)
+        for factor in args.downsample:
+            for fmt, bvp_encoding in formats:
+                encode = lambda: render_rppg_response(content, fmt, bvp_encoding, factor)
+                response = encode()
+                results.append({
+                    "seconds": seconds,
+                    "format": fmt if fmt != "json" else f"json/{bvp_encoding}",
+                    "downsample": factor,
+                    "bytes": len(response.body) + len(response.headers.get("x-rppg-meta", "")),
+                    "encode_ms": best_of(encode, args.repeat) * 1000,
+                })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'seg':>6} {'formato':<12} {'diezmado':>8} {'bytes':>10} {'ms':>8}")
+    for r in results:
+        print(f"{r['seconds']:>6.0f} {r['format']:<12} {r['downsample']:>8} {r['bytes']:>10} {r['encode_ms']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark de los modos rPPG: latencia y error de HR de ``quick`` frente a ``precise``
+
+Ejecuta ``analyze_video_file`` en cada modo sobre los clips indicados. El
+error se mide frente a ``--hr`` (pulso conocido) o, si no se indica, frente
+al resultado del modo preciso.
+
+Uso:
+    python -m benchmarks.bench_rppg_modes clip1.mp4 clip2.mp4 --hr 72 --repeat 3
+"""
+
+import argparse
+import json
+import time
+
+from api.face_detection import DEFAULT_FACE_DETECTOR, preload_face_detector
+from api.rppg_pipeline import RPPG_MODES, analyze_video_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("videos", nargs="+")
+    parser.add_argument("--backend", default=DEFAULT_FACE_DETECTOR)
+    parser.add_argument("--hr", type=float, default=None, help="HR real (lpm); por defecto, la del modo preciso")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="Salida en JSON")
+    args = parser.parse_args()
+
+    # Cargar el detector antes de medir, como hacen los workers al arrancar
+    preload_face_detector(args.backend)
+
+    results = []
+    for video in args.videos:
+        runs = {}
+        for mode in RPPG_MODES:
+            times = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                result = analyze_video_file(video, args.backend, mode=mode)
+                times.append(time.perf_counter() - start)
+            runs[mode] = (min(times), result)
+
+        reference = args.hr if args.hr is not None else runs["precise"][1]["hr"]
+        for mode, (seconds, result) in runs.items():
+            results.append({
+                "video": video,
+                "mode": mode,
+                "seconds": seconds,
+                "hr": result["hr"],
+                "hr_spectral": result["hr_spectral"],
+                "hr_error": abs(result["hr"] - reference) if reference else None,
+                "frames_used": result["coverage"]["frames_used"],
+                "fraction_decoded": result["coverage"]["fraction_decoded"],
+            })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'video':<24} {'modo':<8} {'s':>7} {'HR':>7} {'error':>6} {'frames':>7} {'decod.':>7}")
+    for r in results:
+        err = f"{r['hr_error']:>6.1f}" if r["hr_error"] is not None else f"{'-':>6}"
+        fraction = f"{r['fraction_decoded']:>7.2f}" if r["fraction_decoded"] is not None else f"{'-':>7}"
+        print(
+            f"{r['video'][-24:]:<24} {r['mode']:<8} {r['seconds']:>7.2f} {r['hr']:>7.1f} {err} "
+            f"{r['frames_used']:>7} {fraction}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""
+Suite de rendimiento y precisión rPPG sobre videos sintéticos
+
+Genera videos con ``benchmarks.synthetic_video`` (pulso y respiración
+conocidos, ruido y movimiento opcionales) para cada combinación de
+resolución, fps, ruido y movimiento, y mide en un proceso nuevo por caso:
+
+- ``legacy``: ``read_video_with_face_detection_and_FS`` -> ``CHROME_DEHAAN``
+  -> signos vitales (HR por picos y espectral, FR, HRV).
+- ``streaming``: ``analyze_video_file`` (traza RGB en streaming), el camino de ``/rppg``.
+
+Por caso se registran frames/s por etapa (``StageProfiler``), pico de RSS y
+error de HR y FR frente a la verdad. ``--output`` guarda un JSON de
+referencia; ``--compare`` lo compara con otro y termina con código 1 si
+alguna métrica empeora más que ``--tolerance``.
+
+Uso:
+    python -m benchmarks.bench_rppg_suite --output baseline.json
+    python -m benchmarks.bench_rppg_suite --compare baseline.json --tolerance 0.1
+    python -m benchmarks.bench_rppg_suite --resolutions 1280x720 --fps 30 60 --motion 0 15 --pipelines streaming
+"""
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import cv2
+import numpy as np
+import scipy
+
+from api.error_handlers import RPPGProcessingError
+from api.face_detection import get_face_detector
+from api.rppg_core import CHROME_DEHAAN, extract_heart_rate, read_video_with_face_detection_and_FS
+from api.rppg_pipeline import analyze_video_file
+from api.rppg_profiling import StageProfiler
+from api.vitails import calculate_hrv, extract_heart_rate_spectral, extract_respiratory_rate
+from benchmarks.synthetic_video import SyntheticVideoSpec, register_synthetic_detector, write_synthetic_video
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:
+    RESOURCE_AVAILABLE = False
+
+PIPELINES = ("legacy", "streaming")
+# Métricas comparadas entre referencias: (ruta, True si más alto es mejor)
+COMPARED_METRICS = (
+    (("throughput_fps", "total"), True),
+    (("throughput_fps", "decode"), True),
+    (("throughput_fps", "detect"), True),
+    (("peak_rss_mb",), False),
+    (("hr_error",), False),
+)
+# Errores absolutos por debajo de este valor (lpm) no cuentan como regresión
+MIN_HR_ERROR_DELTA = 0.5
+
+
+def _peak_rss_mb():
+    """Pico de memoria residente del proceso (MB), o None sin el módulo ``resource``"""
+    if not RESOURCE_AVAILABLE:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo da en KiB y macOS en bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _legacy_pipeline(video_path, backend):
+    """Resultado y ``timings`` del camino por lista de recortes"""
+    profiler = StageProfiler()
+    outcome = None
+    with profiler.activate(), profiler.stage("total"):
+        with profiler.stage("read"):
+            frames, fps = read_video_with_face_detection_and_FS(video_path, backend)
+        if frames is not None:
+            bvp = CHROME_DEHAAN(frames, fps)
+            hr, peaks = extract_heart_rate(bvp, fps)
+            hr_spectral, _ = extract_heart_rate_spectral(bvp, fps)
+            respiratory_rate = extract_respiratory_rate(bvp, fps)
+            calculate_hrv(peaks, fps)
+            outcome = {
+                "hr": hr if hr is not None else hr_spectral,
+                "respiratory_rate": respiratory_rate,
+                "frames_used": len(frames),
+            }
+    return outcome, profiler.as_dict()
+
+
+def _streaming_pipeline(video_path, backend):
+    """Resultado y ``timings`` de ``analyze_video_file`` (que perfila sus propias etapas)"""
+    try:
+        result = analyze_video_file(video_path, backend)
+    except RPPGProcessingError:
+        return None, {"stages": {}, "frames": {}}
+    outcome = {
+        "hr": result["hr"],
+        "respiratory_rate": result["respiratory_rate"] or None,
+        "frames_used": result["coverage"]["frames_used"],
+    }
+    return outcome, result["timings"]
+
+
+def run_case(video_path, pipeline, backend, spec):
+    """Ejecuta un caso en el proceso actual (pensado para un proceso recién creado)"""
+    get_face_detector(backend)
+    baseline_rss = _peak_rss_mb()
+    start = time.perf_counter()
+    run = _legacy_pipeline if pipeline == "legacy" else _streaming_pipeline
+    outcome, timings = run(video_path, backend)
+    elapsed = time.perf_counter() - start
+
+    n_frames = int(round(spec["seconds"] * spec["fps"]))
+    # Etapas por frame: frames procesados por segundo de la etapa; el resto, frames del video por segundo
+    throughput = {
+        name: round(stage["calls"] / (stage["wall_ms"] / 1000), 1) if name in ("decode", "detect", "roi") else
+        round(n_frames / (stage["wall_ms"] / 1000), 1)
+        for name, stage in timings["stages"].items() if stage["wall_ms"] > 0
+    }
+    hr = outcome["hr"] if outcome else None
+    rr = outcome["respiratory_rate"] if outcome else None
+    return {
+        "seconds": round(elapsed, 3),
+        "frames": n_frames,
+        "frames_used": outcome["frames_used"] if outcome else 0,
+        "throughput_fps": throughput,
+        "timings": timings,
+        "baseline_rss_mb": round(baseline_rss, 1) if baseline_rss is not None else None,
+        "peak_rss_mb": round(_peak_rss_mb(), 1) if baseline_rss is not None else None,
+        "hr": round(hr, 2) if hr is not None else None,
+        "hr_error": round(abs(hr - spec["hr_bpm"]), 2) if hr is not None else None,
+        "respiratory_rate": round(rr, 2) if rr is not None else None,
+        "rr_error": round(abs(rr - spec["rr_bpm"]), 2) if rr is not None else None,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _metadata():
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+        "scipy": scipy.__version__,
+    }
+
+
+def _parse_resolution(value):
+    try:
+        width, height = (int(v) for v in value.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Resolución inválida: {value} (formato ANCHOxALTO)")
+    return width, height
+
+
+def _format_cell(value, width, spec=".1f"):
+    return f"{value:>{width}{spec}}" if value is not None else f"{'-':>{width}}"
+
+
+def _case_key(case):
+    return f"{case['pipeline']}/{case['label']}"
+
+
+def _get(values, path):
+    for key in path:
+        if not isinstance(values, dict) or values.get(key) is None:
+            return None
+        values = values[key]
+    return values
+
+
+def compare(baseline, current, tolerance):
+    """Cambios relativos de ``COMPARED_METRICS`` por caso; lista de (caso, métrica, antes, ahora, regresión)"""
+    previous = {_case_key(case): case for case in baseline["cases"]}
+    rows = []
+    for case in current["cases"]:
+        before = previous.get(_case_key(case))
+        if before is None:
+            continue
+        for path, higher_is_better in COMPARED_METRICS:
+            old, new = _get(before, path), _get(case, path)
+            if old is None or new is None:
+                continue
+            if path == ("hr_error",):
+                regression = new - old > max(MIN_HR_ERROR_DELTA, tolerance * old)
+            elif higher_is_better:
+                regression = new < old * (1 - tolerance)
+            else:
+                regression = new > old * (1 + tolerance)
+            rows.append((_case_key(case), ".".join(path), old, new, regression))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--resolutions", type=_parse_resolution, nargs="+", default=[(320, 240), (640, 480)])
+    parser.add_argument("--fps", type=float, nargs="+", default=[30.0])
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--hr", type=float, default=72.0, help="HR simulada (lpm)")
+    parser.add_argument("--rr", type=float, default=15.0, help="FR simulada (rpm)")
+    parser.add_argument("--noise", type=float, nargs="+", default=[2.0], help="Ruido por píxel (niveles de 8 bits)")
+    parser.add_argument("--motion", type=float, nargs="+", default=[0.0], help="Amplitud del movimiento (px)")
+    parser.add_argument("--pipelines", nargs="+", default=list(PIPELINES), choices=PIPELINES)
+    parser.add_argument("--backend", default="synthetic", help="Detector facial (por defecto, el oráculo sintético)")
+    parser.add_argument("--output", help="Guardar los resultados como JSON de referencia")
+    parser.add_argument("--compare", help="JSON de referencia con el que comparar")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Empeoramiento relativo tolerado al comparar")
+    parser.add_argument("--json", action="store_true", help="Salida en JSON")
+    args = parser.parse_args()
+    register_synthetic_detector()
+
+    cases = []
+    with tempfile.TemporaryDirectory(prefix="rppg_suite_") as tmpdir:
+        for (width, height), fps, noise, motion in itertools.product(args.resolutions, args.fps, args.noise, args.motion):
+            spec = SyntheticVideoSpec(
+                width=width, height=height, fps=fps, seconds=args.seconds,
+                hr_bpm=args.hr, rr_bpm=args.rr, noise=noise, motion=motion
+            )
+            video_path = os.path.join(tmpdir, f"{spec.label}.avi")
+            write_synthetic_video(video_path, spec)
+            for pipeline in args.pipelines:
+                # Un proceso nuevo por caso: el pico de RSS no arrastra el de casos anteriores
+                # El detector sintético se registra también en el proceso del caso
+                with ProcessPoolExecutor(
+                    max_workers=1, mp_context=multiprocessing.get_context("spawn"),
+                    initializer=register_synthetic_detector
+                ) as pool:
+                    result = pool.submit(run_case, video_path, pipeline, args.backend, spec.as_dict()).result()
+                cases.append({"pipeline": pipeline, "label": spec.label, "spec": spec.as_dict(), **result})
+
+    report = {"meta": {**_metadata(), "backend": args.backend}, "cases": cases}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    regressions = []
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        rows = compare(baseline, report, args.tolerance)
+        regressions = [row for row in rows if row[4]]
+        report["comparison"] = {
+            "baseline_commit": baseline.get("meta", {}).get("commit"),
+            "tolerance": args.tolerance,
+            "rows": [
+                {"case": case, "metric": metric, "baseline": old, "current": new, "regression": regression}
+                for case, metric, old, new, regression in rows
+            ],
+        }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{'pipeline':<10} {'caso':<26} {'s':>7} {'fps tot':>8} {'decode':>8} {'detect':>8} "
+              f"{'RSS MB':>7} {'HR':>6} {'err':>5} {'FR':>5} {'err':>5}")
+        for case in cases:
+            fps_stages = case["throughput_fps"]
+            fmt = _format_cell
+            print(
+                f"{case['pipeline']:<10} {case['label']:<26} {case['seconds']:>7.2f} "
+                f"{fmt(fps_stages.get('total'), 8)} {fmt(fps_stages.get('decode'), 8)} {fmt(fps_stages.get('detect'), 8)} "
+                f"{fmt(case['peak_rss_mb'], 7, '.0f')} {fmt(case['hr'], 6)} {fmt(case['hr_error'], 5)} "
+                f"{fmt(case['respiratory_rate'], 5)} {fmt(case['rr_error'], 5)}"
+            )
+        if args.compare:
+            print(f"\nComparación con {args.compare} (tolerancia {args.tolerance:.0%}):")
+            for row in report["comparison"]["rows"]:
+                change = (row["current"] - row["baseline"]) / row["baseline"] if row["baseline"] else 0.0
+                flag = "  REGRESIÓN" if row["regression"] else ""
+                print(f"  {row['case']:<36} {row['metric']:<22} {row['baseline']:>10} -> {row['current']:>10} "
+                      f"({change:+.1%}){flag}")
+
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Micro-benchmark de signos vitales: funciones separadas frente a VitalsExtractor
+
+Las funciones separadas (picos, HR espectral, serie de HR, respiración y HRV)
+son envoltorios de ``VitalsExtractor`` pero recorren el BVP y calculan un
+espectro cada una; ``extract`` comparte picos, espectro y filtros en una sola
+pasada. Se compara tiempo y diferencia de resultados (que debe ser cero) sobre
+BVP de trazas RGB sintéticas de distinta duración.
+
+Con ``--batch N`` mide además el rendimiento (señales/s) de ``extract_batch``
+sobre N señales de 60 s frente a extraerlas una a una, como en ``/vitals/batch``.
+
+Uso:
+    python -m benchmarks.bench_vitals --durations 60 600 1800 --fps 30
+    python -m benchmarks.bench_vitals --durations 60 --batch 1000
+"""
+
+import argparse
+import json
+
+import numpy as np
+
+from api.rppg_algorithms import extract_bvp
+from api.rppg_core import extract_heart_rate
+from api.vitails import (
+    VitalsExtractor, calculate_hrv, extract_heart_rate_spectral, extract_respiratory_rate, heart_rate_series
+)
+from benchmarks.bench_chrom import best_of, synthetic_rgb
+
+
+def separate_vitals(bvp, fps):
+    """Una función (y un espectro) por métrica, como el antiguo analyze_rgb_trace"""
+    hr, peaks = extract_heart_rate(bvp, fps)
+    hr_spectral, hr_confidence = extract_heart_rate_spectral(bvp, fps)
+    series = heart_rate_series(bvp, fps)
+    respiratory_rate = extract_respiratory_rate(bvp, fps)
+    sdnn, rmssd = calculate_hrv(peaks, fps)
+    return {
+        "hr": hr, "hr_spectral": hr_spectral, "hr_confidence": hr_confidence, "series_hr": series[1],
+        "respiratory_rate": respiratory_rate, "sdnn": sdnn, "rmssd": rmssd,
+    }
+
+
+def _diff(a, b):
+    if a is None or b is None:
+        return 0.0 if a is None and b is None else float("nan")
+    return float(np.max(np.abs(np.asarray(a, dtype=float) - np.asarray(b, dtype=float)), initial=0.0))
+
+
+def batch_throughput(n_signals, fps, seconds=60.0):
+    """Señales/s de ``extract_batch`` frente a un bucle de ``extract`` (mismas señales)"""
+    n = int(seconds * fps)
+    # extract_bvp descarta frames atípicos: se recortan todas a una longitud común
+    signals = np.stack([
+        extract_bvp(synthetic_rgb(seconds, fps, hr_bpm=60 + i % 60, seed=i), fps)[:n - n // 20]
+        for i in range(min(n_signals, 100))
+    ])
+    signals = np.resize(signals, (n_signals, signals.shape[1]))
+    extractor = VitalsExtractor(fps)
+    loop = best_of(lambda: [extractor.extract(row) for row in signals], 1)
+    batch = best_of(lambda: extractor.extract_batch(signals, series=False), 1)
+    return {
+        "signals": n_signals,
+        "seconds": seconds,
+        "loop_signals_per_sec": n_signals / loop,
+        "batch_signals_per_sec": n_signals / batch,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--durations", type=float, nargs="+", default=[60, 300, 600, 1800], help="Segundos")
+    parser.add_argument("--fps", type=float, default=30)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--batch", type=int, default=0, help="Señales de 60 s para medir extract_batch")
+    parser.add_argument("--json", action="store_true", help="Salida en JSON")
+    args = parser.parse_args()
+
+    results = []
+    for seconds in args.durations:
+        bvp = extract_bvp(synthetic_rgb(seconds, args.fps), args.fps)
+        separate = separate_vitals(bvp, args.fps)
+        vitals = VitalsExtractor(args.fps).extract(bvp)
+        results.append({
+            "seconds": seconds,
+            "samples": len(bvp),
+            "separate_ms": best_of(lambda: separate_vitals(bvp, args.fps), args.repeat) * 1000,
+            "extractor_ms": best_of(lambda: VitalsExtractor(args.fps).extract(bvp), args.repeat) * 1000,
+            # Diferencias máximas: las funciones sueltas usan el mismo extractor
+            "diff": {
+                name: _diff(separate[name], getattr(vitals, name))
+                for name in ("hr", "hr_spectral", "hr_confidence", "series_hr", "respiratory_rate", "sdnn", "rmssd")
+            },
+            "quality": vitals.quality,
+        })
+
+    batch = batch_throughput(args.batch, args.fps) if args.batch else None
+
+    if args.json:
+        print(json.dumps({"durations": results, "batch": batch}, indent=2))
+        return
+
+    print(f"{'seg':>6} {'muestras':>8} {'separadas ms':>13} {'extractor ms':>13} {'speedup':>8} "
+          f"{'Δ hr esp.':>10} {'Δ conf.':>8}")
+    for r in results:
+        print(
+            f"{r['seconds']:>6.0f} {r['samples']:>8} {r['separate_ms']:>13.2f} {r['extractor_ms']:>13.2f} "
+            f"{r['separate_ms'] / r['extractor_ms']:>7.1f}x {r['diff']['hr_spectral']:>10.2f} "
+            f"{r['diff']['hr_confidence']:>8.3f}"
+        )
+    if batch:
+        print(
+            f"\nlote de {batch['signals']} señales de {batch['seconds']:.0f} s: una a una {batch['loop_signals_per_sec']:.0f}/s, "
+            f"extract_batch {batch['batch_signals_per_sec']:.0f}/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
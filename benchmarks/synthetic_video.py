@@ -0,0 +1,106 @@
+"""
+Videos sintéticos de una cara con pulso y respiración conocidos
+
+La "cara" es una elipse con tono de piel (con ojos y boca) sobre fondo gris.
+Su color se modula con el pulso (más en el verde, como la absorción de la
+hemoglobina) y con la respiración (deriva de intensidad y modulación de la
+amplitud del pulso). Opcionalmente se añade ruido gaussiano por píxel y un
+movimiento sinusoidal de la cara. ``SyntheticFaceDetector`` localiza la
+elipse por color; ``register_synthetic_detector()`` lo registra como backend
+``synthetic``, para medir el pipeline sin depender de un modelo de detección
+real.
+"""
+
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Tuple
+
+import cv2
+import numpy as np
+
+from api.face_detection import register_face_detector
+
+SYNTHETIC_BACKEND = "synthetic"
+# Color base de la piel (B, G, R) y ganancia relativa del pulso por canal
+SKIN_BGR = np.array([110.0, 140.0, 190.0], dtype=np.float32)
+PULSE_GAINS_BGR = np.array([0.6, 1.0, 0.3], dtype=np.float32)
+BACKGROUND_LEVEL = 60
+# Umbral del canal rojo que separa la piel del fondo (y de ojos y boca)
+SKIN_RED_THRESHOLD = 150
+
+
+@dataclass
+class SyntheticVideoSpec:
+    """Parámetros de un video sintético y su verdad de referencia"""
+    width: int = 640
+    height: int = 480
+    fps: float = 30.0
+    seconds: float = 20.0
+    hr_bpm: float = 72.0
+    rr_bpm: float = 15.0
+    pulse_amplitude: float = 0.015   # variación relativa del verde por el pulso
+    resp_amplitude: float = 0.01     # deriva relativa de intensidad por la respiración
+    noise: float = 2.0               # desviación típica (niveles de 8 bits) del ruido por píxel
+    motion: float = 0.0              # amplitud (px) del movimiento de la cara
+    seed: int = 0
+
+    @property
+    def label(self) -> str:
+        return f"{self.width}x{self.height}@{self.fps:g}_n{self.noise:g}_m{self.motion:g}"
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def _face_center(spec: SyntheticVideoSpec, t: float) -> Tuple[int, int]:
+    dx = spec.motion * np.sin(2 * np.pi * 0.2 * t)
+    dy = 0.5 * spec.motion * np.sin(2 * np.pi * 0.13 * t + 1.0)
+    return int(round(spec.width / 2 + dx)), int(round(spec.height / 2 + dy))
+
+
+def write_synthetic_video(path: str, spec: SyntheticVideoSpec) -> int:
+    """Escribe el video (MJPG) y devuelve el número de frames"""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), spec.fps, (spec.width, spec.height))
+    if not writer.isOpened():
+        raise RuntimeError(f"No se pudo crear el video sintético: {path}")
+    rng = np.random.default_rng(spec.seed)
+    axes = (max(8, spec.width // 6), max(8, spec.height // 4))
+    eye_radius = max(2, spec.width // 80)
+    frame = np.empty((spec.height, spec.width, 3), dtype=np.float32)
+    n_frames = int(round(spec.seconds * spec.fps))
+    try:
+        for i in range(n_frames):
+            t = i / spec.fps
+            resp = np.sin(2 * np.pi * spec.rr_bpm / 60 * t)
+            # El pulso se amplifica y atenúa con la respiración (modulación de amplitud)
+            pulse = np.sin(2 * np.pi * spec.hr_bpm / 60 * t) * (1 + 0.2 * resp)
+            skin = SKIN_BGR * (1 + spec.pulse_amplitude * PULSE_GAINS_BGR * pulse + spec.resp_amplitude * resp)
+
+            frame.fill(BACKGROUND_LEVEL)
+            cx, cy = _face_center(spec, t)
+            cv2.ellipse(frame, (cx, cy), axes, 0, 0, 360, skin.tolist(), -1)
+            for ex in (cx - axes[0] // 3, cx + axes[0] // 3):
+                cv2.circle(frame, (ex, cy - axes[1] // 3), eye_radius, (40, 40, 40), -1)
+            cv2.ellipse(frame, (cx, cy + axes[1] // 2), (axes[0] // 3, max(1, axes[1] // 10)), 0, 0, 360,
+                        (60, 60, 120), -1)
+            if spec.noise > 0:
+                frame += rng.normal(0, spec.noise, frame.shape).astype(np.float32)
+            writer.write(np.clip(frame, 0, 255).astype(np.uint8))
+    finally:
+        writer.release()
+    return n_frames
+
+
+class SyntheticFaceDetector:
+    """Detector "oráculo" para los videos sintéticos: caja de los píxeles de piel"""
+
+    def detect(self, frame):
+        mask = cv2.inRange(frame[:, :, 2], SKIN_RED_THRESHOLD, 255)
+        x, y, w, h = cv2.boundingRect(mask)
+        if w == 0 or h == 0:
+            return []
+        return [(x, y, w, h, 1.0)]
+
+
+def register_synthetic_detector():
+    """Registrar ``SyntheticFaceDetector`` como backend ``synthetic`` (en cada proceso que lo use)"""
+    register_face_detector(SYNTHETIC_BACKEND, SyntheticFaceDetector)
@@ -0,0 +1,31 @@
+"""
+Fixtures compartidas de las pruebas unitarias del pipeline rPPG
+
+Se ejecutan con ``python -m pytest tests`` desde la raíz del repositorio.
+Las que necesitan OpenCV o SciPy se saltan si no están instalados.
+"""
+
+import pytest
+
+
+@pytest.fixture
+def synthetic_detector(monkeypatch):
+    """Registra el detector oráculo ``synthetic`` solo durante la prueba"""
+    pytest.importorskip("cv2")
+    from api.face_detection import FACE_DETECTOR_BACKENDS
+    from benchmarks.synthetic_video import SYNTHETIC_BACKEND, SyntheticFaceDetector
+
+    monkeypatch.setitem(FACE_DETECTOR_BACKENDS, SYNTHETIC_BACKEND, SyntheticFaceDetector)
+    return SYNTHETIC_BACKEND
+
+
+@pytest.fixture(scope="session")
+def synthetic_video(tmp_path_factory):
+    """Video sintético de 20 s (320x240 a 30 fps) con la cara en movimiento"""
+    pytest.importorskip("cv2")
+    from benchmarks.synthetic_video import SyntheticVideoSpec, write_synthetic_video
+
+    spec = SyntheticVideoSpec(width=320, height=240, fps=30.0, seconds=20.0, motion=40.0, noise=2.0)
+    path = str(tmp_path_factory.mktemp("videos") / "synthetic.avi")
+    write_synthetic_video(path, spec)
+    return path, spec
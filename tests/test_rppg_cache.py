@@ -0,0 +1,62 @@
+"""Caché de resultados rPPG: claves por contenido y niveles memoria/disco"""
+
+import asyncio
+
+from api.rppg_cache import RPPGResultCache, file_sha256, rppg_cache_key
+
+RESULT = {"heart_rate": 72.4, "bvp": [0.1, -0.2, 0.3]}
+
+
+def test_cache_key_depends_on_content_and_params(tmp_path):
+    video = tmp_path / "a.avi"
+    copy = tmp_path / "b.avi"
+    video.write_bytes(b"frames" * 1000)
+    copy.write_bytes(b"frames" * 1000)
+    digest = file_sha256(str(video))
+
+    # Mismo contenido con otro nombre y parámetros en otro orden: misma clave
+    assert file_sha256(str(copy)) == digest
+    assert rppg_cache_key(digest, {"mode": "precise", "algorithm": "chrom"}) == \
+        rppg_cache_key(digest, {"algorithm": "chrom", "mode": "precise"})
+
+    # Cambiar un parámetro o un byte del video cambia la clave
+    key = rppg_cache_key(digest, {"mode": "precise"})
+    assert rppg_cache_key(digest, {"mode": "quick"}) != key
+    copy.write_bytes(b"frames" * 999 + b"frameX")
+    assert rppg_cache_key(file_sha256(str(copy)), {"mode": "precise"}) != key
+
+
+def test_memory_and_disk_tiers(tmp_path):
+    async def scenario():
+        cache = RPPGResultCache(memory_bytes=1024, disk_bytes=1024, cache_dir=str(tmp_path))
+        assert await cache.get("k") is None
+        assert not await cache.contains("k")
+        await cache.put("k", RESULT)
+        assert await cache.contains("k")
+        assert await cache.get("k") == RESULT
+
+        # Una instancia nueva (otro proceso, reinicio) lo recupera del disco
+        restarted = RPPGResultCache(memory_bytes=1024, disk_bytes=1024, cache_dir=str(tmp_path))
+        assert restarted.disk_items == 1
+        assert await restarted.get("k") == RESULT
+        assert await restarted.get("k") == RESULT
+        return cache.get_metrics(), restarted.get_metrics()
+
+    first, restarted = asyncio.run(scenario())
+    assert (first["memory_hits"], first["misses"], first["stores"]) == (1, 1, 1)
+    assert (restarted["disk_hits"], restarted["memory_hits"]) == (1, 1)
+
+
+def test_memory_lru_evicts_least_recently_used():
+    async def scenario():
+        size = len(b'{"heart_rate": 72.4, "bvp": [0.1, -0.2, 0.3]}')
+        cache = RPPGResultCache(memory_bytes=2 * size, disk_bytes=0)
+        await cache.put("a", RESULT)
+        await cache.put("b", RESULT)
+        await cache.get("a")
+        await cache.put("c", RESULT)
+        return [await cache.get(key) is not None for key in ("a", "b", "c")], cache.evictions
+
+    present, evictions = asyncio.run(scenario())
+    assert present == [True, False, True]
+    assert evictions == 1
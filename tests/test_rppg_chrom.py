@@ -0,0 +1,36 @@
+"""CHROM vectorizado frente al bucle por ventanas original de CHROME_DEHAAN"""
+
+import numpy as np
+import pytest
+
+pytest.importorskip("scipy")
+
+from api.rppg_core import chrom_bvp
+from benchmarks.bench_chrom import chrome_dehaan_reference, synthetic_rgb
+
+
+def _assert_matches_reference(rgb, fps):
+    reference = chrome_dehaan_reference(rgb, fps)
+    vectorized = chrom_bvp(rgb, fps)
+    scale = np.abs(reference).max() or 1.0
+    assert vectorized.shape == reference.shape
+    assert np.abs(vectorized - reference).max() / scale < 1e-9
+
+
+@pytest.mark.parametrize("seconds, fps", [(30, 30.0), (61.3, 30.0), (20, 25.0), (12, 15.0), (10, 4.5)])
+def test_vectorized_chrom_matches_legacy_loop(seconds, fps):
+    _assert_matches_reference(synthetic_rgb(seconds, fps, seed=int(seconds)), fps)
+
+
+def test_windows_with_zero_base_are_skipped_like_the_loop():
+    fps = 30.0
+    rgb = synthetic_rgb(20, fps)
+    rgb[200:260, 2] = 0.0       # canal azul apagado en algunas ventanas
+    rgb[400:480] = 0.0          # frames negros
+    _assert_matches_reference(rgb, fps)
+
+
+def test_short_traces_match_legacy_loop():
+    fps = 30.0
+    for frames in (10, 13, 30, 47, 48, 49):
+        _assert_matches_reference(synthetic_rgb(frames / fps, fps), fps)
@@ -0,0 +1,61 @@
+"""Sondeo de videos: códigos de rechazo y videos aceptados"""
+
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+
+from api.error_handlers import VideoRejectedError
+from api.rppg_probe import probe_video
+
+
+def _write_video(path, fps=30.0, seconds=6.0, size=(160, 120), level=128):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), fps, size)
+    frame = np.full((size[1], size[0], 3), level, dtype=np.uint8)
+    for _ in range(int(fps * seconds)):
+        writer.write(frame)
+    writer.release()
+    return str(path)
+
+
+def _reject_code(path, backend):
+    with pytest.raises(VideoRejectedError) as exc:
+        probe_video(path, backend)
+    return exc.value.error_code
+
+
+def test_corrupt_file_is_unreadable(tmp_path, synthetic_detector):
+    path = tmp_path / "corrupt.avi"
+    path.write_bytes(b"\x00not a video" * 100)
+    assert _reject_code(str(path), synthetic_detector) == "VIDEO_UNREADABLE"
+
+
+@pytest.mark.parametrize("video, code", [
+    ({"seconds": 2.0}, "VIDEO_TOO_SHORT"),
+    ({"fps": 5.0}, "VIDEO_LOW_FPS"),
+    ({"size": (48, 48)}, "VIDEO_LOW_RESOLUTION"),
+    ({"level": 5}, "VIDEO_TOO_DARK"),
+    ({"level": 250}, "VIDEO_OVEREXPOSED"),
+    ({}, "VIDEO_NO_FACE"),
+])
+def test_reject_codes(tmp_path, synthetic_detector, video, code):
+    path = _write_video(tmp_path / "clip.avi", **video)
+    assert _reject_code(path, synthetic_detector) == code
+
+
+def test_video_with_face_is_accepted(synthetic_detector, synthetic_video):
+    path, spec = synthetic_video
+    info = probe_video(path, synthetic_detector)
+    assert info["frames_sampled"] == 5
+    assert info["frames_with_face"] == 5
+    assert info["duration"] == pytest.approx(spec.seconds)
+
+
+def test_truncated_video_is_sampled_from_the_frames_that_exist(tmp_path, synthetic_detector, synthetic_video):
+    path, _ = synthetic_video
+    data = open(path, "rb").read()
+    truncated = tmp_path / "truncated.avi"
+    # La cabecera sigue anunciando todos los frames, pero solo queda el primer tercio
+    truncated.write_bytes(data[:len(data) // 3])
+    info = probe_video(str(truncated), synthetic_detector)
+    assert info["frames_with_face"] > 0
@@ -0,0 +1,78 @@
+"""Orden de atención WFQ por (tenant, triaje) en FairShareGate"""
+
+import asyncio
+
+from api.rppg_scheduler import FairShareClock, FairShareGate, normalize_triage
+
+
+async def _service_order(flows, slots=1):
+    """Encola ``flows`` (tenant, triaje) con los slots ocupados y devuelve el orden en que se atienden"""
+    gate = FairShareGate(slots)
+    for _ in range(slots):
+        await gate.acquire("busy", "verde")
+    order = []
+
+    async def job(index, tenant, triage):
+        await gate.acquire(tenant, triage)
+        order.append(index)
+
+    tasks = [asyncio.create_task(job(i, *flow)) for i, flow in enumerate(flows)]
+    await asyncio.sleep(0)
+    for _ in flows:
+        gate.release()
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+    return [flows[i] for i in order]
+
+
+def test_backlogged_tenant_does_not_starve_others():
+    flows = [("a", "verde")] * 6 + [("b", "verde")] * 2
+    order = asyncio.run(_service_order(flows))
+    assert [tenant for tenant, _ in order] == ["a", "b", "a", "b", "a", "a", "a", "a"]
+
+
+def test_red_triage_jumps_the_green_backlog():
+    flows = [("a", "verde")] * 5 + [("a", "rojo")]
+    order = asyncio.run(_service_order(flows))
+    assert order[0] == ("a", "rojo")
+
+
+def test_weights_split_service_between_classes():
+    flows = [("a", "verde")] * 12 + [("a", "amarillo")] * 12 + [("a", "rojo")] * 12
+    order = asyncio.run(_service_order(flows))
+    first = [triage for _, triage in order[:12]]
+    # Pesos 8/3/1: en 12 turnos, 8 rojos, 3 amarillos y 1 verde
+    assert (first.count("rojo"), first.count("amarillo"), first.count("verde")) == (8, 3, 1)
+
+
+def test_cancelled_waiter_does_not_keep_its_turn():
+    async def scenario():
+        gate = FairShareGate(1)
+        await gate.acquire("a", "verde")
+        cancelled = asyncio.create_task(gate.acquire("b", "rojo"))
+        waiter = asyncio.create_task(gate.acquire("c", "verde"))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        gate.release()
+        await asyncio.wait_for(waiter, 1)
+        return gate.active, gate.waiting
+
+    assert asyncio.run(scenario()) == (1, 0)
+
+
+def test_clock_restarts_idle_flows_at_current_virtual_time():
+    clock = FairShareClock()
+    for _ in range(4):
+        clock.tag("a", "verde")
+    clock.advance(3.0)
+    # Un flujo nuevo no hereda crédito por haber estado inactivo
+    assert clock.tag("b", "verde") == (3.0, 4.0)
+    assert clock.tag("a", "verde") == (4.0, 5.0)
+
+
+def test_normalize_triage():
+    assert normalize_triage("Rojo") == "rojo"
+    assert normalize_triage(" AMARILLO ") == "amarillo"
+    assert normalize_triage("naranja") is None
+    assert normalize_triage(None) is None
@@ -0,0 +1,70 @@
+"""Lectura por tramos paralelos: la traza unida debe ser la de la pasada serie"""
+
+import numpy as np
+import pytest
+
+pytest.importorskip("cv2")
+pytest.importorskip("scipy")
+
+from api.face_detection import FACE_TRACKERS
+from api.rppg_core import iter_face_rgb_means, video_segments
+from api.rppg_pipeline import analyze_rgb_trace, analyze_segment_traces, read_video_segment
+
+
+class DriftingTracker:
+    """Tracker determinista cuya caja deriva con cada actualización
+
+    La caja depende de cuántos frames pasaron desde la última detección y la
+    confianza cae en algunos frames (según su contenido), lo que fuerza
+    re-detecciones fuera del calendario del paso de detección.
+    """
+
+    def init(self, frame, bbox):
+        self.bbox, self.updates = bbox, 0
+
+    def update(self, frame):
+        self.updates += 1
+        x, y, w, h = self.bbox
+        confidence = 0.1 if int(frame.mean() * 1000) % 61 == 0 else 0.9
+        return (x + 3 * self.updates, y, w, h), confidence
+
+
+def _serial_trace(path, backend, stride, tracker, stats=None):
+    means = iter_face_rgb_means(path, backend, stride, tracker, stats)
+    next(means)
+    return np.asarray(list(means), dtype=np.float64).reshape(-1, 3)
+
+
+@pytest.mark.parametrize("stride, tracker", [(1, None), (5, "drifting"), (8, "drifting")])
+def test_segment_traces_match_serial_pass(monkeypatch, synthetic_detector, synthetic_video, stride, tracker):
+    monkeypatch.setitem(FACE_TRACKERS, "drifting", DriftingTracker)
+    path, spec = synthetic_video
+    frame_count = int(spec.seconds * spec.fps)
+    stats = {}
+    serial = _serial_trace(path, synthetic_detector, stride, tracker, stats)
+    if tracker is not None:
+        assert stats["redetections"] > 0
+
+    segments = video_segments(frame_count, 3, int(1.6 * spec.fps), align=stride)
+    parts = [
+        read_video_segment(path, segment, synthetic_detector, stride, tracker)
+        for segment in segments
+    ]
+    joined = np.concatenate([part[0] for part in parts])
+    np.testing.assert_array_equal(joined, serial)
+
+    result = analyze_segment_traces(parts)
+    expected = analyze_rgb_trace(serial, spec.fps)
+    assert result["hr"] == expected["hr"]
+    np.testing.assert_array_equal(result["bvp"], expected["bvp"])
+    assert result["coverage"]["segments"] == len(segments)
+
+
+def test_video_segments_are_contiguous_and_aligned():
+    segments = video_segments(1000, 4, 48, align=7)
+    assert segments[0][:2] == (0, 0)
+    assert segments[-1][2] is None
+    for (_, _, end), (warmup_start, start, _) in zip(segments, segments[1:]):
+        assert start == end
+        assert start % 7 == 0 and warmup_start % 7 == 0
+        assert start - 48 - 7 < warmup_start <= start - 48
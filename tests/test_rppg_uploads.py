@@ -0,0 +1,75 @@
+"""Subidas reanudables: offsets, cortes de conexión y bloques rechazados"""
+
+import asyncio
+
+import pytest
+
+from api.error_handlers import ResourceNotFoundError, ValidationError
+from api.rppg_uploads import UploadSessionStore
+
+
+async def _chunks(*parts, fail=False):
+    for part in parts:
+        yield part
+    if fail:
+        raise ConnectionResetError("cliente desconectado")
+
+
+def _append(store, upload_id, offset, *parts, fail=False):
+    return asyncio.run(store.append(upload_id, offset, _chunks(*parts, fail=fail)))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return UploadSessionStore(str(tmp_path), max_mb=1)
+
+
+def _data(store, upload_id):
+    with open(store.data_path(upload_id), "rb") as f:
+        return f.read()
+
+
+def test_resume_after_disconnect_keeps_received_bytes(store):
+    upload_id = store.create("clip.avi", 10)["upload_id"]
+    assert _append(store, upload_id, 0, b"abcd")["offset"] == 4
+
+    # Corte a mitad de la petición: lo recibido cuenta y se reanuda desde ahí
+    with pytest.raises(ConnectionResetError):
+        _append(store, upload_id, 4, b"ef", fail=True)
+    assert store.get(upload_id)["offset"] == 6
+
+    assert _append(store, upload_id, 6, b"ghij")["offset"] == 10
+    assert store.complete(upload_id)["size"] == 10
+    assert _data(store, upload_id) == b"abcdefghij"
+
+
+def test_offset_mismatch_is_rejected_with_current_offset(store):
+    upload_id = store.create("clip.avi", 10)["upload_id"]
+    _append(store, upload_id, 0, b"abcd")
+    for offset in (0, 2, 8):
+        with pytest.raises(ValidationError) as exc:
+            _append(store, upload_id, offset, b"zz")
+        assert exc.value.error_code == "UPLOAD_OFFSET_MISMATCH"
+        assert exc.value.details["offset"] == 4
+    assert _data(store, upload_id) == b"abcd"
+
+
+def test_oversized_chunk_is_discarded_whole(store):
+    upload_id = store.create("clip.avi", 6)["upload_id"]
+    _append(store, upload_id, 0, b"abc")
+    with pytest.raises(ValidationError) as exc:
+        _append(store, upload_id, 3, b"de", b"fgh")
+    assert exc.value.error_code == "FILE_TOO_LARGE"
+    assert store.get(upload_id)["offset"] == 3
+    assert _data(store, upload_id) == b"abc"
+
+    with pytest.raises(ValidationError) as exc:
+        store.complete(upload_id)
+    assert exc.value.error_code == "UPLOAD_INCOMPLETE"
+
+
+def test_unknown_upload_does_not_leave_a_lock(store):
+    for upload_id in ("missing", "../etc"):
+        with pytest.raises(ResourceNotFoundError):
+            _append(store, upload_id, 0, b"abc")
+    assert store._locks == {}
@@ -0,0 +1,80 @@
+"""/vitals/batch: agrupación en tareas y resultados en el orden de entrada"""
+
+import asyncio
+import functools
+
+import numpy as np
+import pytest
+
+pytest.importorskip("scipy")
+
+from api import vitals_batch
+from api.vitals_batch import extract_vitals_task, parse_json_batch, plan_vitals_tasks, run_vitals_batch
+
+
+class ReversedExecutor:
+    """Ejecuta en el propio proceso y termina las tareas en orden inverso al de llegada"""
+
+    max_workers = 8
+
+    def __init__(self):
+        self.calls = 0
+
+    async def run(self, fn, *args, tenant=None, triage=None):
+        self.calls += 1
+        await asyncio.sleep(0.01 * (self.max_workers - self.calls))
+        return fn(*args)
+
+
+def _signal(fs, seconds, hr_bpm, seed):
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(fs * seconds)) / fs
+    return np.sin(2 * np.pi * hr_bpm / 60 * t) + rng.normal(0, 0.05, len(t))
+
+
+def _mixed_batch():
+    """Señales intercaladas de tres (longitud, FS) distintas, cada una con su HR"""
+    shapes = [(30.0, 20), (64.0, 20), (30.0, 12)]
+    signals = []
+    for i in range(15):
+        fs, seconds = shapes[i % 3]
+        signals.append((f"s{i}", fs, _signal(fs, seconds, 55 + 4 * i, i)))
+    return signals
+
+
+def test_plan_splits_groups_and_keeps_every_signal_once():
+    signals = _mixed_batch()
+    tasks, n_groups = plan_vitals_tasks(signals, task_samples=3000)
+    assert n_groups == 3
+    assert len(tasks) > 3
+    indices = sorted(i for task in tasks for _, chunk, _ in task for i in chunk)
+    assert indices == list(range(len(signals)))
+    for task in tasks:
+        for fs, chunk, matrix in task:
+            assert all(signals[i][1] == fs for i in chunk)
+            assert np.array_equal(matrix, np.stack([signals[i][2] for i in chunk]))
+
+
+def test_results_follow_input_order(monkeypatch):
+    signals = _mixed_batch()
+    monkeypatch.setattr(vitals_batch, "plan_vitals_tasks", functools.partial(plan_vitals_tasks, task_samples=3000))
+    executor = ReversedExecutor()
+    batch = asyncio.run(run_vitals_batch(executor, signals))
+
+    assert executor.calls > 3
+    assert batch["count"] == len(signals)
+    assert [result["id"] for result in batch["results"]] == [signal_id for signal_id, _, _ in signals]
+    for result, (_, fs, values) in zip(batch["results"], signals):
+        # Cada resultado es el de su propia señal, analizada sola
+        expected = extract_vitals_task([(fs, values[None, :])])[0][0]
+        assert result["fs"] == fs and result["samples"] == len(values)
+        assert result["hr"] == pytest.approx(expected["hr"])
+        assert result["quality"] == expected["quality"]
+
+
+def test_json_batch_ids_and_sample_rates():
+    payload = {"fs": 30, "signals": [{"id": "a", "values": [0.0] * 4}, [1.0] * 3, {"fs": 64, "values": [2.0] * 2}]}
+    parsed = parse_json_batch(payload)
+    assert [(signal_id, fs, len(values)) for signal_id, fs, values in parsed] == [
+        ("a", 30.0, 4), ("1", 30.0, 3), ("2", 64.0, 2)
+    ]